@@ -1,6 +1,13 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 
 class CoreConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = 'core'
+
+    def ready(self):
+        from .db.sqlite import apply_pragmas
+        connection_created.connect(
+            apply_pragmas, dispatch_uid='core.db.sqlite.apply_pragmas'
+        )
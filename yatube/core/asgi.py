@@ -0,0 +1,212 @@
+"""Мост ASGI → WSGI для Django 2.2.
+
+Django 2.2 не умеет ASGI и асинхронные представления: они появились в
+3.0 и 3.1. WsgiBridge принимает запросы ASGI-сервера (uvicorn, daphne)
+и выполняет их обычным WSGI-приложением в ограниченном пуле потоков.
+Цикл событий сервера не блокируется: медленные чтения картинок и базы
+ждут в потоках пула, а соединения сверх размера пула ждут свободный
+поток, не занимая памяти под стек и соединение с базой.
+
+Тело запроса до вызова Django собирается в SpooledTemporaryFile: с
+max_body запрос, заявивший или приславший больше, сразу получает 413
+Payload Too Large, и временный диск не заполнить.
+
+Запрос целиком выполняется в одном потоке пула: соединения с базой
+Django привязаны к потоку и закрываются сигналом request_finished в
+нём же. Тело ответа отдаётся серверу кусками по мере чтения, поэтому
+потоковые ответы (выгрузки) не собираются в памяти.
+"""
+import asyncio
+import sys
+import tempfile
+
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+SPECIAL_HEADERS = {
+    'content-type': 'CONTENT_TYPE',
+    'content-length': 'CONTENT_LENGTH',
+}
+
+
+def _wsgi_string(value):
+    # Строки окружения WSGI — байты, прочитанные как latin-1 (PEP 3333).
+    return value.encode('utf-8').decode('latin-1')
+
+
+def build_environ(scope, body):
+    """Окружение WSGI для запроса ASGI с телом body (файл)."""
+    server_name, server_port = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': _wsgi_string(scope.get('root_path', '')),
+        'PATH_INFO': _wsgi_string(scope['path']),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server_name,
+        'SERVER_PORT': str(server_port),
+        'SERVER_PROTOCOL': f'HTTP/{scope.get("http_version", "1.1")}',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    if scope.get('client'):
+        environ['REMOTE_ADDR'] = scope['client'][0]
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').lower()
+        key = SPECIAL_HEADERS.get(
+            name, 'HTTP_' + name.upper().replace('-', '_')
+        )
+        value = value.decode('latin-1')
+        if key in environ:
+            separator = '; ' if key == 'HTTP_COOKIE' else ','
+            value = environ[key] + separator + value
+        environ[key] = value
+    return environ
+
+
+def _declared_length(scope):
+    for name, value in scope.get('headers', []):
+        if name.lower() == b'content-length':
+            try:
+                return int(value)
+            except ValueError:
+                return 0
+    return 0
+
+
+class BodyTooLarge(Exception):
+    pass
+
+
+class WsgiBridge:
+    """Приложение ASGI 3 поверх WSGI-приложения и пула из threads потоков.
+
+    max_body — предел тела запроса в байтах, None — без предела.
+    """
+
+    def __init__(self, wsgi_application, threads, max_body=None):
+        self.wsgi_application = wsgi_application
+        self.max_body = max_body
+        self.executor = ThreadPoolExecutor(
+            max_workers=threads, thread_name_prefix='asgi'
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            raise ValueError(f'Соединения {scope["type"]} не поддерживаются')
+        try:
+            body = await self.read_body(scope, receive)
+        except BodyTooLarge:
+            await self.reject(send, 413, b'Payload Too Large')
+            return
+        if body is None:
+            return
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(
+                self.executor, self.run, build_environ(scope, body), loop,
+                send,
+            )
+        finally:
+            body.close()
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=True)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def _check_size(self, size):
+        if self.max_body is not None and size > self.max_body:
+            raise BodyTooLarge
+
+    async def read_body(self, scope, receive):
+        """Тело запроса; большое — во временном файле, как у Django."""
+        self._check_size(_declared_length(scope))
+        body = tempfile.SpooledTemporaryFile(
+            max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE
+        )
+        try:
+            complete = await self._receive_into(body, receive)
+        except BaseException:
+            body.close()
+            raise
+        if not complete:
+            body.close()
+            return None
+        body.seek(0)
+        return body
+
+    async def _receive_into(self, body, receive):
+        size = 0
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return False
+            chunk = message.get('body', b'')
+            size += len(chunk)
+            # Без Content-Length (chunked) размер известен по ходу чтения.
+            self._check_size(size)
+            body.write(chunk)
+            if not message.get('more_body'):
+                return True
+
+    async def reject(self, send, status, text):
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [
+                (b'content-type', b'text/plain; charset=utf-8'),
+                (b'content-length', str(len(text)).encode()),
+                (b'connection', b'close'),
+            ],
+        })
+        await send({'type': 'http.response.body', 'body': text})
+
+    def run(self, environ, loop, send):
+        """Выполняет запрос в потоке пула и отдаёт ответ кусками."""
+        start = {}
+
+        def start_response(status, headers, exc_info=None):
+            start['message'] = {
+                'type': 'http.response.start',
+                'status': int(status.split(' ', 1)[0]),
+                'headers': [
+                    (name.lower().encode('latin-1'), value.encode('latin-1'))
+                    for name, value in headers
+                ],
+            }
+
+        def deliver(message):
+            # Поток ждёт отправки: медленный клиент не копит ответ в памяти.
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        iterable = self.wsgi_application(environ, start_response)
+        try:
+            for chunk in iterable:
+                if 'message' in start:
+                    deliver(start.pop('message'))
+                if chunk:
+                    deliver({
+                        'type': 'http.response.body',
+                        'body': chunk,
+                        'more_body': True,
+                    })
+            if 'message' in start:
+                deliver(start.pop('message'))
+            deliver({'type': 'http.response.body', 'body': b''})
+        finally:
+            if hasattr(iterable, 'close'):
+                iterable.close()
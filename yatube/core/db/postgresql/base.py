@@ -0,0 +1,184 @@
+"""PostgreSQL с пулом соединений в процессе и проверкой соединений.
+
+Ключи DATABASES[alias] сверх обычных:
+
+POOL — {'MIN_SIZE': ..., 'MAX_SIZE': ..., 'TIMEOUT': ...}: соединения
+берутся из общего для потоков процесса пула и при закрытии
+возвращаются в него вместо разрыва. MIN_SIZE соединений открываются
+заранее, свободными держатся все возвращённые, одновременно выдаётся не
+больше MAX_SIZE; поток ждёт свободное соединение TIMEOUT секунд. С пулом
+CONN_MAX_AGE обычно 0: соединение возвращается в пул после каждого
+запроса.
+
+HEALTH_CHECK_SECONDS — соединение, которое не проверялось дольше,
+перед использованием проверяется запросом SELECT 1 и при ошибке
+заменяется новым: после перезапуска сервера первый запрос не падает.
+В Django 2.2 нет CONN_HEALTH_CHECKS.
+"""
+import threading
+import time
+
+import psycopg2
+
+from django.db.backends.postgresql import base, creation
+from psycopg2.extensions import (
+    TRANSACTION_STATUS_IDLE, TRANSACTION_STATUS_UNKNOWN,
+)
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _usable(connection):
+    if connection.closed:
+        return False
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+    except psycopg2.Error:
+        return False
+    return True
+
+
+class Pool:
+    """Свободные соединения и ожидание, пока освободится одно из MAX_SIZE.
+
+    ThreadedConnectionPool из psycopg2 оставляет открытыми только minconn
+    свободных соединений и закрывает остальные: с CONN_MAX_AGE = 0 потоки
+    сверх minconn подключались бы заново на каждом запросе.
+    """
+
+    def __init__(self, min_size, max_size, timeout, check_after, **params):
+        self.params = params
+        self.slots = threading.BoundedSemaphore(max_size)
+        self.timeout = timeout
+        self.check_after = check_after
+        self.lock = threading.Lock()
+        # (соединение, время возврата); последнее возвращённое выдаётся
+        # первым, давно не нужные лишние соединения закрывает сервер.
+        self.idle = [
+            (self.connect(), time.monotonic()) for _ in range(min_size)
+        ]
+
+    def connect(self):
+        return psycopg2.connect(**self.params)
+
+    def get(self):
+        if not self.slots.acquire(timeout=self.timeout):
+            raise psycopg2.OperationalError(
+                f'Нет свободного соединения в пуле за {self.timeout} с'
+            )
+        try:
+            while True:
+                with self.lock:
+                    if not self.idle:
+                        break
+                    connection, returned = self.idle.pop()
+                if connection.closed:
+                    continue
+                if (self.check_after is not None
+                        and time.monotonic() - returned >= self.check_after
+                        and not _usable(connection)):
+                    connection.close()
+                    continue
+                return connection
+            return self.connect()
+        except BaseException:
+            self.slots.release()
+            raise
+
+    def put(self, connection):
+        try:
+            if connection.closed:
+                return
+            # Как putconn в psycopg2: незавершённая транзакция
+            # откатывается, соединение в неизвестном состоянии закрывается.
+            status = connection.get_transaction_status()
+            if status == TRANSACTION_STATUS_UNKNOWN:
+                connection.close()
+                return
+            if status != TRANSACTION_STATUS_IDLE:
+                connection.rollback()
+            with self.lock:
+                self.idle.append((connection, time.monotonic()))
+        finally:
+            self.slots.release()
+
+    def close(self):
+        """Закрывает свободные соединения."""
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for connection, _ in idle:
+            connection.close()
+
+
+def get_pool(alias, settings_dict, params):
+    """Пул для базы; параметры входят в ключ: тестовая база — другая."""
+    key = (alias, tuple(sorted(params.items())))
+    with _pools_lock:
+        if key not in _pools:
+            options = settings_dict['POOL']
+            _pools[key] = Pool(
+                options.get('MIN_SIZE', 1),
+                options['MAX_SIZE'],
+                options.get('TIMEOUT', 30),
+                settings_dict.get('HEALTH_CHECK_SECONDS'),
+                **params,
+            )
+        return _pools[key]
+
+
+def close_pools(alias):
+    """Закрывает свободные соединения пулов базы alias."""
+    with _pools_lock:
+        pools = [pool for key, pool in _pools.items() if key[0] == alias]
+    for pool in pools:
+        pool.close()
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # Базу с открытыми соединениями PostgreSQL не удаляет, а
+        # свободные соединения пула остаются открытыми.
+        close_pools(self.connection.alias)
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    creation_class = DatabaseCreation
+    checked_at = 0.0
+    pool = None
+
+    def get_new_connection(self, conn_params):
+        self.checked_at = time.monotonic()
+        if not self.settings_dict.get('POOL'):
+            return super().get_new_connection(conn_params)
+        self.pool = get_pool(self.alias, self.settings_dict, conn_params)
+        connection = self.pool.get()
+        # Как в родительском классе: уровень изоляции из OPTIONS.
+        options = self.settings_dict['OPTIONS']
+        self.isolation_level = options.get(
+            'isolation_level', connection.isolation_level
+        )
+        if self.isolation_level != connection.isolation_level:
+            connection.set_session(isolation_level=self.isolation_level)
+        return connection
+
+    def _close(self):
+        if self.pool is None:
+            return super()._close()
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                self.pool.put(self.connection)
+
+    def close_if_unusable_or_obsolete(self):
+        # Вызывается в начале и в конце каждого запроса к сайту.
+        super().close_if_unusable_or_obsolete()
+        check_after = self.settings_dict.get('HEALTH_CHECK_SECONDS')
+        if (self.connection is None or check_after is None
+                or self.in_atomic_block
+                or time.monotonic() - self.checked_at < check_after):
+            return
+        self.checked_at = time.monotonic()
+        if not self.is_usable():
+            self.close()
@@ -0,0 +1,126 @@
+"""Чтение лент с реплик.
+
+Представления с декоратором read_from_replica читают из первой базы
+settings.READ_REPLICAS, у которой отставание не больше
+REPLICA_MAX_LAG_SECONDS; если таких нет, — из основной. Записи и
+чтения остальных представлений идут в основную базу.
+
+Пользователь, который что-то записал, на REPLICA_STICKY_SECONDS
+получает куку (ReplicaStickinessMiddleware) и читает из основной
+базы: свой новый пост или комментарий он видит сразу.
+"""
+import threading
+import time
+
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+STICKY_COOKIE = 'primary_until'
+# Сессии всегда из основной базы: иначе после входа пользователь,
+# пока реплика отстаёт, выглядел бы гостем.
+PRIMARY_ONLY_APPS = {'sessions'}
+
+# Реплика, применившая весь полученный WAL, не отстаёт; иначе
+# отставание — возраст последней применённой транзакции.
+POSTGRES_LAG_SQL = '''
+    SELECT CASE
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+    END
+'''
+
+_state = threading.local()
+_lags = {}
+
+
+def _measure_lag(alias):
+    connection = connections[alias]
+    # У SQLite репликации нет: файл-реплика считается актуальной.
+    if connection.vendor != 'postgresql':
+        return 0.0
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(POSTGRES_LAG_SQL)
+            lag, = cursor.fetchone()
+    except DatabaseError:
+        return float('inf')
+    # NULL — база не реплика.
+    return float(lag or 0)
+
+
+def replica_lag(alias):
+    """Отставание реплики в секундах; замер раз в REPLICA_LAG_CHECK_SECONDS."""
+    now = time.monotonic()
+    checked = _lags.get(alias)
+    if checked is None or now - checked[0] >= (
+        settings.REPLICA_LAG_CHECK_SECONDS
+    ):
+        checked = _lags[alias] = (now, _measure_lag(alias))
+    return checked[1]
+
+
+def is_sticky(request):
+    try:
+        return float(request.COOKIES.get(STICKY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+def choose_replica(request):
+    """База для чтения в запросе: реплика или None — основная."""
+    if is_sticky(request):
+        return None
+    for alias in settings.READ_REPLICAS:
+        if replica_lag(alias) <= settings.REPLICA_MAX_LAG_SECONDS:
+            return alias
+    return None
+
+
+def read_from_replica(view):
+    """Представление только читает, и чтение может идти из реплики."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        request.replica_reads = True
+        previous = getattr(_state, 'read_alias', None)
+        _state.read_alias = choose_replica(request)
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _state.read_alias = previous
+    return wrapper
+
+
+def read_alias():
+    """Реплика, из которой читает текущее представление, или None."""
+    return getattr(_state, 'read_alias', None)
+
+
+def begin_request():
+    _state.wrote = False
+
+
+def wrote():
+    """Была ли запись в основную базу с начала запроса."""
+    return getattr(_state, 'wrote', False)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label in PRIMARY_ONLY_APPS:
+            return DEFAULT_DB_ALIAS
+        return read_alias()
+
+    def db_for_write(self, model, **hints):
+        _state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики — копии основной базы.
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        if db in settings.READ_REPLICAS:
+            return False
+        return None
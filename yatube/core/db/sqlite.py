@@ -0,0 +1,18 @@
+"""Прагмы SQLite для каждого нового соединения.
+
+Значения берутся из settings.SQLITE_PRAGMAS. Журнал WAL позволяет
+читать во время записи; synchronous=NORMAL в режиме WAL не нарушает
+целостность базы при сбое процесса и не ждёт fsync на каждый коммит;
+busy_timeout ждёт чужую запись вместо ошибки database is locked;
+mmap_size читает файл базы через отображение в память.
+"""
+from django.conf import settings
+
+
+def apply_pragmas(sender, connection, **kwargs):
+    """Обработчик сигнала connection_created."""
+    if connection.vendor != 'sqlite':
+        return
+    # Напрямую через sqlite3: запросы настройки не нужны в метриках.
+    for name, value in settings.SQLITE_PRAGMAS.items():
+        connection.connection.execute(f'PRAGMA {name} = {value}')
@@ -0,0 +1,141 @@
+"""Метрики запросов в памяти процесса в формате Prometheus.
+
+Для каждого view (имя из resolver_match) копятся гистограмма времени
+ответа и суммы числа SQL-запросов, времени SQL, времени рендера шаблонов
+и размера ответа. Каждый процесс считает своё: Prometheus опрашивает
+процессы по отдельности или складывает их метки instance.
+
+Приложения могут добавить свои значения через register_collector.
+"""
+import math
+import threading
+
+from collections import defaultdict
+
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+_lock = threading.Lock()
+_collectors = []
+
+
+class ViewStats:
+    __slots__ = (
+        'buckets', 'count', 'duration', 'queries', 'sql', 'templates',
+        'size', 'statuses',
+    )
+
+    def __init__(self):
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.count = 0
+        self.duration = 0.0
+        self.queries = 0
+        self.sql = 0.0
+        self.templates = 0.0
+        self.size = 0
+        self.statuses = defaultdict(int)
+
+
+_views = defaultdict(ViewStats)
+
+
+def observe(view, status, duration, queries, sql, templates, size):
+    """Учитывает один ответ view."""
+    with _lock:
+        stats = _views[view]
+        for index, bound in enumerate(LATENCY_BUCKETS):
+            if duration <= bound:
+                stats.buckets[index] += 1
+                break
+        stats.count += 1
+        stats.duration += duration
+        stats.queries += queries
+        stats.sql += sql
+        stats.templates += templates
+        stats.size += size
+        stats.statuses[status] += 1
+
+
+def percentile(values, share):
+    """Значение, не меньше которого share всех значений (по рангу)."""
+    ordered = sorted(values)
+    return ordered[max(math.ceil(share * len(ordered)) - 1, 0)]
+
+
+def register_collector(collector):
+    """collector() возвращает (имя, тип, описание, значение) метрик."""
+    if collector not in _collectors:
+        _collectors.append(collector)
+
+
+def reset():
+    with _lock:
+        _views.clear()
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"')
+
+
+def _summary(lines, name, help_text, rows):
+    lines.append(f'# HELP {name} {help_text}')
+    lines.append(f'# TYPE {name} summary')
+    for view, total, count in rows:
+        lines.append(f'{name}_sum{{view="{_label(view)}"}} {total}')
+        lines.append(f'{name}_count{{view="{_label(view)}"}} {count}')
+
+
+def render():
+    """Текст для страницы /metrics (text/plain; version=0.0.4)."""
+    with _lock:
+        snapshot = {
+            view: (
+                list(stats.buckets), stats.count, stats.duration,
+                stats.queries, stats.sql, stats.templates, stats.size,
+                dict(stats.statuses),
+            )
+            for view, stats in _views.items()
+        }
+    views = sorted(snapshot)
+    lines = [
+        '# HELP yatube_requests_total Ответы по view и коду статуса.',
+        '# TYPE yatube_requests_total counter',
+    ]
+    for view in views:
+        for status, count in sorted(snapshot[view][7].items()):
+            lines.append(
+                f'yatube_requests_total{{view="{_label(view)}",'
+                f'status="{status}"}} {count}'
+            )
+    name = 'yatube_request_duration_seconds'
+    lines.append(f'# HELP {name} Время ответа view.')
+    lines.append(f'# TYPE {name} histogram')
+    for view in views:
+        buckets, count, duration = snapshot[view][:3]
+        label = _label(view)
+        cumulative = 0
+        for bound, value in zip(LATENCY_BUCKETS, buckets):
+            cumulative += value
+            lines.append(
+                f'{name}_bucket{{view="{label}",le="{bound}"}} {cumulative}'
+            )
+        lines.append(f'{name}_bucket{{view="{label}",le="+Inf"}} {count}')
+        lines.append(f'{name}_sum{{view="{label}"}} {duration}')
+        lines.append(f'{name}_count{{view="{label}"}} {count}')
+    for index, name, help_text in (
+        (3, 'yatube_request_queries', 'Число SQL-запросов на ответ.'),
+        (4, 'yatube_request_sql_seconds', 'Время SQL-запросов на ответ.'),
+        (5, 'yatube_request_template_seconds', 'Время рендера шаблонов.'),
+        (6, 'yatube_response_size_bytes', 'Размер тела ответа.'),
+    ):
+        _summary(lines, name, help_text, [
+            (view, snapshot[view][index], snapshot[view][1])
+            for view in views
+        ])
+    for collector in _collectors:
+        for name, metric_type, help_text, value in collector():
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {metric_type}')
+            lines.append(f'{name} {value}')
+    return '\n'.join(lines) + '\n'
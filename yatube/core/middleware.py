@@ -0,0 +1,167 @@
+import logging
+import threading
+import time
+
+from contextlib import ExitStack
+from functools import wraps
+
+from django.conf import settings
+from django.db import connections
+
+from . import metrics
+from .db import routers
+
+logger = logging.getLogger('yatube.slow_requests')
+
+# Сколько SQL-запросов одного ответа запоминается для журнала медленных.
+SLOW_SQL_CAPTURE = 1000
+SLOW_SQL_LOGGED = 20
+
+_active = threading.local()
+
+
+class RequestStats:
+    __slots__ = ('queries', 'sql', 'templates', 'rendering', 'statements')
+
+    def __init__(self, keep_statements):
+        self.queries = 0
+        self.sql = 0.0
+        self.templates = 0.0
+        self.rendering = False
+        self.statements = [] if keep_statements else None
+
+
+def view_label(match):
+    """Имя view для меток: app_name:url_name, иначе путь к функции."""
+    if match is None:
+        return 'unresolved'
+    if match.url_name:
+        return ':'.join([*match.app_names, match.url_name])
+    return match._func_path
+
+
+def _current():
+    return getattr(_active, 'stats', None)
+
+
+def _timed_execute(execute, sql, params, many, context):
+    stats = _current()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        stats.queries += 1
+        stats.sql += elapsed
+        if (stats.statements is not None
+                and len(stats.statements) < SLOW_SQL_CAPTURE):
+            stats.statements.append((elapsed, sql))
+
+
+def _timed_render(render):
+    @wraps(render)
+    def wrapper(self, *args, **kwargs):
+        stats = _current()
+        # Вложенные render_to_string уже входят во внешний рендер.
+        if stats is None or stats.rendering:
+            return render(self, *args, **kwargs)
+        stats.rendering = True
+        started = time.perf_counter()
+        try:
+            return render(self, *args, **kwargs)
+        finally:
+            stats.templates += time.perf_counter() - started
+            stats.rendering = False
+    wrapper.timed = True
+    return wrapper
+
+
+def _install_template_timer():
+    # Шаблоны рендерятся через Template.render бэкенда Django: render(),
+    # render_to_string и TemplateResponse.
+    from django.template.backends.django import Template
+    if not getattr(Template.render, 'timed', False):
+        Template.render = _timed_render(Template.render)
+
+
+class MetricsMiddleware:
+    """Собирает метрики ответов по view для страницы /metrics.
+
+    Стоит первой в MIDDLEWARE, чтобы время включало остальные
+    middleware. Запросы SQL считаются обёрткой execute_wrapper, время
+    шаблонов — обёрткой Template.render; запросы потоковых ответов,
+    выполняемые при отдаче тела, не учитываются. Ответы дольше
+    METRICS_SLOW_REQUEST_SECONDS пишутся в журнал yatube.slow_requests
+    вместе с самыми долгими SQL-запросами.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        _install_template_timer()
+
+    def __call__(self, request):
+        threshold = settings.METRICS_SLOW_REQUEST_SECONDS
+        stats = RequestStats(keep_statements=threshold is not None)
+        _active.stats = stats
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(
+                        connections[alias].execute_wrapper(_timed_execute)
+                    )
+                response = self.get_response(request)
+        finally:
+            _active.stats = None
+        duration = time.perf_counter() - started
+        view = view_label(request.resolver_match)
+        metrics.observe(
+            view,
+            response.status_code,
+            duration,
+            stats.queries,
+            stats.sql,
+            stats.templates,
+            0 if response.streaming else len(response.content),
+        )
+        if threshold is not None and duration >= threshold:
+            self.log_slow(request, view, duration, stats)
+        return response
+
+    def log_slow(self, request, view, duration, stats):
+        slowest = sorted(stats.statements, reverse=True)[:SLOW_SQL_LOGGED]
+        logger.warning(
+            'Медленный ответ %s %s (%s): %.3f с, SQL %d запросов за %.3f с,'
+            ' шаблоны %.3f с\n%s',
+            request.method, request.get_full_path(), view, duration,
+            stats.queries, stats.sql, stats.templates,
+            '\n'.join(
+                f'  {elapsed * 1000:.1f} мс: {sql}'
+                for elapsed, sql in slowest
+            ),
+        )
+
+
+class ReplicaStickinessMiddleware:
+    """Ставит куку чтения из основной базы пользователю, который записал.
+
+    Записи внутри представлений read_from_replica (например, миниатюры
+    картинок) куку не ставят: это не изменения пользователя.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        routers.begin_request()
+        response = self.get_response(request)
+        if (settings.READ_REPLICAS and routers.wrote()
+                and not getattr(request, 'replica_reads', False)):
+            ttl = settings.REPLICA_STICKY_SECONDS
+            response.set_cookie(
+                routers.STICKY_COOKIE, f'{time.time() + ttl:.0f}',
+                max_age=ttl, httponly=True, samesite='Lax',
+            )
+        return response
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 
 
 class PubDateModel(models.Model):
@@ -10,3 +10,31 @@ class PubDateModel(models.Model):
 
     class Meta:
         abstract = True
+
+
+class CountersModel(models.Model):
+    """Абстрактная модель с денормализованными счётчиками.
+
+    Счётчики из counter_fields меняются только UPDATE с F()-выражениями,
+    поэтому обычный save() их не перезаписывает: иначе устаревшее значение
+    из памяти затёрло бы параллельные инкременты. Сохранение идёт в
+    транзакции, чтобы обработчики post_save меняли счётчики в ней же;
+    в ней же сохраняются файлы полей, так что картинка поста, строка и
+    ссылка на файл (posts.blobs) фиксируются вместе.
+    """
+    counter_fields = ()
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            skipped = set(self.counter_fields) | self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in skipped
+                and field.attname not in skipped
+            ]
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
@@ -0,0 +1,134 @@
+"""JSON API лент для мобильных клиентов, только чтение.
+
+Ленты те же, что у HTML-страниц (posts.feeds). ETag и Last-Modified
+считаются до выборки страницы: по времени последней правки поста ленты
+и числу её постов из счётчика. Время правки поста меняют и новые
+комментарии, и правки его группы и автора (posts.signals), поэтому ETag
+зависит только от базы и совпадает у всех процессов. Опрос без
+изменений получает 304 Not Modified без выборки и сериализации постов.
+Удаление поста меняет число постов и ETag, но не Last-Modified:
+клиентам стоит присылать If-None-Match.
+"""
+import hashlib
+
+from functools import wraps
+
+from core.db.routers import read_from_replica
+from django.http import JsonResponse
+from django.views.decorators.http import condition, require_safe
+
+from . import feeds
+from .cache import (
+    FEED_SCOPE, author_page_scope, cache_page_for_guests, group_page_scope,
+)
+from .thumbnails import attach_thumbnails
+
+
+def conditional_feed(feed_of):
+    """Отдаёт 304 по ETag/Last-Modified ленты feed_of(**kwargs).
+
+    Лента строится один раз на запрос и передаётся во view вторым
+    аргументом.
+    """
+    def feed(request, **kwargs):
+        if not hasattr(request, 'api_feed'):
+            request.api_feed = feed_of(**kwargs)
+        return request.api_feed
+
+    def etag(request, **kwargs):
+        current = feed(request, **kwargs)
+        raw = '|'.join(map(str, [
+            current.last_modified, current.count, request.get_full_path(),
+        ]))
+        return hashlib.md5(raw.encode()).hexdigest()
+
+    def last_modified(request, **kwargs):
+        return feed(request, **kwargs).last_modified
+
+    def decorator(view):
+        @require_safe
+        @condition(etag_func=etag, last_modified_func=last_modified)
+        @wraps(view)
+        def wrapper(request, **kwargs):
+            return view(request, feed(request, **kwargs), **kwargs)
+        return wrapper
+    return decorator
+
+
+def _url(file):
+    return file.url if file else None
+
+
+def serialize_post(post):
+    return {
+        'id': post.pk,
+        'text': post.text,
+        'pub_date': post.pub_date,
+        'updated_at': post.updated_at,
+        'author': {
+            'username': post.author.username,
+            'full_name': post.author.get_full_name(),
+        },
+        'group': post.group and {
+            'slug': post.group.slug,
+            'title': post.group.title,
+        },
+        'comments_count': post.comments_count,
+        'image': _url(post.image),
+        'thumbnail': _url(post.thumbnail),
+    }
+
+
+def feed_response(request, feed, **extra):
+    """Страница ленты в JSON с курсорами на соседние страницы."""
+    page = feed.page(request)
+    attach_thumbnails(page)
+
+    def link(cursor):
+        if cursor is None:
+            return None
+        return request.build_absolute_uri(f'{request.path}?cursor={cursor}')
+
+    return JsonResponse({
+        **extra,
+        'count': feed.count,
+        'next': link(page.next_cursor),
+        'previous': link(page.previous_cursor),
+        'results': [serialize_post(post) for post in page],
+    }, json_dumps_params={'ensure_ascii': False})
+
+
+@read_from_replica
+@conditional_feed(feeds.site_feed)
+@cache_page_for_guests(lambda: [FEED_SCOPE])
+def index(request, feed):
+    """Общая лента"""
+    return feed_response(request, feed)
+
+
+@read_from_replica
+@conditional_feed(lambda slug: feeds.group_feed(feeds.get_group(slug)))
+@cache_page_for_guests(lambda slug: [group_page_scope(slug)])
+def group_posts(request, feed, slug):
+    """Лента группы"""
+    group = feed.owner
+    return feed_response(request, feed, group={
+        'slug': group.slug,
+        'title': group.title,
+        'description': group.description,
+    })
+
+
+@read_from_replica
+@conditional_feed(
+    lambda username: feeds.author_feed(feeds.get_author(username))
+)
+@cache_page_for_guests(lambda username: [author_page_scope(username)])
+def profile(request, feed, username):
+    """Лента автора"""
+    author = feed.owner
+    return feed_response(request, feed, author={
+        'username': author.username,
+        'full_name': author.get_full_name(),
+        'posts_count': feed.count,
+    })
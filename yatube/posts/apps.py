@@ -3,3 +3,9 @@ from django.apps import AppConfig
 
 class PostsConfig(AppConfig):
     name = 'posts'
+
+    def ready(self):
+        from core import metrics
+
+        from . import cache, signals  # noqa: F401
+        metrics.register_collector(cache.metric_samples)
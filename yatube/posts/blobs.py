@@ -0,0 +1,83 @@
+"""Счётчики ссылок постов на файлы картинок (posts.storage).
+
+Файл удаляется вместе с миниатюрами sorl и производными, когда на него
+не ссылается ни один пост. Удаление откладывается до фиксации транзакции
+и перепроверяет ссылки под блокировкой записи файла. Хранилище берёт ту
+же блокировку (pin) до проверки, есть ли файл: загрузка того же
+содержимого, пост которой ещё не зафиксирован, дождётся удаления и
+запишет файл заново, а удаление дождётся её поста и файл оставит.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+
+from . import derivatives
+from .models import ImageBlob, Post
+
+
+def _storage():
+    return Post._meta.get_field('image').storage
+
+
+def _add(name, delta):
+    # UPDATE блокирует строку до конца транзакции.
+    if ImageBlob.objects.filter(name=name).update(refs=F('refs') + delta):
+        return
+    try:
+        with transaction.atomic():
+            ImageBlob.objects.create(name=name, refs=delta)
+    except IntegrityError:
+        # Запись успел создать параллельный запрос.
+        ImageBlob.objects.filter(name=name).update(refs=F('refs') + delta)
+
+
+def acquire(name):
+    """Учитывает ещё один пост с файлом name."""
+    _add(name, 1)
+
+
+def pin(name):
+    """Блокирует удаление файла name до конца текущей транзакции."""
+    _add(name, 0)
+
+
+def release(name):
+    """Снимает ссылку поста на name и удаляет файл, если ссылок нет."""
+    ImageBlob.objects.filter(name=name).update(refs=F('refs') - 1)
+    if not ImageBlob.objects.filter(name=name, refs__gt=0).exists():
+        transaction.on_commit(lambda: delete_if_unused(name))
+
+
+def delete_if_unused(name):
+    with transaction.atomic():
+        blob = ImageBlob.objects.select_for_update().filter(name=name).first()
+        if (blob is None or blob.refs > 0
+                or Post.objects.filter(image=name).exists()):
+            return False
+        storage = _storage()
+        # Вместе с исходником sorl удаляет записи и файлы его миниатюр.
+        default.kvstore.delete(ImageFile(name, storage))
+        derivatives.delete(name)
+        storage.delete(name)
+        blob.delete()
+    return True
+
+
+def recount():
+    """Пересчитывает ссылки по постам; возвращает число исправлений."""
+    actual = dict(
+        Post.objects.exclude(image='').values_list('image').annotate(
+            refs=Count('pk')
+        ).order_by()
+    )
+    fixed = 0
+    for blob in ImageBlob.objects.all():
+        refs = actual.pop(blob.name, 0)
+        if blob.refs != refs:
+            ImageBlob.objects.filter(pk=blob.pk).update(refs=refs)
+            fixed += 1
+    ImageBlob.objects.bulk_create(
+        ImageBlob(name=name, refs=refs) for name, refs in actual.items()
+    )
+    return fixed + len(actual)
@@ -0,0 +1,79 @@
+"""Массовая запись постов в обход сигналов сохранения.
+
+bulk_create не вызывает обработчики posts.signals, поэтому счётчики,
+индекс поиска, ленты подписок и ссылки на картинки после загрузки
+перестраиваются один раз (rebuild), а не для каждого поста.
+"""
+import contextlib
+import time
+
+from django.db import connection, connections, router, transaction
+from django.utils import timezone
+
+from . import blobs, cache, counters, search, timeline
+from .models import Post
+
+# Индексы лент (-pub_date, -pk): на время загрузки удаляются только они,
+# индексы updated_at нужны API и во время загрузки.
+FEED_INDEXES = ('post_feed_idx', 'post_group_feed_idx', 'post_author_feed_idx')
+
+
+def create(model, objects):
+    """bulk_create, сохраняющий даты объектов.
+
+    bulk_create подставляет текущее время в поля auto_now и auto_now_add,
+    поэтому строки пишутся без pre_save полей, как при loaddata. Текущее
+    время получают только объекты без даты. Возвращает число строк.
+    """
+    objects = list(objects)
+    fields = model._meta.local_concrete_fields
+    now = timezone.now()
+    for field in fields:
+        if getattr(field, 'auto_now', False) or getattr(
+                field, 'auto_now_add', False):
+            for obj in objects:
+                if getattr(obj, field.attname) is None:
+                    setattr(obj, field.attname, now)
+    fields = [field for field in fields if not field.primary_key]
+    using = router.db_for_write(model)
+    size = max(connections[using].ops.bulk_batch_size(fields, objects), 1)
+    with transaction.atomic(using=using):
+        for start in range(0, len(objects), size):
+            model._base_manager._insert(
+                objects[start:start + size], fields=fields, raw=True,
+                using=using,
+            )
+    return len(objects)
+
+
+@contextlib.contextmanager
+def deferred_indexes(enabled=True):
+    """Удаляет индексы лент на время загрузки и строит их заново в конце."""
+    indexes = [
+        index for index in Post._meta.indexes if index.name in FEED_INDEXES
+    ] if enabled else []
+    with connection.schema_editor() as editor:
+        for index in indexes:
+            editor.remove_index(Post, index)
+    try:
+        yield
+    finally:
+        with connection.schema_editor() as editor:
+            for index in indexes:
+                editor.add_index(Post, index)
+
+
+def rebuild(author_ids=(), group_ids=(), images=False):
+    """Обновляет всё, что не обновили сигналы; отдаёт (шаг, секунды)."""
+    steps = [
+        ('счётчики', counters.reconcile),
+        ('кэш страниц', lambda: cache.invalidate(cache.SITE_SCOPE)),
+        ('индекс поиска', search.rebuild_index),
+        ('ленты подписок', lambda: timeline.fill(author_ids, group_ids)),
+    ]
+    if images:
+        steps.append(('ссылки на картинки', blobs.recount))
+    for name, step in steps:
+        started = time.monotonic()
+        step()
+        yield name, time.monotonic() - started
@@ -0,0 +1,189 @@
+import hashlib
+import math
+import time
+
+from functools import wraps
+
+from core.db import routers
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpResponse
+
+SITE_SCOPE = 'site'
+FEED_SCOPE = 'posts'
+
+
+def group_page_scope(slug):
+    return f'group:{slug}'
+
+
+def author_page_scope(username):
+    return f'author:{username}'
+
+
+def post_page_scope(post_id):
+    return f'post:{post_id}'
+
+
+def _cache():
+    return caches[settings.FEED_CACHE_ALIAS]
+
+
+def _version_key(scope):
+    return f'feed-version:{scope}'
+
+
+def _new_version():
+    # Версия от времени: если ключ вытеснен из кэша, новая версия не
+    # совпадёт ни с одной из тех, под которыми лежат старые страницы.
+    return int(time.time() * 1000)
+
+
+def get_versions(scopes):
+    """Текущие версии лент одним обращением к кэшу."""
+    cache = _cache()
+    keys = [_version_key(scope) for scope in scopes]
+    versions = cache.get_many(keys)
+    missing = {key: _new_version() for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return [versions[key] for key in keys]
+
+
+def _bumped_key(scope):
+    return f'feed-bumped:{scope}'
+
+
+def _bump(scopes):
+    cache = _cache()
+    for scope in scopes:
+        key = _version_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _new_version(), None)
+    if settings.READ_REPLICAS:
+        # Время сброса нужно, пока реплики могут не видеть записи.
+        window = settings.REPLICA_MAX_LAG_SECONDS
+        cache.set_many(
+            {_bumped_key(scope): time.time() for scope in scopes},
+            math.ceil(window) + 1,
+        )
+
+
+def _recently_bumped(scopes):
+    """Сбрасывалась ли лента за последние REPLICA_MAX_LAG_SECONDS."""
+    window = settings.REPLICA_MAX_LAG_SECONDS
+    bumped = _cache().get_many([_bumped_key(scope) for scope in scopes])
+    return any(time.time() - value < window for value in bumped.values())
+
+
+def invalidate(*scopes):
+    """Делает устаревшими закэшированные страницы лент scopes.
+
+    Версия меняется сразу и ещё раз после фиксации транзакции: иначе
+    параллельный запрос успел бы закэшировать страницу с данными до записи.
+    """
+    _bump(scopes)
+    transaction.on_commit(lambda: _bump(scopes))
+
+
+def _count(outcome):
+    cache = _cache()
+    key = f'feed-cache:{outcome}'
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+
+
+def stats():
+    """Попадания и промахи кэша страниц."""
+    values = _cache().get_many(['feed-cache:hits', 'feed-cache:misses'])
+    hits = values.get('feed-cache:hits', 0)
+    misses = values.get('feed-cache:misses', 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': hits / total if total else 0.0,
+    }
+
+
+def metric_samples():
+    """Статистика кэша страниц для /metrics (core.metrics)."""
+    values = stats()
+    return [
+        ('yatube_feed_cache_hits_total', 'counter',
+         'Попадания в кэш страниц лент.', values['hits']),
+        ('yatube_feed_cache_misses_total', 'counter',
+         'Промахи кэша страниц лент.', values['misses']),
+        ('yatube_feed_cache_hit_ratio', 'gauge',
+         'Доля попаданий в кэш страниц лент.', values['hit_ratio']),
+    ]
+
+
+def _page_key(name, request, scopes, versions):
+    raw = '|'.join([
+        name,
+        request.get_full_path(),
+        *(f'{scope}={version}' for scope, version in zip(scopes, versions)),
+    ])
+    return 'feed-page:' + hashlib.md5(raw.encode()).hexdigest()
+
+
+def cache_page_for_guests(scopes):
+    """Кэширует страницу целиком для неавторизованных посетителей.
+
+    scopes(**kwargs) возвращает ленты, от которых зависит страница; ключ
+    кэша включает их версии, поэтому запись в ленту (invalidate) сразу
+    делает старые страницы недоступными. Ответ из кэша отдаётся с
+    сохранёнными заголовками исходного ответа.
+
+    Версии лент лежат в том же кэше, поэтому страницы кэшируются только
+    в кэше, общем для процессов: в settings FEED_CACHE_TIMEOUT с кэшем
+    locmem равен 0. Страница, прочитанная из реплики (read_from_replica)
+    меньше чем через REPLICA_MAX_LAG_SECONDS после сброса её лент, не
+    кэшируется: реплика могла ещё не получить запись.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if (request.method not in ('GET', 'HEAD')
+                    or request.user.is_authenticated
+                    or not settings.FEED_CACHE_TIMEOUT):
+                return view(request, *args, **kwargs)
+            page_scopes = [SITE_SCOPE, *scopes(**kwargs)]
+            versions = get_versions(page_scopes)
+            key = _page_key(view.__name__, request, page_scopes, versions)
+            cache = _cache()
+            cached = cache.get(key)
+            if cached is not None:
+                _count('hits')
+                content, headers = cached
+                response = HttpResponse(content)
+                for name, value in headers:
+                    response[name] = value
+                response['X-Feed-Cache'] = 'hit'
+                return response
+            _count('misses')
+            response = view(request, *args, **kwargs)
+            # Куки принадлежат посетителю и в общую страницу не попадают.
+            # Страница из реплики вскоре после записи могла не увидеть её
+            # и легла бы в кэш под новой версией.
+            if (response.status_code == 200 and not response.streaming
+                    and not response.cookies
+                    and not (routers.read_alias()
+                             and _recently_bumped(page_scopes))):
+                cache.set(
+                    key,
+                    (response.content, list(response.items())),
+                    settings.FEED_CACHE_TIMEOUT,
+                )
+            response['X-Feed-Cache'] = 'miss'
+            return response
+        return wrapper
+    return decorator
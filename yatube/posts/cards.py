@@ -0,0 +1,56 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from .cache import SITE_SCOPE, get_versions
+from .derivatives import attach_derivatives
+from .thumbnails import attach_thumbnails
+
+CARD_TEMPLATE = 'includes/post_card.html'
+
+
+def _card_key(post, site_version):
+    return (
+        f'post-card:{post.pk}:{post.updated_at.timestamp()}:{site_version}'
+    )
+
+
+def attach_cards(posts):
+    """Прикрепляет к постам отрендеренные карточки из кэша.
+
+    Карточки страницы читаются одним get_many, отсутствующие рендерятся и
+    сохраняются одним set_many. Ключ включает время правки поста и версию
+    сайта (posts.cache), поэтому правка поста, группы или автора выдаёт
+    новую карточку. Кнопка редактирования зависит от пользователя и
+    в карточку не входит. Миниатюры и производные картинок ищутся
+    одним запросом каждые и только для рендерящихся карточек. С
+    CARD_CACHE_TIMEOUT = 0 (кэш не общий для процессов) карточки
+    рендерятся на каждый запрос.
+    """
+    posts = list(posts)
+    if not posts:
+        return posts
+    timeout = settings.CARD_CACHE_TIMEOUT
+    cache = caches[settings.FEED_CACHE_ALIAS]
+    if timeout:
+        site_version, = get_versions([SITE_SCOPE])
+        keys = {post.pk: _card_key(post, site_version) for post in posts}
+        cards = cache.get_many(keys.values())
+    else:
+        keys = {post.pk: post.pk for post in posts}
+        cards = {}
+    missing = [post for post in posts if keys[post.pk] not in cards]
+    attach_thumbnails(missing)
+    attach_derivatives(missing)
+    rendered = {}
+    for post in posts:
+        key = keys[post.pk]
+        if key not in cards:
+            cards[key] = rendered[key] = render_to_string(
+                CARD_TEMPLATE, {'post': post}
+            )
+        post.card = mark_safe(cards[key])
+    if rendered and timeout:
+        cache.set_many(rendered, timeout)
+    return posts
@@ -0,0 +1,172 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils.timezone import now
+from users.models import Profile, User
+
+from . import cache
+from .models import Comment, Follow, Group, GroupFollow, Post, PostCounter
+
+GLOBAL_SCOPE = 'posts'
+
+
+def group_scope(group_id):
+    return f'group:{group_id}'
+
+
+def author_scope(author_id):
+    return f'author:{author_id}'
+
+
+def scopes_of(group_id, author_id):
+    """Ленты, в которых виден пост с такими группой и автором."""
+    scopes = [GLOBAL_SCOPE, author_scope(author_id)]
+    if group_id is not None:
+        scopes.append(group_scope(group_id))
+    return scopes
+
+
+def _parse(scope):
+    kind, _, pk = scope.partition(':')
+    if scope != GLOBAL_SCOPE and kind not in ('group', 'author'):
+        raise ValueError(f'Неизвестная лента: {scope}')
+    return kind, pk
+
+
+def queryset_of(scope):
+    """Посты, которые считает счётчик scope."""
+    kind, pk = _parse(scope)
+    if kind == 'group':
+        return Post.objects.filter(group_id=pk)
+    if kind == 'author':
+        return Post.objects.filter(author_id=pk)
+    return Post.objects.all()
+
+
+def _counter_of(scope):
+    """Строка и поле, в которых хранится счётчик ленты.
+
+    Общая лента считается в PostCounter, группа и автор — в полях
+    posts_count у Group и Profile.
+    """
+    kind, pk = _parse(scope)
+    if kind == 'group':
+        return Group.objects.filter(pk=pk), 'posts_count'
+    if kind == 'author':
+        return Profile.objects.filter(user_id=pk), 'posts_count'
+    return PostCounter.objects.filter(scope=scope), 'value'
+
+
+def _initialize(scope):
+    """Заводит недостающий счётчик по фактическому числу постов."""
+    kind, pk = _parse(scope)
+    value = queryset_of(scope).count()
+    try:
+        with transaction.atomic():
+            if kind == 'author':
+                Profile.objects.create(user_id=pk, posts_count=value)
+            elif kind != 'group':
+                PostCounter.objects.create(scope=scope, value=value)
+    except IntegrityError:
+        # Счётчик успел создать параллельный запрос.
+        pass
+    return value
+
+
+def change(scopes, delta):
+    """Сдвигает счётчики лент на delta.
+
+    При уменьшении недостающий счётчик не создаётся: это происходит,
+    например, при каскадном удалении автора вместе с профилем.
+    """
+    for scope in scopes:
+        rows, field = _counter_of(scope)
+        updated = rows.update(**{field: F(field) + delta})
+        if not updated and delta > 0:
+            _initialize(scope)
+
+
+def change_comments(post_id, delta):
+    # Число комментариев выдаёт API: время правки меняет ETag ленты.
+    Post.objects.filter(pk=post_id).update(
+        comments_count=F('comments_count') + delta, updated_at=now()
+    )
+
+
+def get_count(scope):
+    """Число постов в ленте: чтение одного поля вместо COUNT(*)."""
+    rows, field = _counter_of(scope)
+    value = rows.values_list(field, flat=True).first()
+    if value is None:
+        return _initialize(scope)
+    return value
+
+
+def author_posts_count(author):
+    """Число постов автора из профиля, загруженного select_related."""
+    try:
+        return author.profile.posts_count
+    except Profile.DoesNotExist:
+        return get_count(author_scope(author.pk))
+
+
+def _recount(queryset, field, related, key, outer='pk'):
+    """Пересчитывает поле-счётчик одним UPDATE с подзапросом.
+
+    Возвращает число строк, в которых значение расходилось с фактическим.
+    """
+    actual = Coalesce(
+        Subquery(
+            related.filter(**{key: OuterRef(outer)}).order_by()
+            .values(key).annotate(total=Count('pk')).values('total')
+        ),
+        Value(0),
+    )
+    drifted = queryset.annotate(actual=actual).exclude(
+        **{field: F('actual')}
+    ).count()
+    if drifted:
+        queryset.update(**{field: actual})
+    return drifted
+
+
+def reconcile():
+    """Приводит все счётчики к фактическим значениям.
+
+    Возвращает число исправленных значений по видам счётчиков. Если
+    что-то исправлено, кэш страниц сбрасывается: на них были старые числа.
+    """
+    fixed = {}
+    with transaction.atomic():
+        total = Post.objects.count()
+        counter, created = PostCounter.objects.get_or_create(
+            scope=GLOBAL_SCOPE, defaults={'value': total}
+        )
+        fixed['posts'] = int(created or counter.value != total)
+        PostCounter.objects.filter(pk=counter.pk).update(value=total)
+        Profile.objects.bulk_create(
+            Profile(user_id=pk) for pk in User.objects.filter(
+                profile__isnull=True
+            ).values_list('pk', flat=True)
+        )
+        fixed['groups'] = _recount(
+            Group.objects.all(), 'posts_count', Post.objects, 'group'
+        )
+        fixed['profiles'] = _recount(
+            Profile.objects.all(), 'posts_count', Post.objects, 'author',
+            outer='user_id',
+        )
+        fixed['comments'] = _recount(
+            Post.objects.all(), 'comments_count', Comment.objects, 'post'
+        )
+        fixed['group_followers'] = _recount(
+            Group.objects.all(), 'followers_count', GroupFollow.objects,
+            'group'
+        )
+        fixed['followers'] = _recount(
+            Profile.objects.all(), 'followers_count', Follow.objects,
+            'author', outer='user_id',
+        )
+    if any(fixed.values()):
+        cache.invalidate(cache.SITE_SCOPE)
+    return fixed
@@ -0,0 +1,160 @@
+"""Адаптивные производные картинок постов для srcset.
+
+Картинка кадрируется в пропорции миниатюры (960x339) и сохраняется в
+нескольких ширинах и форматах: AVIF, если Pillow умеет его кодировать,
+WebP и JPEG для старых браузеров. Строит их та же фоновая очередь, что
+и миниатюры (posts.thumbnails.run_job).
+"""
+import hashlib
+import os
+
+from collections import defaultdict
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image, ImageOps
+
+from .models import ImageDerivative
+
+FRAME = (960, 339)
+SIZES = '(max-width: 960px) 100vw, 960px'
+# (формат Pillow, MIME-тип, расширение, параметры сохранения) в порядке
+# предпочтения браузером; последний — запасной для <img>.
+FORMATS = (
+    ('AVIF', 'image/avif', 'avif', {'quality': 50}),
+    ('WEBP', 'image/webp', 'webp', {'quality': 75, 'method': 4}),
+    ('JPEG', 'image/jpeg', 'jpg',
+     {'quality': 80, 'optimize': True, 'progressive': True}),
+)
+FALLBACK_FORMAT = 'JPEG'
+
+
+def supported_formats():
+    Image.init()
+    return [spec for spec in FORMATS if spec[0] in Image.SAVE]
+
+
+def frame_size(width):
+    return width, round(width * FRAME[1] / FRAME[0])
+
+
+def render(file):
+    """Производные файла картинки: (формат, ширина, высота, байты)."""
+    source = Image.open(file)
+    # JPEG декодируется сразу в уменьшенном масштабе, не в полном размере.
+    source.draft('RGB', FRAME)
+    source = ImageOps.exif_transpose(source).convert('RGB')
+    largest = ImageOps.fit(source, FRAME, Image.LANCZOS)
+    for width in settings.IMAGE_DERIVATIVE_WIDTHS:
+        size = frame_size(width)
+        frame = largest if size == FRAME else largest.resize(
+            size, Image.LANCZOS
+        )
+        for image_format, _, _, options in supported_formats():
+            buffer = BytesIO()
+            frame.save(buffer, image_format, **options)
+            yield image_format, size[0], size[1], buffer.getvalue()
+
+
+def _file_name(source, width, extension):
+    digest = hashlib.sha1(source.encode()).hexdigest()
+    stem = os.path.splitext(os.path.basename(source))[0]
+    return (
+        f'derivatives/{digest[:2]}/{digest[2:10]}_{stem}_{width}.{extension}'
+    )
+
+
+def build(image):
+    """Строит и сохраняет производные картинки, заменяя прежние.
+
+    Новые файлы пишутся до транзакции и удаляются, если она откатилась;
+    прежние удаляются только после её фиксации. Вызывается вне внешней
+    транзакции: её откат после возврата файлы не уберёт.
+    """
+    extensions = {spec[0]: spec[2] for spec in FORMATS}
+    with image.open('rb'):
+        rendered = list(render(image))
+    derivatives = []
+    try:
+        for image_format, width, height, content in rendered:
+            derivatives.append(ImageDerivative(
+                source=image.name,
+                format=image_format,
+                width=width,
+                height=height,
+                file=default_storage.save(
+                    _file_name(image.name, width, extensions[image_format]),
+                    ContentFile(content),
+                ),
+                size=len(content),
+            ))
+        with transaction.atomic():
+            delete(image.name)
+            ImageDerivative.objects.bulk_create(derivatives)
+    except Exception:
+        _delete_files(derivative.file.name for derivative in derivatives)
+        raise
+    return derivatives
+
+
+def exist(source):
+    return ImageDerivative.objects.filter(source=source).exists()
+
+
+def delete(source):
+    """Удаляет записи производных, а их файлы — после фиксации."""
+    old = ImageDerivative.objects.filter(source=source)
+    names = list(old.values_list('file', flat=True))
+    old.delete()
+    if names:
+        transaction.on_commit(lambda: _delete_files(names))
+
+
+def _delete_files(names):
+    for name in names:
+        default_storage.delete(name)
+
+
+class ImageSources:
+    """Наборы srcset картинки: <source> для новых форматов и <img>."""
+    sizes = SIZES
+
+    def __init__(self, derivatives):
+        mime = {spec[0]: spec[1] for spec in FORMATS}
+        by_format = defaultdict(list)
+        for derivative in sorted(derivatives, key=lambda item: item.width):
+            by_format[derivative.format].append(
+                f'{derivative.file.url} {derivative.width}w'
+            )
+        self.modern = [
+            {'type': mime[image_format], 'srcset': ', '.join(candidates)}
+            for image_format, candidates in sorted(
+                by_format.items(), key=lambda item: list(mime).index(item[0])
+            )
+            if image_format != FALLBACK_FORMAT
+        ]
+        self.srcset = ', '.join(by_format.get(FALLBACK_FORMAT, []))
+
+    def __bool__(self):
+        return bool(self.srcset or self.modern)
+
+
+def sources_for(image):
+    if not image:
+        return ImageSources([])
+    return ImageSources(ImageDerivative.objects.filter(source=image.name))
+
+
+def attach_derivatives(posts):
+    """Прикрепляет к постам наборы srcset (post.image_sources)."""
+    names = {post.image.name for post in posts if post.image}
+    by_source = defaultdict(list)
+    if names:
+        for derivative in ImageDerivative.objects.filter(source__in=names):
+            by_source[derivative.source].append(derivative)
+    for post in posts:
+        post.image_sources = ImageSources(by_source.get(post.image.name, []))
+    return posts
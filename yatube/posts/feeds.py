@@ -0,0 +1,73 @@
+"""Ленты постов: общие для HTML-страниц и JSON API.
+
+Лента — queryset постов в порядке FEED_ORDERING и число постов из
+поддерживаемого счётчика (posts.counters), чтобы страницы и API
+выдавали одно и то же.
+"""
+from functools import partial
+
+from django.db.models import Max
+from django.shortcuts import get_object_or_404
+from django.utils.functional import cached_property
+
+from . import counters
+from .models import Group, Post, User
+from .utils import get_page_of_paginator
+
+
+class Feed:
+    """Посты ленты, их число и владелец ленты: группа или автор."""
+
+    def __init__(self, posts, count, owner=None):
+        self.posts = posts
+        self._count = count
+        self.owner = owner
+
+    @cached_property
+    def count(self):
+        return self._count() if callable(self._count) else self._count
+
+    def page(self, request):
+        """Страница ленты по ?cursor или ?page; счётчик читается лениво."""
+        return get_page_of_paginator(
+            request, self.posts, count=lambda: self.count
+        )
+
+    @cached_property
+    def last_modified(self):
+        """Время последней правки поста ленты по индексу updated_at."""
+        return self.posts.order_by().aggregate(
+            last=Max('updated_at')
+        )['last']
+
+
+def site_feed():
+    return Feed(
+        Post.objects.select_related('author', 'group').all(),
+        partial(counters.get_count, counters.GLOBAL_SCOPE),
+    )
+
+
+def group_feed(group):
+    return Feed(
+        group.posts.select_related('author', 'group'), group.posts_count,
+        owner=group,
+    )
+
+
+def author_feed(author):
+    return Feed(
+        author.posts.select_related('author', 'group'),
+        partial(counters.author_posts_count, author),
+        owner=author,
+    )
+
+
+def get_group(slug):
+    return get_object_or_404(Group, slug=slug)
+
+
+def get_author(username):
+    return get_object_or_404(
+        User.objects.select_related('profile'), username=username
+    )
@@ -1,9 +1,13 @@
 from django import forms
 
+from . import export
 from .models import Comment, Post
+from .uploads import BoundedImageField
 
 
 class PostForm(forms.ModelForm):
+    image = BoundedImageField(label='Картинка', required=False)
+
     class Meta:
         model = Post
         fields = ('group', 'text', 'image')
@@ -27,3 +31,32 @@ class CommentForm(forms.ModelForm):
         if data == '':
             raise forms.ValidationError('А кто поле будет заполнять, Пушкин?')
         return data
+
+
+class ExportForm(forms.Form):
+    """Параметры выгрузки из строки запроса; пустые берутся по умолчанию."""
+    kind = forms.ChoiceField(
+        choices=[(kind, kind) for kind in export.EXPORTS], required=False
+    )
+    format = forms.ChoiceField(
+        choices=[(name, name) for name in export.FORMATS], required=False
+    )
+    group = forms.SlugField(required=False)
+    author = forms.CharField(max_length=150, required=False)
+    since = forms.DateTimeField(required=False)
+    until = forms.DateTimeField(required=False)
+    gzip = forms.BooleanField(required=False)
+
+    def clean_kind(self):
+        return self.cleaned_data['kind'] or 'posts'
+
+    def clean_format(self):
+        return self.cleaned_data['format'] or 'jsonl'
+
+    def clean(self):
+        data = super().clean()
+        supported = export.EXPORTS[data.get('kind', 'posts')].filters
+        for name in export.FILTERS:
+            if data.get(name) and not supported[name]:
+                self.add_error(name, 'Этот фильтр здесь не поддерживается.')
+        return data
@@ -0,0 +1,60 @@
+"""Фоновые задания в пуле потоков процесса.
+
+Задание, поставленное через defer, уходит в пул после фиксации
+транзакции: поток видит записанные ею строки, а откат задание
+отменяет. У каждого потока своё соединение с базой. С
+BACKGROUND_WORKERS = 0 задания выполняются сразу в текущем потоке, а
+отложенные (delay) не выполняются: их подбирает периодическая команда,
+например backfill_thumbnails.
+"""
+import logging
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.BACKGROUND_WORKERS,
+            thread_name_prefix='jobs',
+        )
+    return _executor
+
+
+def run_in_thread(function, *args):
+    """function(*args) для потока пула; ошибка пишется в журнал."""
+    close_old_connections()
+    try:
+        return function(*args)
+    except Exception:
+        logger.exception('Фоновое задание %s не выполнено', function.__name__)
+        return None
+    finally:
+        close_old_connections()
+
+
+def submit(function, *args, delay=0):
+    """Выполняет function(*args) в пуле, с delay — через delay секунд."""
+    if not settings.BACKGROUND_WORKERS:
+        return None if delay else function(*args)
+    if delay:
+        timer = threading.Timer(delay, submit, (function, *args))
+        timer.daemon = True
+        timer.start()
+        return None
+    _get_executor().submit(run_in_thread, function, *args)
+    return None
+
+
+def defer(function, *args, delay=0):
+    """Выполняет function(*args) в пуле после фиксации транзакции."""
+    transaction.on_commit(lambda: submit(function, *args, delay=delay))
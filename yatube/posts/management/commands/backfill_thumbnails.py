@@ -0,0 +1,59 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from posts import thumbnails
+from posts.models import ImageDerivative, Post, ThumbnailJob
+
+
+class Command(BaseCommand):
+    help = (
+        'Ставит в очередь миниатюры и производные картинок, которых ещё '
+        'нет, и выполняет все ожидающие задания в несколько потоков. '
+        'Повторяет и задания, прерванные ошибкой или падением процесса, '
+        'поэтому подходит для периодического запуска (cron).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=settings.BACKGROUND_WORKERS,
+            help='Число потоков; 0 — выполнить задания в текущем потоке.',
+        )
+
+    def handle(self, *args, **options):
+        recovered = thumbnails.recover_stale()
+        queued = set(ThumbnailJob.objects.filter(
+            status=ThumbnailJob.PENDING
+        ).values_list('image', flat=True))
+        with_derivatives = set(ImageDerivative.objects.values_list(
+            'source', flat=True
+        ).distinct())
+        posts = Post.objects.exclude(image='').only('pk', 'image')
+        created = 0
+        for post in posts.iterator():
+            name = post.image.name
+            if name in queued or (
+                name in with_derivatives and thumbnails.lookup(post.image)
+            ):
+                continue
+            ThumbnailJob.objects.create(post=post, image=name)
+            queued.add(name)
+            created += 1
+        job_ids = list(ThumbnailJob.objects.filter(
+            status=ThumbnailJob.PENDING
+        ).values_list('pk', flat=True))
+        self.stdout.write(
+            f'Новых заданий: {created}, прерванных: {recovered}, '
+            f'к выполнению: {len(job_ids)}'
+        )
+        if options['workers']:
+            with ThreadPoolExecutor(options['workers']) as executor:
+                results = list(executor.map(
+                    thumbnails.run_in_thread, job_ids
+                ))
+        else:
+            results = [thumbnails.run_job(pk) for pk in job_ids]
+        self.stdout.write(self.style.SUCCESS(
+            f'Миниатюр создано: {sum(results)}, '
+            f'не удалось: {len(results) - sum(results)}'
+        ))
@@ -0,0 +1,247 @@
+import asyncio
+import itertools
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+from importlib.util import find_spec
+
+from core.metrics import percentile
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+from posts.models import Group, Post, User
+
+HOST = '127.0.0.1'
+START_TIMEOUT = 30
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind((HOST, 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, process):
+    deadline = time.monotonic() + START_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise CommandError(
+                f'Сервер завершился с кодом {process.returncode}'
+            )
+        try:
+            socket.create_connection((HOST, port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise CommandError(f'Сервер не принял соединение за {START_TIMEOUT} с')
+
+
+def group_rss_kb(pgid):
+    """Суммарная резидентная память процессов группы pgid (Linux)."""
+    if not os.path.isdir('/proc'):
+        return 0
+    total = 0
+    for name in os.listdir('/proc'):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f'/proc/{name}/stat') as stat:
+                fields = stat.read().rsplit(')', 1)[1].split()
+        except OSError:
+            continue
+        # После имени: state, ppid, pgrp, ..., rss — 22-е поле.
+        if int(fields[2]) == pgid:
+            total += int(fields[21]) * PAGE_SIZE // 1024
+    return total
+
+
+async def fetch(port, url):
+    """GET по HTTP/1.1 с новым соединением; возвращает код ответа."""
+    reader, writer = await asyncio.open_connection(HOST, port)
+    try:
+        writer.write(
+            f'GET {url} HTTP/1.1\r\nHost: localhost\r\n'
+            f'Connection: close\r\n\r\n'.encode('latin-1')
+        )
+        await writer.drain()
+        status_line = await reader.readline()
+        while await reader.read(65536):
+            pass
+    finally:
+        writer.close()
+    return int(status_line.split()[1])
+
+
+async def send_requests(port, queue, timings, errors):
+    """Клиент: запросы по очереди адресов, пока она не кончится."""
+    for url in queue:
+        started = time.perf_counter()
+        try:
+            status = await fetch(port, url)
+        except (OSError, IndexError, ValueError):
+            status = 599
+        timings.append((time.perf_counter() - started) * 1000)
+        if status >= 400:
+            errors.append(url)
+
+
+async def sample_rss(pgid, done):
+    """Пик памяти группы процессов, пока не установлено событие done."""
+    peak = 0
+    while not done.is_set():
+        peak = max(peak, group_rss_kb(pgid))
+        try:
+            await asyncio.wait_for(done.wait(), 0.05)
+        except asyncio.TimeoutError:
+            pass
+    return peak
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает отдачу страниц через настоящие серверы: gunicorn с '
+        'одним процессом и --threads потоками (WSGI, yatube.wsgi) и '
+        'uvicorn с ASGI-мостом yatube.asgi на столько же потоков Django. '
+        'Клиенты шлют одновременные запросы по TCP. Печатает ответы в '
+        'секунду, задержки и пик резидентной памяти серверов (Linux). '
+        'Нужны пакеты uvicorn и gunicorn.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument(
+            '--concurrency', type=int, default=64,
+            help='Одновременных клиентов.',
+        )
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument(
+            '--output', '-o', help='Файл для результатов в JSON.'
+        )
+
+    def handle(self, *args, **options):
+        if min(options['threads'], options['concurrency'],
+               options['requests']) < 1:
+            raise CommandError('Числа потоков, клиентов и запросов — от 1')
+        missing = [
+            name for name in ('uvicorn', 'gunicorn') if find_spec(name) is None
+        ]
+        if missing:
+            raise CommandError(
+                f'Не установлены: {", ".join(missing)} (pip install ...)'
+            )
+        urls = self.urls()
+        report = {'threads': options['threads'],
+                  'concurrency': options['concurrency']}
+        for name in ('wsgi', 'asgi'):
+            report[name] = self.serve_and_measure(name, urls, options)
+        for name in ('wsgi', 'asgi'):
+            result = report[name]
+            self.stdout.write(
+                f'{name.upper()}: {result["rps"]:.0f} ответов/с, '
+                f'p50 {result["p50_ms"]:.1f} мс, '
+                f'p95 {result["p95_ms"]:.1f} мс, '
+                f'p99 {result["p99_ms"]:.1f} мс, '
+                f'ошибок {result["errors"]}, '
+                f'память {result["rss_peak_kb"]} КБ'
+            )
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                json.dump(report, output, ensure_ascii=False, indent=2)
+
+    def urls(self):
+        post = Post.objects.order_by('-comments_count', '-pk').first()
+        group = Group.objects.order_by('-posts_count', 'pk').first()
+        author = User.objects.order_by('-profile__posts_count', 'pk').first()
+        if post is None or group is None:
+            raise CommandError(
+                'Нет постов или групп: заполните базу командой seed_bench'
+            )
+        return [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': group.slug}),
+            reverse('posts:profile', kwargs={'username': author.username}),
+            reverse('posts:post_detail', kwargs={'post_id': post.pk}),
+            reverse('posts:post_comments', kwargs={'post_id': post.pk}),
+            reverse('posts:api_index'),
+        ]
+
+    def server_command(self, name, port, threads):
+        if name == 'wsgi':
+            return [
+                sys.executable, '-m', 'gunicorn', 'yatube.wsgi:application',
+                '--bind', f'{HOST}:{port}', '--workers', '1',
+                '--worker-class', 'gthread', '--threads', str(threads),
+                '--log-level', 'warning',
+            ]
+        return [
+            sys.executable, '-m', 'uvicorn', 'yatube.asgi:application',
+            '--host', HOST, '--port', str(port), '--workers', '1',
+            '--no-access-log', '--log-level', 'warning',
+        ]
+
+    def serve_and_measure(self, name, urls, options):
+        port = free_port()
+        environment = {
+            **os.environ,
+            'DJANGO_SETTINGS_MODULE': os.environ.get(
+                'DJANGO_SETTINGS_MODULE', 'yatube.settings'
+            ),
+            'ASGI_THREADS': str(options['threads']),
+        }
+        # Своя группа процессов: память считается по ней вместе с
+        # процессами-воркерами gunicorn.
+        process = subprocess.Popen(
+            self.server_command(name, port, options['threads']),
+            cwd=settings.BASE_DIR, env=environment, start_new_session=True,
+        )
+        try:
+            wait_for_port(port, process)
+            return self.measure(port, process.pid, urls, options)
+        finally:
+            process.terminate()
+            try:
+                process.wait(timeout=START_TIMEOUT)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+
+    def measure(self, port, pgid, urls, options):
+        timings = []
+        errors = []
+        queue = itertools.islice(itertools.cycle(urls), options['requests'])
+
+        async def main():
+            # Прогрев: первый сервер не должен платить за наполнение кэша
+            # и импорт шаблонов.
+            for url in urls:
+                await fetch(port, url)
+            done = asyncio.Event()
+            sampler = asyncio.ensure_future(sample_rss(pgid, done))
+            started = time.perf_counter()
+            await asyncio.gather(*(
+                send_requests(port, queue, timings, errors)
+                for _ in range(options['concurrency'])
+            ))
+            elapsed = time.perf_counter() - started
+            done.set()
+            return elapsed, await sampler
+
+        loop = asyncio.new_event_loop()
+        try:
+            elapsed, rss_peak = loop.run_until_complete(main())
+        finally:
+            loop.close()
+        return {
+            'requests': len(timings),
+            'errors': len(errors),
+            'rps': len(timings) / elapsed,
+            'p50_ms': percentile(timings, 0.5),
+            'p95_ms': percentile(timings, 0.95),
+            'p99_ms': percentile(timings, 0.99),
+            'rss_peak_kb': rss_peak,
+        }
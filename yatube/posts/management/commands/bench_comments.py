@@ -0,0 +1,216 @@
+import json
+import random
+import threading
+import time
+
+from io import BytesIO
+from urllib.parse import urlencode
+
+from core.asgi import build_environ
+from core.metrics import percentile
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.db import connection, connections
+from django.http import HttpRequest
+from django.middleware.csrf import get_token
+from django.test import Client, override_settings
+from django.urls import reverse
+from posts.models import Post, User
+
+
+def call_wsgi(application, environ):
+    """Запрос к WSGI-приложению с чтением тела, как у сервера WSGI."""
+    status = {}
+
+    def start_response(value, headers, exc_info=None):
+        status['code'] = int(value.split(' ', 1)[0])
+
+    iterable = application(environ, start_response)
+    try:
+        for _ in iterable:
+            pass
+    finally:
+        if hasattr(iterable, 'close'):
+            iterable.close()
+    return status['code']
+
+
+def pragma_argument(value):
+    name, _, setting = value.partition('=')
+    if not name or not setting:
+        raise ValueError(value)
+    return name.strip(), setting.strip()
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет пропускную способность add_comment при одновременной '
+        'записи: потоки отправляют комментарии в WSGI-приложение сайта, '
+        'как потоки gunicorn --threads. Соединение с базой берётся и '
+        'закрывается (или возвращается в пул) на каждом запросе, как на '
+        'сервере: тестовый клиент Django держал бы одно соединение на '
+        'поток весь замер. Печатает настройки базы, '
+        'комментарии в секунду, задержки и число ошибок. --pragma меняет '
+        'прагмы SQLite, чтобы сравнить режимы; PostgreSQL и пул '
+        'включаются переменными DB_* (см. settings).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument(
+            '--comments', type=int, default=2000,
+            help='Всего комментариев на все потоки.',
+        )
+        parser.add_argument(
+            '--posts', type=int, default=20,
+            help='Комментарии пишутся к стольким самым обсуждаемым постам.',
+        )
+        parser.add_argument(
+            '--pragma', type=pragma_argument, action='append', default=[],
+            help='Прагма SQLite вместо settings.SQLITE_PRAGMAS, например '
+                 'journal_mode=delete.',
+        )
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument(
+            '--output', '-o', help='Файл для результатов в JSON.'
+        )
+
+    def handle(self, *args, **options):
+        threads = options['threads']
+        if threads < 1 or options['comments'] < threads:
+            raise CommandError(
+                'Нужен хотя бы один поток и комментарий на каждый поток'
+            )
+        posts = list(Post.objects.order_by(
+            '-comments_count', '-pk'
+        ).values_list('pk', flat=True)[:options['posts']])
+        users = list(User.objects.order_by('pk')[:threads])
+        if not posts or len(users) < threads:
+            raise CommandError(
+                'Нужны посты и по пользователю на поток: заполните базу '
+                'командой seed_bench'
+            )
+        pragmas = {**settings.SQLITE_PRAGMAS, **dict(options['pragma'])}
+        # Журнал медленных ответов здесь только мешает выводу.
+        with override_settings(
+            SQLITE_PRAGMAS=pragmas, METRICS_SLOW_REQUEST_SECONDS=None
+        ):
+            # Новые соединения открываются уже с этими прагмами.
+            connections.close_all()
+            report = {
+                'config': self.config(pragmas),
+                **self.run(users, posts, options),
+            }
+        connections.close_all()
+        self.stdout.write(json.dumps(report['config'], ensure_ascii=False))
+        self.stdout.write(
+            f'{report["comments"]} комментариев за {report["seconds"]:.1f} с: '
+            f'{report["comments_per_second"]:.0f} в секунду, '
+            f'p50 {report["p50_ms"]:.1f} мс, p95 {report["p95_ms"]:.1f} мс, '
+            f'p99 {report["p99_ms"]:.1f} мс, ошибок {report["errors"]}'
+        )
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                json.dump(report, output, ensure_ascii=False, indent=2)
+
+    def config(self, pragmas):
+        settings_dict = connection.settings_dict
+        config = {
+            'database': connection.vendor,
+            'engine': settings_dict['ENGINE'],
+            'conn_max_age': settings_dict['CONN_MAX_AGE'],
+            'pool': settings_dict.get('POOL') or None,
+        }
+        if connection.vendor == 'sqlite':
+            # Действующие значения: база в памяти, например, не знает
+            # mmap_size и journal_mode=wal.
+            with connection.cursor() as cursor:
+                config['pragmas'] = {}
+                for name in pragmas:
+                    cursor.execute(f'PRAGMA {name}')
+                    row = cursor.fetchone()
+                    config['pragmas'][name] = row and row[0]
+        return config
+
+    def run(self, users, posts, options):
+        threads = len(users)
+        per_thread = options['comments'] // threads
+        timings = []
+        errors = []
+        application = get_wsgi_application()
+        workers = [
+            threading.Thread(target=self.work, args=(
+                application, user, per_thread, posts,
+                random.Random(options['seed'] + number), timings, errors,
+            ))
+            for number, user in enumerate(users)
+        ]
+        started = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - started
+        if not timings:
+            raise CommandError(f'Ни одного комментария, ошибки: {errors[:3]}')
+        return {
+            'threads': threads,
+            'comments': len(timings),
+            'errors': len(errors),
+            'seconds': elapsed,
+            'comments_per_second': len(timings) / elapsed,
+            'p50_ms': percentile(timings, 0.5),
+            'p95_ms': percentile(timings, 0.95),
+            'p99_ms': percentile(timings, 0.99),
+        }
+
+    def work(self, application, user, count, posts, rng, timings,
+             errors):
+        # list.append атомарен, общие списки не требуют блокировки.
+        cookies, token = self.credentials(user)
+        try:
+            for _ in range(count):
+                self.comment(
+                    application, cookies, token, rng.choice(posts),
+                    timings, errors,
+                )
+        finally:
+            connection.close()
+
+    def credentials(self, user):
+        """Cookie сессии и CSRF вошедшего пользователя и токен для формы."""
+        client = Client()
+        client.force_login(user)
+        request = HttpRequest()
+        token = get_token(request)
+        cookies = (
+            f'{settings.SESSION_COOKIE_NAME}='
+            f'{client.cookies[settings.SESSION_COOKIE_NAME].value}; '
+            f'{settings.CSRF_COOKIE_NAME}={request.META["CSRF_COOKIE"]}'
+        )
+        return cookies, token
+
+    def comment(self, application, cookies, token, post_id, timings,
+                errors):
+        url = reverse('posts:add_comment', kwargs={'post_id': post_id})
+        body = urlencode({
+            'text': 'Проверка записи', 'csrfmiddlewaretoken': token,
+        }).encode()
+        environ = build_environ({
+            'method': 'POST',
+            'path': url,
+            'headers': [
+                (b'host', b'localhost'),
+                (b'cookie', cookies.encode('latin-1')),
+                (b'content-type', b'application/x-www-form-urlencoded'),
+                (b'content-length', str(len(body)).encode()),
+            ],
+        }, BytesIO(body))
+        started = time.perf_counter()
+        # Ошибки базы обработчик Django превращает в ответ 500.
+        status = call_wsgi(application, environ)
+        if status == 302:
+            timings.append((time.perf_counter() - started) * 1000)
+        else:
+            errors.append(f'HTTP {status}')
@@ -0,0 +1,101 @@
+import random
+
+from io import BytesIO
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from PIL import Image, ImageDraw, ImageFilter, ImageOps
+from posts.derivatives import FRAME, render
+from sorl.thumbnail.conf import settings as sorl_settings
+
+# (клиент, ширина окна в CSS-пикселях, плотность экрана, формат).
+CLIENTS = (
+    ('телефон 360px @2x', 360, 2, 'WEBP'),
+    ('телефон 412px @2.6x', 412, 2.625, 'WEBP'),
+    ('планшет 768px @2x', 768, 2, 'WEBP'),
+    ('ноутбук 1366px @1x', 1366, 1, 'WEBP'),
+    ('браузер без WebP 1366px @1x', 1366, 1, 'JPEG'),
+)
+
+
+def make_photo(rng, size=(2400, 1600)):
+    """Похожая на фотографию картинка: градиент, пятна и шум."""
+    image = Image.linear_gradient('L').resize(size).convert('RGB')
+    image = Image.merge('RGB', [
+        channel.point(lambda v, k=rng.uniform(0.3, 1): int(v * k))
+        for channel in image.split()
+    ])
+    draw = ImageDraw.Draw(image)
+    for _ in range(40):
+        x, y = rng.randrange(size[0]), rng.randrange(size[1])
+        radius = rng.randint(40, 400)
+        draw.ellipse(
+            (x - radius, y - radius, x + radius, y + radius),
+            fill=tuple(rng.randrange(256) for _ in range(3)),
+        )
+    image = image.filter(ImageFilter.GaussianBlur(6))
+    noise = Image.effect_noise(size, 12).convert('RGB')
+    image = Image.blend(image, noise, 0.06)
+    buffer = BytesIO()
+    image.save(buffer, 'JPEG', quality=90)
+    buffer.seek(0)
+    return buffer
+
+
+def baseline(photo):
+    """Нынешняя миниатюра: JPEG 960x339 с настройками sorl."""
+    image = ImageOps.fit(Image.open(photo).convert('RGB'), FRAME)
+    buffer = BytesIO()
+    image.save(
+        buffer, 'JPEG',
+        quality=sorl_settings.THUMBNAIL_QUALITY,
+        progressive=sorl_settings.THUMBNAIL_PROGRESSIVE,
+    )
+    return len(buffer.getvalue())
+
+
+def choose(sizes, viewport, density, image_format):
+    """Ширина, которую браузер выберет из srcset при sizes=SIZES."""
+    needed = min(viewport, FRAME[0]) * density
+    widths = sorted(width for fmt, width in sizes if fmt == image_format)
+    for width in widths:
+        if width >= needed:
+            return width
+    return widths[-1]
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает объём картинок на странице ленты: нынешняя миниатюра '
+        'JPEG 960x339 против производных из srcset для разных клиентов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--images', type=int, default=15)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        old_total = 0
+        new_totals = {client[0]: 0 for client in CLIENTS}
+        for _ in range(options['images']):
+            photo = make_photo(rng)
+            old_total += baseline(photo)
+            photo.seek(0)
+            sizes = {
+                (image_format, width): len(content)
+                for image_format, width, _, content in render(photo)
+            }
+            for name, viewport, density, image_format in CLIENTS:
+                width = choose(sizes, viewport, density, image_format)
+                new_totals[name] += sizes[image_format, width]
+        self.stdout.write(
+            f'Страница из {options["images"]} картинок, '
+            f'ширины {settings.IMAGE_DERIVATIVE_WIDTHS}'
+        )
+        self.stdout.write(f'сейчас: {old_total / 1024:.0f} КиБ')
+        for name, total in new_totals.items():
+            self.stdout.write(
+                f'{name}: {total / 1024:.0f} КиБ '
+                f'({1 - total / old_total:.0%} меньше)'
+            )
@@ -0,0 +1,164 @@
+import itertools
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from posts.search import (
+    AFTER_SQL, FTS_CREATE_SQL, FTS_SEARCH_SQL, FTS_SNIPPET_SQL, FTS_TABLE,
+    fts_query,
+)
+
+SYLLABLES = (
+    'ка', 'ло', 'ми', 'ро', 'ста', 'не', 'ду', 'ва', 'пре', 'зо', 'ти', 'гру',
+)
+
+
+def make_vocabulary(size, rng):
+    words = set()
+    while len(words) < size:
+        words.add(''.join(rng.choices(SYLLABLES, k=rng.randint(2, 4))))
+    return sorted(words)
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет поиск FTS5 на синтетическом корпусе во временной базе '
+        'SQLite с той же схемой и теми же запросами, что и posts.search.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=1_000_000)
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--per-page', type=int, default=10)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument(
+            '--database',
+            help='Файл базы: построенный ранее корпус используется снова.',
+        )
+
+    def fill(self, db, count, vocabulary, rng):
+        # Частоты слов по закону Ципфа, как в живых текстах.
+        weights = list(itertools.accumulate(
+            1 / rank for rank in range(1, len(vocabulary) + 1)
+        ))
+        batch = 10_000
+        for start in range(0, count, batch):
+            db.executemany(
+                f'INSERT INTO {FTS_TABLE} (rowid, text, group_title) '
+                'VALUES (?, ?, ?)',
+                (
+                    (
+                        pk,
+                        ' '.join(rng.choices(
+                            vocabulary,
+                            cum_weights=weights,
+                            k=rng.randint(10, 60),
+                        )),
+                        rng.choice(vocabulary[:50]),
+                    )
+                    for pk in range(start + 1, min(start + batch, count) + 1)
+                ),
+            )
+        db.commit()
+
+    def measure(self, db, queries, per_page, deep):
+        timings = []
+        for query in queries:
+            match = fts_query(query)
+            after, params, started = '1 = 1', [], None
+            for page in range(deep + 1):
+                # Замеряется только последняя страница, переход к ней
+                # по курсору — как у посетителя, который листает выдачу.
+                if page == deep:
+                    started = time.perf_counter()
+                rows = db.execute(
+                    FTS_SEARCH_SQL.format(after=after).replace('%s', '?'),
+                    [match, *params, per_page + 1],
+                ).fetchall()[:per_page]
+                if not rows:
+                    break
+                ids = [pk for pk, _ in rows]
+                db.execute(
+                    FTS_SNIPPET_SQL.format(
+                        ids=', '.join('?' * len(ids))
+                    ).replace('%s', '?'),
+                    [match, *ids],
+                ).fetchall()
+                pk, score = rows[-1]
+                after = AFTER_SQL.replace('%s', '?')
+                params = [score, score, pk]
+            if started is not None:
+                timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        if not timings:
+            return {'p50': 0.0, 'p95': 0.0, 'max': 0.0}
+        return {
+            'p50': statistics.median(timings),
+            'p95': timings[max(int(len(timings) * 0.95) - 1, 0)],
+            'max': timings[-1],
+        }
+
+    def build(self, path, count, vocabulary, rng):
+        db = sqlite3.connect(path)
+        db.execute(FTS_CREATE_SQL)
+        started = time.perf_counter()
+        self.fill(db, count, vocabulary, rng)
+        db.execute(
+            f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')"
+        )
+        db.commit()
+        db.close()
+        self.stdout.write(
+            f'Индекс из {count} постов построен за '
+            f'{time.perf_counter() - started:.1f} с'
+        )
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        vocabulary = make_vocabulary(20_000, rng)
+        path = options['database']
+        temporary = path is None
+        if temporary:
+            fd, path = tempfile.mkstemp(suffix='.sqlite3')
+            os.close(fd)
+            os.remove(path)
+        try:
+            if not os.path.exists(path):
+                self.build(path, options['posts'], vocabulary, rng)
+            db = sqlite3.connect(path)
+            count = options['queries']
+            kinds = {
+                'частое слово': [
+                    rng.choice(vocabulary[:20]) for _ in range(count)
+                ],
+                'редкое слово': [
+                    rng.choice(vocabulary[5000:]) for _ in range(count)
+                ],
+                'два слова': [
+                    ' '.join(rng.sample(vocabulary[:2000], 2))
+                    for _ in range(count)
+                ],
+                'префикс': [
+                    rng.choice(vocabulary[100:5000])[:4] + '*'
+                    for _ in range(count)
+                ],
+            }
+            for kind, queries in kinds.items():
+                for deep in (0, 5):
+                    result = self.measure(
+                        db, queries, options['per_page'], deep
+                    )
+                    self.stdout.write(
+                        f'{kind}, страница {deep + 1}: '
+                        f'p50 {result["p50"]:.2f} мс, '
+                        f'p95 {result["p95"]:.2f} мс, '
+                        f'max {result["max"]:.2f} мс'
+                    )
+            db.close()
+        finally:
+            if temporary and os.path.exists(path):
+                os.remove(path)
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from posts.cache import stats
+
+
+class Command(BaseCommand):
+    help = 'Показывает попадания и промахи кэша страниц лент.'
+
+    def handle(self, *args, **options):
+        values = stats()
+        self.stdout.write(
+            f'hits: {values["hits"]}\n'
+            f'misses: {values["misses"]}\n'
+            f'hit ratio: {values["hit_ratio"]:.2%}'
+        )
@@ -0,0 +1,193 @@
+import contextlib
+import csv
+import io
+import itertools
+import json
+import sys
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from posts import bulk
+from posts.models import Group, Post
+from posts.utils import chunked
+
+User = get_user_model()
+
+FORMATS = ('jsonl', 'csv')
+
+
+def lookup(model, field, values):
+    """{значение поля: id} для values несколькими запросами по IN."""
+    found = {}
+    for chunk in chunked(values):
+        found.update(model.objects.filter(
+            **{f'{field}__in': chunk}
+        ).values_list(field, 'pk'))
+    return found
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает посты из JSONL или CSV (поля author, text, group, '
+        'group_title, pub_date, image) пачками bulk_create. Счётчики, '
+        'индекс поиска, ссылки на картинки и ленты подписок обновляются '
+        'один раз в конце, а не для каждого поста.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл для загрузки; - — stdin.')
+        parser.add_argument(
+            '--format', choices=FORMATS,
+            help='Формат файла; по умолчанию — по расширению.',
+        )
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--create-missing', action='store_true',
+            help='Создавать неизвестных авторов и группы, а не '
+                 'пропускать их посты.',
+        )
+        parser.add_argument(
+            '--defer-indexes', action='store_true',
+            help='Удалить индексы лент на время загрузки.',
+        )
+
+    def handle(self, *args, **options):
+        file_format = options['format'] or (
+            'csv' if options['path'].endswith('.csv') else 'jsonl'
+        )
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть больше нуля')
+        self.create_missing = options['create_missing']
+        self.authors = {}
+        self.groups = {}
+        self.skipped = 0
+        self.with_images = False
+        started = time.monotonic()
+        loaded = 0
+        with self.open(options['path']) as source:
+            rows = self.read(source, file_format)
+            with bulk.deferred_indexes(options['defer_indexes']):
+                while True:
+                    batch = list(itertools.islice(rows, options['batch_size']))
+                    if not batch:
+                        break
+                    loaded += self.load(batch)
+                    self.stdout.write(
+                        f'Загружено {loaded}, '
+                        f'{loaded / (time.monotonic() - started):.0f} строк/с'
+                    )
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            f'Загрузка: {loaded} строк за {elapsed:.1f} с, '
+            f'{loaded / max(elapsed, 1e-9):.0f} строк/с, '
+            f'пропущено {self.skipped}'
+        )
+        self.finish()
+        total = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Импортировано постов: {loaded} за {total:.1f} с, '
+            f'{loaded / max(total, 1e-9):.0f} строк/с с учётом перестроения'
+        ))
+
+    def open(self, path):
+        if path == '-':
+            return contextlib.nullcontext(sys.stdin)
+        return io.open(path, encoding='utf-8', newline='')
+
+    def read(self, source, file_format):
+        """Строки файла словарями с номером строки, без чтения целиком."""
+        if file_format == 'csv':
+            yield from enumerate(csv.DictReader(source), start=2)
+            return
+        for number, line in enumerate(source, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield number, json.loads(line)
+            except ValueError as error:
+                yield number, error
+
+    def resolve(self, batch):
+        """Дополняет кэши id авторов и групп новыми именами из пачки."""
+        usernames = {
+            row.get('author') for _, row in batch if isinstance(row, dict)
+        } - self.authors.keys() - {None, ''}
+        slugs = {
+            row.get('group') for _, row in batch if isinstance(row, dict)
+        } - self.groups.keys() - {None, ''}
+        self.authors.update(lookup(User, 'username', usernames))
+        self.groups.update(lookup(Group, 'slug', slugs))
+        if not self.create_missing:
+            return
+        missing = usernames - self.authors.keys()
+        if missing:
+            new_users = [User(username=name) for name in missing]
+            for user in new_users:
+                user.set_unusable_password()
+            User.objects.bulk_create(new_users)
+            self.authors.update(lookup(User, 'username', missing))
+        titles = {
+            row.get('group'): row.get('group_title') or row.get('group')
+            for _, row in batch if isinstance(row, dict)
+        }
+        missing = slugs - self.groups.keys()
+        if missing:
+            Group.objects.bulk_create(
+                Group(slug=slug, title=titles[slug]) for slug in missing
+            )
+            self.groups.update(lookup(Group, 'slug', missing))
+
+    def build(self, row):
+        if not isinstance(row, dict):
+            raise ValueError(f'не JSON-объект ({row})')
+        author_id = self.authors.get(row.get('author'))
+        if author_id is None:
+            raise ValueError(f'неизвестный автор {row.get("author")!r}')
+        group_id = None
+        if row.get('group'):
+            group_id = self.groups.get(row['group'])
+            if group_id is None:
+                raise ValueError(f'неизвестная группа {row["group"]!r}')
+        if not row.get('text'):
+            raise ValueError('пустой текст')
+        pub_date = timezone.now()
+        if row.get('pub_date'):
+            pub_date = parse_datetime(row['pub_date'])
+            if pub_date is None:
+                raise ValueError(f'неверная дата {row["pub_date"]!r}')
+            if timezone.is_naive(pub_date):
+                pub_date = timezone.make_aware(pub_date)
+        image = row.get('image') or ''
+        self.with_images = self.with_images or bool(image)
+        return Post(
+            author_id=author_id,
+            group_id=group_id,
+            text=row['text'],
+            pub_date=pub_date,
+            updated_at=pub_date,
+            image=image,
+        )
+
+    def load(self, batch):
+        self.resolve(batch)
+        posts = []
+        for number, row in batch:
+            try:
+                posts.append(self.build(row))
+            except ValueError as error:
+                self.skipped += 1
+                self.stderr.write(f'Строка {number} пропущена: {error}')
+        return bulk.create(Post, posts)
+
+    def finish(self):
+        for name, elapsed in bulk.rebuild(
+            self.authors.values(), self.groups.values(), self.with_images
+        ):
+            self.stdout.write(f'Перестроено: {name}, {elapsed:.1f} с')
+        if self.with_images:
+            self.stdout.write(
+                'Миниатюры новых картинок создаст backfill_thumbnails'
+            )
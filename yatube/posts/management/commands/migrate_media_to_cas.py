@@ -0,0 +1,74 @@
+from django.conf import settings
+from django.core.files import File
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from posts import blobs, cache, derivatives
+from posts.models import ImageBlob, Post
+from posts.storage import is_content_addressed
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит картинки постов из media/posts/ в хранилище по хешу '
+        'содержимого: одинаковые файлы сливаются в один, ссылки постов '
+        'пересчитываются, старые миниатюры и производные удаляются, новые '
+        'строятся через backfill_thumbnails.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать, сколько файлов будет перенесено.',
+        )
+        parser.add_argument(
+            '--keep-originals', action='store_true',
+            help='Не удалять файлы в старой раскладке.',
+        )
+        parser.add_argument(
+            '--workers', type=int, default=settings.BACKGROUND_WORKERS,
+        )
+
+    def handle(self, *args, **options):
+        storage = Post._meta.get_field('image').storage
+        names = [
+            name for name in Post.objects.exclude(image='').values_list(
+                'image', flat=True
+            ).distinct().iterator()
+            if not is_content_addressed(name)
+        ]
+        self.stdout.write(f'Файлов в старой раскладке: {len(names)}')
+        if options['dry_run']:
+            return
+        targets = set()
+        missing = 0
+        for name in names:
+            if not storage.exists(name):
+                self.stderr.write(f'Нет файла: {name}')
+                missing += 1
+                continue
+            with storage.open(name) as source:
+                target = storage.save(name, File(source))
+            targets.add(target)
+            Post.objects.filter(image=name).update(image=target)
+            # Миниатюры и производные старого имени больше не нужны.
+            default.kvstore.delete(
+                ImageFile(name, storage),
+                delete_thumbnails=not options['keep_originals'],
+            )
+            derivatives.delete(name)
+            if not options['keep_originals']:
+                storage.delete(name)
+        blobs.recount()
+        ImageBlob.objects.filter(name__in=names, refs=0).delete()
+        # Карточки в кэше ссылаются на старые миниатюры.
+        cache.invalidate(cache.SITE_SCOPE)
+        self.stdout.write(self.style.SUCCESS(
+            f'Перенесено: {len(names) - missing}, '
+            f'уникальных файлов: {len(targets)}, без файла: {missing}'
+        ))
+        call_command(
+            'backfill_thumbnails', workers=options['workers'],
+            stdout=self.stdout,
+        )
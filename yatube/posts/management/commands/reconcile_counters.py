@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from posts.counters import reconcile
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает счётчики постов, комментариев и подписчиков '
+        '(общий, групп, профилей авторов, постов) групповыми запросами и '
+        'исправляет расхождения. Рассчитана на периодический запуск (cron).'
+    )
+
+    def handle(self, *args, **options):
+        fixed = reconcile()
+        for kind, count in fixed.items():
+            self.stdout.write(f'{kind}: исправлено {count}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Исправлено счётчиков: {sum(fixed.values())}'
+        ))
@@ -0,0 +1,221 @@
+import json
+import platform
+import statistics
+import time
+import tracemalloc
+
+import django
+
+from core.metrics import percentile
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from posts.cache import SITE_SCOPE, invalidate
+from posts.models import Comment, Group, Post, User
+from posts.urls import app_name, urlpatterns
+from users.backends import forget_user
+
+
+def consume(response):
+    # Потоковый ответ выполняет запросы при чтении тела.
+    if response.streaming:
+        for _ in response.streaming_content:
+            pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет все адреса posts.urls через тестовый клиент: время '
+        'ответа p50/p95/p99, число SQL-запросов и пик памяти Python на '
+        'ответ. Страницы, закрытые для гостя, запрашивает автор самого '
+        'обсуждаемого поста с правами персонала; все изменения в базе '
+        'откатываются, а записанное по ним в кэш сбрасывается. Действия '
+        'после фиксации (фоновые задания) при замере не выполняются. '
+        'Результат пишется в JSON, --compare сравнивает '
+        'его с прежним замером.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument(
+            '--warmup', type=int, default=2,
+            help='Незамеряемые запросы перед замером каждого адреса.',
+        )
+        parser.add_argument(
+            '--cold', action='store_true',
+            help='Очищать кэш перед каждым запросом.',
+        )
+        parser.add_argument(
+            '--output', '-o', help='Файл для результатов в JSON.'
+        )
+        parser.add_argument(
+            '--compare', help='JSON прежнего замера для сравнения.'
+        )
+        parser.add_argument(
+            '--max-regression', type=float,
+            help='Допустимый рост p95 к прежнему замеру, доля (0.2 — '
+                 'на 20%%). Рост сверх него или рост числа запросов '
+                 'завершает команду ошибкой.',
+        )
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1:
+            raise CommandError('--iterations должен быть больше нуля')
+        self.user = None
+        try:
+            with transaction.atomic():
+                targets = self.targets()
+                results = {
+                    name: self.measure(url, options)
+                    for name, url in targets.items()
+                }
+                transaction.set_rollback(True)
+        finally:
+            self.forget_rolled_back()
+        report = {'meta': self.meta(options), 'views': results}
+        for name, result in results.items():
+            self.stdout.write(
+                f'{name}: {result["status"]}, p50 {result["p50_ms"]:.1f} мс, '
+                f'p95 {result["p95_ms"]:.1f} мс, '
+                f'p99 {result["p99_ms"]:.1f} мс, '
+                f'запросов {result["queries"]}, '
+                f'память {result["alloc_peak_kb"]:.0f} КБ'
+            )
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                json.dump(report, output, ensure_ascii=False, indent=2)
+        if options['compare']:
+            self.compare(report, options['compare'], options['max_regression'])
+
+    def targets(self):
+        """Адрес каждого пути posts.urls на самых нагруженных объектах."""
+        post = Post.objects.order_by(
+            '-comments_count', '-pk'
+        ).select_related('author').first()
+        group = Group.objects.order_by('-posts_count', 'pk').first()
+        if post is None or group is None:
+            raise CommandError(
+                'Нет постов или групп: заполните базу командой seed_bench'
+            )
+        author = User.objects.order_by('-profile__posts_count', 'pk').first()
+        sample = {
+            'slug': group.slug,
+            'username': author.username,
+            'post_id': post.pk,
+        }
+        # Закрытые страницы открывает автор поста: ему доступна правка.
+        self.user = post.author
+        User.objects.filter(pk=self.user.pk).update(is_staff=True)
+        forget_user(self.user.pk)
+        self.guest = Client()
+        self.member = Client()
+        self.member.force_login(self.user)
+        return {
+            f'{app_name}:{pattern.name}': reverse(
+                f'{app_name}:{pattern.name}',
+                kwargs={
+                    key: sample[key] for key in pattern.pattern.converters
+                },
+            )
+            for pattern in urlpatterns
+        }
+
+    def forget_rolled_back(self):
+        """Сбрасывает кэши, заполненные по откаченным изменениям."""
+        if self.user is not None:
+            forget_user(self.user.pk)
+        invalidate(SITE_SCOPE)
+
+    def client_for(self, url):
+        """Гость, если адрес открыт для гостя, иначе пользователь."""
+        response = self.guest.get(url)
+        consume(response)
+        if response.status_code == 302:
+            match = resolve(response.url.split('?')[0])
+            if match.url_name == 'login':
+                return self.member
+        return self.guest
+
+    def measure(self, url, options):
+        client = self.client_for(url)
+        for _ in range(options['warmup']):
+            consume(client.get(url))
+        timings = []
+        queries = []
+        for _ in range(options['iterations']):
+            if options['cold']:
+                cache.clear()
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = client.get(url)
+                consume(response)
+                timings.append((time.perf_counter() - started) * 1000)
+            queries.append(len(captured))
+        # Трассировка памяти замедляет ответ: отдельный запрос.
+        if options['cold']:
+            cache.clear()
+        tracemalloc.start()
+        try:
+            consume(client.get(url))
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return {
+            'url': url,
+            'user': 'user' if client is self.member else 'guest',
+            'status': response.status_code,
+            'iterations': len(timings),
+            'p50_ms': percentile(timings, 0.5),
+            'p95_ms': percentile(timings, 0.95),
+            'p99_ms': percentile(timings, 0.99),
+            'mean_ms': statistics.mean(timings),
+            'queries': max(queries),
+            'alloc_peak_kb': peak / 1024,
+        }
+
+    def meta(self, options):
+        return {
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'iterations': options['iterations'],
+            'cold': options['cold'],
+            'rows': {
+                'posts': Post.objects.count(),
+                'comments': Comment.objects.count(),
+                'groups': Group.objects.count(),
+                'users': User.objects.count(),
+            },
+        }
+
+    def compare(self, report, path, max_regression):
+        with open(path, encoding='utf-8') as source:
+            baseline = json.load(source)
+        regressions = []
+        for name, result in report['views'].items():
+            before = baseline['views'].get(name)
+            if before is None:
+                self.stdout.write(f'{name}: нет в прежнем замере')
+                continue
+            change = result['p95_ms'] / max(before['p95_ms'], 1e-9) - 1
+            self.stdout.write(
+                f'{name}: p95 {before["p95_ms"]:.1f} → '
+                f'{result["p95_ms"]:.1f} мс ({change:+.0%}), запросов '
+                f'{before["queries"]} → {result["queries"]}'
+            )
+            if max_regression is None:
+                continue
+            if change > max_regression:
+                regressions.append(f'{name}: p95 {change:+.0%}')
+            if result['queries'] > before['queries']:
+                regressions.append(
+                    f'{name}: запросов {before["queries"]} → '
+                    f'{result["queries"]}'
+                )
+        if regressions:
+            raise CommandError(
+                'Хуже прежнего замера:\n' + '\n'.join(regressions)
+            )
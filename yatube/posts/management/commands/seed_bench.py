@@ -0,0 +1,234 @@
+import itertools
+import random
+import time
+
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max
+from django.utils import timezone
+from faker import Faker
+from posts import bulk
+from posts.models import Comment, Follow, Group, GroupFollow, Post
+
+User = get_user_model()
+
+# Посты распределены по последним трём годам.
+HISTORY = timedelta(days=3 * 365)
+# Доля постов в группах; остальные без группы.
+GROUPED_SHARE = 0.7
+# Тексты берутся из заранее созданного набора: Faker на миллионы
+# строк работал бы дольше самой записи.
+TEXTS = 2000
+
+
+class Skewed:
+    """Выбор значений по закону Ципфа: немногие встречаются часто.
+
+    Порядок значений перемешан, чтобы популярными были не первые
+    созданные авторы, группы и посты.
+    """
+
+    def __init__(self, values, rng):
+        self.values = list(values)
+        rng.shuffle(self.values)
+        self.weights = list(itertools.accumulate(
+            1 / rank for rank in range(1, len(self.values) + 1)
+        ))
+        self.rng = rng
+
+    def sample(self, k):
+        return self.rng.choices(self.values, cum_weights=self.weights, k=k)
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет базу для замеров (run_bench): пользователи, группы, '
+        'посты, комментарии и подписки с перекосом, как у живого сайта: '
+        'у немногих авторов и групп — большая часть постов и подписчиков, '
+        'у немногих постов — большая часть комментариев. Запись пачками '
+        'bulk_create, счётчики и ленты перестраиваются один раз в конце.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10_000)
+        parser.add_argument('--groups', type=int, default=200)
+        parser.add_argument('--posts', type=int, default=1_000_000)
+        parser.add_argument('--comments', type=int, default=3_000_000)
+        parser.add_argument('--follows', type=int, default=100_000)
+        parser.add_argument('--group-follows', type=int, default=20_000)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument(
+            '--defer-indexes', action='store_true',
+            help='Удалить индексы лент на время записи постов.',
+        )
+
+    def handle(self, *args, **options):
+        if options['users'] < 2 or options['groups'] < 1:
+            raise CommandError('Нужны хотя бы два пользователя и одна группа')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть больше нуля')
+        self.rng = random.Random(options['seed'])
+        self.fake = Faker('ru_RU')
+        self.fake.seed_instance(options['seed'])
+        self.batch_size = options['batch_size']
+        self.now = timezone.now()
+        started = time.monotonic()
+        user_ids = self.step('пользователи', self.create_users,
+                             options['users'])
+        group_ids = self.step('группы', self.create_groups, options['groups'])
+        self.texts = [
+            self.fake.paragraph(nb_sentences=self.rng.randint(1, 8))
+            for _ in range(TEXTS)
+        ]
+        self.remarks = [
+            self.fake.sentence(nb_words=self.rng.randint(2, 20))
+            for _ in range(TEXTS)
+        ]
+        with bulk.deferred_indexes(options['defer_indexes']):
+            post_ids = self.step(
+                'посты', self.create_posts, options['posts'],
+                user_ids, group_ids,
+            )
+        self.step(
+            'комментарии', self.create_comments, options['comments'],
+            user_ids, post_ids,
+        )
+        self.step(
+            'подписки на авторов', self.create_follows, options['follows'],
+            Follow, 'author_id', user_ids, user_ids,
+        )
+        self.step(
+            'подписки на группы', self.create_follows,
+            options['group_follows'], GroupFollow, 'group_id', user_ids,
+            group_ids,
+        )
+        for name, elapsed in bulk.rebuild(user_ids, group_ids):
+            self.stdout.write(f'Перестроено: {name}, {elapsed:.1f} с')
+        self.stdout.write(self.style.SUCCESS(
+            f'База заполнена за {time.monotonic() - started:.1f} с'
+        ))
+
+    def step(self, name, create, count, *args):
+        started = time.monotonic()
+        created = create(count, *args)
+        elapsed = time.monotonic() - started
+        total = created if isinstance(created, int) else len(created)
+        self.stdout.write(
+            f'Создано: {name} — {total} за {elapsed:.1f} с, '
+            f'{total / max(elapsed, 1e-9):.0f} строк/с'
+        )
+        return created
+
+    def write(self, model, objects, ids=True):
+        """Пишет объекты пачками; возвращает id новых строк по порядку.
+
+        bulk.create не заполняет pk, поэтому id читаются после
+        записи. С ids=False возвращается только число строк.
+        """
+        last = model.objects.aggregate(last=Max('pk'))['last'] or 0
+        objects = iter(objects)
+        written = 0
+        while True:
+            batch = list(itertools.islice(objects, self.batch_size))
+            if not batch:
+                break
+            written += bulk.create(model, batch)
+        if not ids:
+            return written
+        return list(model.objects.filter(pk__gt=last).order_by(
+            'pk'
+        ).values_list('pk', flat=True))
+
+    def create_users(self, count):
+        # Номер в имени — для уникальности и при повторном заполнении.
+        start = (User.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+
+        def users():
+            for number in range(start, start + count):
+                user = User(
+                    username=f'{self.fake.user_name()}{number}',
+                    first_name=self.fake.first_name(),
+                    last_name=self.fake.last_name(),
+                )
+                user.set_unusable_password()
+                yield user
+        return self.write(User, users())
+
+    def create_groups(self, count):
+        start = (Group.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+        return self.write(Group, (
+            Group(
+                slug=f'bench-{number}',
+                title=self.fake.sentence(nb_words=3).rstrip('.'),
+                description=self.fake.paragraph(),
+            )
+            for number in range(start, start + count)
+        ))
+
+    def pub_date(self, index, count):
+        # Посты идут по времени в порядке создания, как на сайте.
+        return self.now - HISTORY * (1 - index / count)
+
+    def create_posts(self, count, user_ids, group_ids):
+        authors = Skewed(user_ids, self.rng)
+        groups = Skewed(group_ids, self.rng)
+        self.post_count = count
+
+        def posts():
+            for index, author_id in enumerate(authors.sample(count)):
+                pub_date = self.pub_date(index, count)
+                yield Post(
+                    author_id=author_id,
+                    group_id=(
+                        groups.sample(1)[0]
+                        if self.rng.random() < GROUPED_SHARE else None
+                    ),
+                    text=self.rng.choice(self.texts),
+                    pub_date=pub_date,
+                    updated_at=pub_date,
+                )
+        return self.write(Post, posts())
+
+    def create_comments(self, count, user_ids, post_ids):
+        if not post_ids:
+            return []
+        indexes = Skewed(range(len(post_ids)), self.rng)
+        authors = Skewed(user_ids, self.rng)
+
+        def comments():
+            for index, author_id in zip(
+                indexes.sample(count), authors.sample(count)
+            ):
+                # Комментарии приходят в первые часы после поста.
+                created = min(self.now, self.pub_date(
+                    index, self.post_count
+                ) + timedelta(hours=self.rng.expovariate(1 / 12)))
+                yield Comment(
+                    post_id=post_ids[index],
+                    author_id=author_id,
+                    text=self.rng.choice(self.remarks),
+                    created=created,
+                )
+        return self.write(Comment, comments(), ids=False)
+
+    def create_follows(self, count, model, target, user_ids, target_ids):
+        """Подписки: подписчики равномерно, цели — по закону Ципфа."""
+        targets = Skewed(target_ids, self.rng)
+        existing = set(model.objects.values_list('user_id', target))
+        pairs = set()
+        # Популярные цели быстро заняты: число попыток ограничено.
+        for _ in range(count * 10):
+            if len(pairs) >= count:
+                break
+            pair = (self.rng.choice(user_ids), targets.sample(1)[0])
+            if model is Follow and pair[0] == pair[1]:
+                continue
+            if pair not in existing:
+                pairs.add(pair)
+        return self.write(model, (
+            model(user_id=user_id, **{target: target_id})
+            for user_id, target_id in pairs
+        ), ids=False)
@@ -0,0 +1,43 @@
+# Generated by Django 2.2.16 on 2026-10-18 04:13
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_counters(apps, schema_editor):
+    Group = apps.get_model('posts', 'Group')
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    PostCounter = apps.get_model('posts', 'PostCounter')
+    Group.objects.update(posts_count=Coalesce(Subquery(
+        Post.objects.filter(group=OuterRef('pk')).order_by()
+        .values('group').annotate(total=Count('pk')).values('total')
+    ), Value(0)))
+    Post.objects.update(comments_count=Coalesce(Subquery(
+        Comment.objects.filter(post=OuterRef('pk')).order_by()
+        .values('post').annotate(total=Count('pk')).values('total')
+    ), Value(0)))
+    # Группы и авторы теперь считаются в полях моделей.
+    PostCounter.objects.exclude(scope='posts').delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0007_postcounter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='group',
+            name='posts_count',
+            field=models.IntegerField(default=0, verbose_name='posts_count'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.IntegerField(default=0, verbose_name='comments_count'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
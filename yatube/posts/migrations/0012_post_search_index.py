@@ -0,0 +1,47 @@
+from django.db import migrations
+
+FTS_TABLE = 'posts_post_fts'
+
+
+def create_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} '
+            'USING fts5(text, group_title, '
+            "tokenize='unicode61', prefix='3 4')"
+        )
+        schema_editor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, text, group_title) '
+            "SELECT p.id, p.text, COALESCE(g.title, '') FROM posts_post p "
+            'LEFT JOIN posts_group g ON g.id = p.group_id'
+        )
+    elif vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE INDEX IF NOT EXISTS post_text_search_idx ON posts_post '
+            "USING GIN (to_tsvector('russian', text))"
+        )
+        schema_editor.execute(
+            'CREATE INDEX IF NOT EXISTS group_title_search_idx '
+            "ON posts_group USING GIN (to_tsvector('russian', title))"
+        )
+
+
+def drop_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+    elif vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS post_text_search_idx')
+        schema_editor.execute('DROP INDEX IF EXISTS group_title_search_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0011_post_updated_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 2.2.16 on 2026-10-18 04:51
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0012_post_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ThumbnailJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('image', models.CharField(max_length=255, verbose_name='image_name')),
+                ('status', models.CharField(choices=[('pending', 'В очереди'), ('running', 'Выполняется'), ('done', 'Готово'), ('failed', 'Ошибка')], default='pending', max_length=16, verbose_name='job_status')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='job_attempts')),
+                ('error', models.TextField(blank=True, verbose_name='job_error')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='date_of_creation_of_job')),
+                ('finished', models.DateTimeField(blank=True, null=True, verbose_name='date_of_job_finish')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='thumbnail_jobs', to='posts.Post', verbose_name='post')),
+            ],
+            options={
+                'verbose_name': 'Задание миниатюры',
+                'verbose_name_plural': 'Задания миниатюр',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='thumbnailjob',
+            index=models.Index(fields=['status', 'created'], name='thumbnail_job_queue_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 2.2.16 on 2026-10-18 04:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_thumbnailjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageDerivative',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=255, verbose_name='source_image_name')),
+                ('format', models.CharField(max_length=8, verbose_name='derivative_format')),
+                ('width', models.PositiveIntegerField(verbose_name='derivative_width')),
+                ('height', models.PositiveIntegerField(verbose_name='derivative_height')),
+                ('file', models.FileField(max_length=255, upload_to='derivatives/', verbose_name='derivative_file')),
+                ('size', models.PositiveIntegerField(verbose_name='derivative_size')),
+            ],
+            options={
+                'verbose_name': 'Производная картинки',
+                'verbose_name_plural': 'Производные картинок',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='imagederivative',
+            constraint=models.UniqueConstraint(fields=('source', 'format', 'width'), name='image_derivative_unique'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.16 on 2026-10-18 06:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0017_post_updated_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='thumbnailjob',
+            name='started',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='date_of_job_start'),
+        ),
+    ]
@@ -1,11 +1,14 @@
+from core.models import CountersModel
 from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.db import models, transaction
+
+from .storage import ContentAddressedStorage
 
 User = get_user_model()
 
 
-class Group(models.Model):
+class Group(CountersModel):
     title = models.CharField(max_length=200, verbose_name='group_title',)
     description = models.TextField(verbose_name='group_description',)
     slug = models.SlugField(
@@ -14,12 +17,22 @@ class Group(models.Model):
         unique=True,
         verbose_name='group_slug',
     )
+    posts_count = models.IntegerField(
+        default=0,
+        verbose_name='posts_count',
+    )
+    followers_count = models.IntegerField(
+        default=0,
+        verbose_name='followers_count',
+    )
+
+    counter_fields = ('posts_count', 'followers_count')
 
     def __str__(self):
         return self.title
 
 
-class Post(models.Model):
+class Post(CountersModel):
     text = models.TextField(
         verbose_name='post_text',
         help_text='Введите текст поста'
@@ -28,6 +41,10 @@ class Post(models.Model):
         auto_now_add=True,
         verbose_name='date_of_pub',
     )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='date_of_update',
+    )
     group = models.ForeignKey(
         'Group',
         on_delete=models.SET_NULL,
@@ -45,11 +62,40 @@ class Post(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
-        blank=True
+        storage=ContentAddressedStorage(),
+        blank=True,
+        db_index=True
+    )
+    comments_count = models.IntegerField(
+        default=0,
+        verbose_name='comments_count',
     )
 
+    counter_fields = ('comments_count',)
+
     class Meta:
         ordering = ('-pub_date',)
+        # Индексы повторяют сортировку лент (-pub_date, -pk): общей,
+        # группы и автора, чтобы страница читалась диапазоном индекса.
+        indexes = [
+            models.Index(fields=['pub_date', 'id'], name='post_feed_idx'),
+            models.Index(
+                fields=['group', 'pub_date', 'id'], name='post_group_feed_idx'
+            ),
+            models.Index(
+                fields=['author', 'pub_date', 'id'],
+                name='post_author_feed_idx'
+            ),
+            # Время последней правки ленты для условных запросов API.
+            models.Index(fields=['updated_at'], name='post_updated_idx'),
+            models.Index(
+                fields=['group', 'updated_at'], name='post_group_updated_idx'
+            ),
+            models.Index(
+                fields=['author', 'updated_at'],
+                name='post_author_updated_idx'
+            ),
+        ]
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
 
@@ -79,5 +125,254 @@ class Comment(models.Model):
         verbose_name='date_of_creation_of_comment',
     )
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['post', 'created'], name='comment_post_created_idx'
+            ),
+        ]
+
     def __str__(self):
         return self.text
+
+    def save(self, *args, **kwargs):
+        # Счётчик комментариев поста меняется в той же транзакции.
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+
+
+class PostCounter(models.Model):
+    """Поддерживаемое число постов в ленте: общей, группы или автора."""
+    scope = models.CharField(
+        max_length=64,
+        unique=True,
+        verbose_name='counter_scope',
+    )
+    value = models.IntegerField(
+        default=0,
+        verbose_name='counter_value',
+    )
+
+    class Meta:
+        verbose_name = 'Счётчик постов'
+        verbose_name_plural = 'Счётчики постов'
+
+    def __str__(self):
+        return f'{self.scope}: {self.value}'
+
+
+class ThumbnailJob(models.Model):
+    """Задание фоновой очереди на миниатюру изображения поста."""
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (PENDING, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Готово'),
+        (FAILED, 'Ошибка'),
+    )
+
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='thumbnail_jobs',
+        verbose_name='post'
+    )
+    image = models.CharField(
+        max_length=255,
+        verbose_name='image_name',
+    )
+    status = models.CharField(
+        max_length=16,
+        choices=STATUSES,
+        default=PENDING,
+        verbose_name='job_status',
+    )
+    attempts = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name='job_attempts',
+    )
+    error = models.TextField(
+        blank=True,
+        verbose_name='job_error',
+    )
+    created = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='date_of_creation_of_job',
+    )
+    started = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='date_of_job_start',
+    )
+    finished = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='date_of_job_finish',
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['status', 'created'], name='thumbnail_job_queue_idx'
+            ),
+        ]
+        verbose_name = 'Задание миниатюры'
+        verbose_name_plural = 'Задания миниатюр'
+
+    def __str__(self):
+        return f'{self.image}: {self.status}'
+
+
+class ImageDerivative(models.Model):
+    """Уменьшенная копия картинки поста одной ширины в одном формате."""
+    source = models.CharField(
+        max_length=255,
+        verbose_name='source_image_name',
+    )
+    format = models.CharField(
+        max_length=8,
+        verbose_name='derivative_format',
+    )
+    width = models.PositiveIntegerField(verbose_name='derivative_width')
+    height = models.PositiveIntegerField(verbose_name='derivative_height')
+    file = models.FileField(
+        upload_to='derivatives/',
+        max_length=255,
+        verbose_name='derivative_file',
+    )
+    size = models.PositiveIntegerField(verbose_name='derivative_size')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['source', 'format', 'width'],
+                name='image_derivative_unique',
+            ),
+        ]
+        verbose_name = 'Производная картинки'
+        verbose_name_plural = 'Производные картинок'
+
+    def __str__(self):
+        return f'{self.source} {self.width}w {self.format}'
+
+
+class ImageBlob(models.Model):
+    """Файл картинки в хранилище по хешу и число постов, его использующих."""
+    name = models.CharField(
+        max_length=255,
+        unique=True,
+        verbose_name='blob_name',
+    )
+    refs = models.IntegerField(
+        default=0,
+        verbose_name='blob_references',
+    )
+
+    class Meta:
+        verbose_name = 'Файл картинки'
+        verbose_name_plural = 'Файлы картинок'
+
+    def __str__(self):
+        return f'{self.name}: {self.refs}'
+
+
+class Follow(models.Model):
+    """Подписка пользователя на автора."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='follower',
+        verbose_name='follower'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='following',
+        verbose_name='author'
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'author'], name='follow_unique'
+            ),
+            models.CheckConstraint(
+                check=~models.Q(user=models.F('author')),
+                name='follow_not_self',
+            ),
+        ]
+        verbose_name = 'Подписка на автора'
+        verbose_name_plural = 'Подписки на авторов'
+
+    def __str__(self):
+        return f'{self.user_id} -> {self.author_id}'
+
+
+class GroupFollow(models.Model):
+    """Подписка пользователя на группу."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='group_follows',
+        verbose_name='follower'
+    )
+    group = models.ForeignKey(
+        Group,
+        on_delete=models.CASCADE,
+        related_name='followers',
+        verbose_name='group'
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'group'], name='group_follow_unique'
+            ),
+        ]
+        verbose_name = 'Подписка на группу'
+        verbose_name_plural = 'Подписки на группы'
+
+    def __str__(self):
+        return f'{self.user_id} -> {self.group_id}'
+
+
+class TimelineEntry(models.Model):
+    """Пост в персональной ленте подписчика (posts.timeline).
+
+    Дата публикации скопирована из поста, чтобы страница ленты читалась
+    одним диапазоном индекса (user, -pub_date, -post) без соединений.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='reader'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='post'
+    )
+    pub_date = models.DateTimeField(verbose_name='date_of_pub')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'], name='timeline_entry_unique'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', 'pub_date', 'post'],
+                name='timeline_feed_idx'
+            ),
+        ]
+        verbose_name = 'Запись ленты подписок'
+        verbose_name_plural = 'Записи лент подписок'
+
+    def __str__(self):
+        return f'{self.user_id}: {self.post_id}'
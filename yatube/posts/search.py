@@ -0,0 +1,303 @@
+"""Полнотекстовый поиск по текстам постов и названиям групп.
+
+В SQLite используется виртуальная таблица FTS5 posts_post_fts (rowid —
+id поста), в PostgreSQL — GIN-индексы по to_tsvector. Индекс обновляется
+обработчиками сигналов при сохранении и удалении постов и групп.
+
+Выдача упорядочена по (score, -id), где меньший score — более релевантный
+пост, и листается курсором по этой паре, как ленты в posts.utils.
+"""
+import re
+
+from html import escape
+
+from django.conf import settings
+from django.db import connection
+from django.utils.safestring import mark_safe
+
+from .models import Post
+from .utils import decode_cursor, encode_cursor
+
+FTS_TABLE = 'posts_post_fts'
+FTS_CREATE_SQL = (
+    f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5('
+    "text, group_title, tokenize='unicode61', prefix='3 4')"
+)
+FTS_FILL_SQL = (
+    f'INSERT INTO {FTS_TABLE} (rowid, text, group_title) '
+    "SELECT p.id, p.text, COALESCE(g.title, '') FROM posts_post p "
+    'LEFT JOIN posts_group g ON g.id = p.group_id'
+)
+# Ранжируются все совпадения: bm25 считается по спискам FTS5-индекса, а
+# сортировка с LIMIT держит в памяти только строки страницы. bm25 меньше
+# у более релевантных строк; совпадение в тексте весит вдвое больше, чем
+# в названии группы.
+FTS_SEARCH_SQL = (
+    'SELECT id, score FROM ('
+    f'SELECT rowid AS id, bm25({FTS_TABLE}, 2.0, 1.0) AS score '
+    f'FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s'
+    ') WHERE {after} ORDER BY score, id DESC LIMIT %s'
+)
+FTS_SNIPPET_SQL = (
+    f"SELECT rowid, snippet({FTS_TABLE}, 0, char(2), char(3), '…', 32) "
+    f'FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND rowid IN ({{ids}})'
+)
+PG_CONFIG = 'russian'
+# Совпадения в тексте и в названии группы ищутся отдельными ветками
+# UNION, каждая по своему GIN-индексу: с OR в одном WHERE PostgreSQL не
+# может читать индекс и считает to_tsvector для каждой строки. Ранг
+# считается для всех найденных постов.
+PG_QUERY = 'plainto_tsquery(%s, %s)'
+PG_SEARCH_SQL = (
+    'SELECT id, score FROM ('
+    f'SELECT p.id, -ts_rank(to_tsvector(%s, p.text), {PG_QUERY}) AS score '
+    'FROM posts_post p WHERE p.id IN ('
+    'SELECT p.id FROM posts_post p '
+    f'WHERE to_tsvector(%s, p.text) @@ {PG_QUERY} '
+    'UNION '
+    'SELECT p.id FROM posts_post p '
+    'JOIN posts_group g ON g.id = p.group_id '
+    f'WHERE to_tsvector(%s, g.title) @@ {PG_QUERY}'
+    ')) found WHERE {after} ORDER BY score, id DESC LIMIT %s'
+)
+PG_SNIPPET_SQL = (
+    'SELECT p.id, ts_headline(%s, p.text, plainto_tsquery(%s, %s), %s) '
+    'FROM posts_post p WHERE p.id IN ({ids})'
+)
+PG_HEADLINE = 'StartSel=\x02, StopSel=\x03, MaxWords=35, MinWords=15'
+AFTER_SQL = '(score > %s OR (score = %s AND id < %s))'
+MIN_PREFIX = 3
+
+WORD_RE = re.compile(r'\w+')
+
+
+def highlight(snippet):
+    """Экранирует фрагмент и размечает найденные слова тегом <mark>."""
+    return mark_safe(
+        escape(snippet).replace('\x02', '<mark>').replace('\x03', '</mark>')
+    )
+
+
+def fts_query(query):
+    """Запрос FTS5: все слова целиком, «слово*» в конце — префикс.
+
+    Префикс короче MIN_PREFIX не читает префиксный индекс и перебирал бы
+    списки всех подходящих слов, поэтому такие ищутся целиком.
+    """
+    words = WORD_RE.findall(query)
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    if query.rstrip().endswith('*') and len(words[-1]) >= MIN_PREFIX:
+        terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def _after(cursor_key):
+    if cursor_key is None:
+        return '1 = 1', []
+    score, pk = cursor_key
+    return AFTER_SQL, [score, score, pk]
+
+
+def _placeholders(ids):
+    return ', '.join(['%s'] * len(ids))
+
+
+class SQLiteSearchBackend:
+    def search(self, query, after, limit):
+        match = fts_query(query)
+        if match is None:
+            return []
+        condition, params = _after(after)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                FTS_SEARCH_SQL.format(after=condition),
+                [match, *params, limit],
+            )
+            return cursor.fetchall()
+
+    def snippets(self, query, ids):
+        if not ids:
+            return {}
+        with connection.cursor() as cursor:
+            cursor.execute(
+                FTS_SNIPPET_SQL.format(ids=_placeholders(ids)),
+                [fts_query(query), *ids],
+            )
+            return dict(cursor.fetchall())
+
+    def index(self, rows):
+        """Заменяет строки индекса: rows — (id, text, group_title)."""
+        rows = list(rows)
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+                [(row[0],) for row in rows],
+            )
+            cursor.executemany(
+                f'INSERT INTO {FTS_TABLE} (rowid, text, group_title) '
+                'VALUES (%s, %s, %s)',
+                rows,
+            )
+
+    def remove(self, ids):
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+                [(pk,) for pk in ids],
+            )
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(FTS_CREATE_SQL)
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+            cursor.execute(FTS_FILL_SQL)
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')"
+            )
+
+
+class PostgresSearchBackend:
+    """Индексы по выражениям обновляет сама база, index() не нужен."""
+
+    def search(self, query, after, limit):
+        condition, params = _after(after)
+        tsquery = [PG_CONFIG, query]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                PG_SEARCH_SQL.format(after=condition),
+                [
+                    PG_CONFIG, *tsquery,
+                    PG_CONFIG, *tsquery,
+                    PG_CONFIG, *tsquery,
+                    *params, limit,
+                ],
+            )
+            return cursor.fetchall()
+
+    def snippets(self, query, ids):
+        if not ids:
+            return {}
+        with connection.cursor() as cursor:
+            cursor.execute(
+                PG_SNIPPET_SQL.format(ids=_placeholders(ids)),
+                [PG_CONFIG, PG_CONFIG, query, PG_HEADLINE, *ids],
+            )
+            return dict(cursor.fetchall())
+
+    def index(self, rows):
+        pass
+
+    def remove(self, ids):
+        pass
+
+    def rebuild(self):
+        pass
+
+
+class SimpleSearchBackend:
+    """Поиск подстрокой для баз без полнотекстовых индексов."""
+
+    def search(self, query, after, limit):
+        posts = Post.objects.filter(text__icontains=query).order_by('-pk')
+        if after is not None:
+            posts = posts.filter(pk__lt=after[1])
+        return [(pk, 0.0) for pk in posts.values_list('pk', flat=True)[:limit]]
+
+    def snippets(self, query, ids):
+        return {}
+
+    def index(self, rows):
+        pass
+
+    def remove(self, ids):
+        pass
+
+    def rebuild(self):
+        pass
+
+
+def get_backend():
+    if connection.vendor == 'sqlite':
+        return SQLiteSearchBackend()
+    if connection.vendor == 'postgresql':
+        return PostgresSearchBackend()
+    return SimpleSearchBackend()
+
+
+def index_posts(posts):
+    """Обновляет индекс для сохранённых постов."""
+    get_backend().index(
+        (post.pk, post.text, post.group.title if post.group else '')
+        for post in posts
+    )
+
+
+def index_group(group, title=None):
+    """Обновляет название группы в индексе всех её постов."""
+    title = group.title if title is None else title
+    get_backend().index(
+        (pk, text, title)
+        for pk, text in group.posts.values_list('pk', 'text').iterator()
+    )
+
+
+def remove_posts(ids):
+    get_backend().remove(ids)
+
+
+def rebuild_index():
+    get_backend().rebuild()
+
+
+def matching_ids(query, limit):
+    """id найденных постов, например для поиска в админке."""
+    return [row[0] for row in get_backend().search(query, None, limit)]
+
+
+class SearchPage(list):
+    """Страница результатов поиска с курсором на следующую."""
+
+    def __init__(self, posts, number, has_next):
+        super().__init__(posts)
+        self.number = number
+        self._has_next = has_next
+
+    def has_next(self):
+        return self._has_next
+
+    @property
+    def next_cursor(self):
+        if not self._has_next:
+            return None
+        last = self[-1]
+        return encode_cursor([last.score, last.pk], self.number + 1)
+
+
+def search_posts(query, cursor=None, per_page=None):
+    """Страница найденных постов с подсвеченными фрагментами."""
+    per_page = per_page or settings.ITEMS_PER_PAGE
+    after, number = None, 1
+    if cursor:
+        try:
+            values, number, _ = decode_cursor(cursor)
+            after = (float(values[0]), int(values[1]))
+        except (ValueError, TypeError, IndexError):
+            after, number = None, 1
+    backend = get_backend()
+    rows = backend.search(query, after, per_page + 1)
+    has_next = len(rows) > per_page
+    rows = rows[:per_page]
+    ids = [pk for pk, _ in rows]
+    snippets = backend.snippets(query, ids)
+    posts = Post.objects.select_related('author', 'group').in_bulk(ids)
+    found = []
+    for pk, score in rows:
+        post = posts.get(pk)
+        if post is None:
+            continue
+        post.score = score
+        post.highlight = highlight(snippets.get(pk) or post.text[:200])
+        found.append(post)
+    return SearchPage(found, number, has_next)
@@ -0,0 +1,224 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import (
+    post_delete, post_init, post_save, pre_delete,
+)
+from django.dispatch import receiver
+from django.utils.timezone import now
+
+from . import blobs, cache, counters, search, thumbnails, timeline
+from .models import Comment, Follow, Group, GroupFollow, Post
+
+User = get_user_model()
+
+
+@receiver(post_init, sender=Post)
+def remember_post_scopes(sender, instance, **kwargs):
+    """Запоминает группу, автора и картинку поста, загруженного из базы.
+
+    Отложенные поля (only/defer) не читаются, иначе каждый такой пост
+    стоил бы лишнего запроса.
+    """
+    loaded = instance.__dict__
+    if 'group_id' in loaded and 'author_id' in loaded:
+        instance._loaded_scopes = (loaded['group_id'], loaded['author_id'])
+    else:
+        instance._loaded_scopes = None
+    if 'image' in loaded:
+        image = loaded['image']
+        instance._loaded_image = getattr(image, 'name', image) or ''
+    else:
+        instance._loaded_image = None
+
+
+def track_image(instance, created):
+    """Ссылки на файлы картинок и очередь миниатюр при смене картинки."""
+    if created:
+        # В конструктор могли передать сам загруженный файл.
+        instance._loaded_image = ''
+    elif instance._loaded_image is None and 'image' not in instance.__dict__:
+        # Картинка не загружалась и не менялась.
+        return
+    old = instance._loaded_image
+    new = instance.image.name or ''
+    if old is None or old == new:
+        instance._loaded_image = new
+        return
+    if new:
+        blobs.acquire(new)
+        thumbnails.schedule(instance)
+    if old:
+        blobs.release(old)
+    instance._loaded_image = new
+
+
+def count_post(instance, created):
+    current = (instance.group_id, instance.author_id)
+    if created:
+        counters.change(counters.scopes_of(*current), 1)
+    elif instance._loaded_scopes is None:
+        # Прежние значения неизвестны: расхождение исправит сверка.
+        pass
+    elif current != instance._loaded_scopes:
+        old = set(counters.scopes_of(*instance._loaded_scopes))
+        new = set(counters.scopes_of(*current))
+        counters.change(old - new, -1)
+        counters.change(new - old, 1)
+
+
+def invalidate_post_pages(instance):
+    """Сбрасывает кэш страниц всех лент, где пост был или стал виден."""
+    group_ids = {instance.group_id}
+    author_ids = {instance.author_id}
+    if instance._loaded_scopes is not None:
+        group_ids.add(instance._loaded_scopes[0])
+        author_ids.add(instance._loaded_scopes[1])
+    group_ids.discard(None)
+    scopes = [cache.FEED_SCOPE, cache.post_page_scope(instance.pk)]
+    if group_ids:
+        scopes.extend(
+            cache.group_page_scope(slug) for slug in Group.objects.filter(
+                pk__in=group_ids
+            ).values_list('slug', flat=True)
+        )
+    scopes.extend(
+        cache.author_page_scope(username) for username in User.objects.filter(
+            pk__in=author_ids
+        ).values_list('username', flat=True)
+    )
+    cache.invalidate(*scopes)
+
+
+def publish(instance, created):
+    """Раскладывает новый пост или пост, сменивший группу, по лентам."""
+    if created:
+        timeline.fan_out(instance)
+    elif (instance._loaded_scopes is not None
+            and instance._loaded_scopes[0] != instance.group_id):
+        timeline.regroup(instance, instance._loaded_scopes[0])
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    count_post(instance, created)
+    search.index_posts([instance])
+    invalidate_post_pages(instance)
+    publish(instance, created)
+    instance._loaded_scopes = (instance.group_id, instance.author_id)
+    track_image(instance, created)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    counters.change(
+        counters.scopes_of(instance.group_id, instance.author_id), -1
+    )
+    search.remove_posts([instance.pk])
+    if instance.image:
+        blobs.release(instance.image.name)
+    invalidate_post_pages(instance)
+
+
+def _post_owners(comment):
+    """Слаг группы и имя автора поста; без запроса, если пост загружен."""
+    if Comment.post.is_cached(comment):
+        post = comment.post
+        if (Post.author.is_cached(post)
+                and (post.group_id is None or Post.group.is_cached(post))):
+            return post.group and post.group.slug, post.author.username
+    return Post.objects.filter(pk=comment.post_id).values_list(
+        'group__slug', 'author__username'
+    ).first()
+
+
+def invalidate_comment_pages(comment):
+    """Сбрасывает кэш страницы поста и лент API с числом комментариев."""
+    scopes = [cache.post_page_scope(comment.post_id)]
+    owners = _post_owners(comment)
+    if owners is not None:
+        slug, username = owners
+        scopes.extend([cache.FEED_SCOPE, cache.author_page_scope(username)])
+        if slug is not None:
+            scopes.append(cache.group_page_scope(slug))
+    cache.invalidate(*scopes)
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        counters.change_comments(instance.post_id, 1)
+    invalidate_comment_pages(instance)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    counters.change_comments(instance.post_id, -1)
+    invalidate_comment_pages(instance)
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        count = timeline.change_followers(1, author_id=instance.author_id)
+        # Посты популярных авторов берутся при чтении и не копируются.
+        if not timeline.is_popular(count):
+            timeline.backfill(instance.user_id, author_id=instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    timeline.retract(instance.user_id, author_id=instance.author_id)
+    timeline.change_followers(-1, author_id=instance.author_id)
+
+
+@receiver(post_save, sender=GroupFollow)
+def group_follow_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        count = timeline.change_followers(1, group_id=instance.group_id)
+        if not timeline.is_popular(count):
+            timeline.backfill(instance.user_id, group_id=instance.group_id)
+
+
+@receiver(post_delete, sender=GroupFollow)
+def group_follow_deleted(sender, instance, **kwargs):
+    timeline.retract(instance.user_id, group_id=instance.group_id)
+    timeline.change_followers(-1, group_id=instance.group_id)
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, created, raw=False, **kwargs):
+    # Название группы проиндексировано вместе с текстами её постов и
+    # выводится в API: время правки постов меняет ETag их лент.
+    if not raw and not created:
+        search.index_group(instance)
+        instance.posts.update(updated_at=now())
+
+
+@receiver(pre_delete, sender=Group)
+def group_deleting(sender, instance, **kwargs):
+    # После удаления связь с постами уже обнулена, поэтому название
+    # убирается из индекса и посты помечаются изменёнными заранее.
+    search.index_group(instance, title='')
+    instance.posts.update(updated_at=now())
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+@receiver(post_delete, sender=User)
+def group_or_author_changed(sender, **kwargs):
+    # Название группы и имя автора выводятся в карточках любых лент,
+    # поэтому такие редкие правки сбрасывают кэш всех страниц.
+    cache.invalidate(cache.SITE_SCOPE)
+
+
+@receiver(post_save, sender=User)
+def author_saved(sender, instance, created, update_fields=None, **kwargs):
+    # Вход пользователя сохраняет только last_login: страницы не меняются.
+    if created or update_fields == frozenset({'last_login'}):
+        return
+    cache.invalidate(cache.SITE_SCOPE)
+    # Имя автора выводится в API: время правки меняет ETag его лент.
+    Post.objects.filter(author=instance).update(updated_at=now())
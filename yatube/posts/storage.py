@@ -0,0 +1,63 @@
+"""Хранилище картинок постов по хешу содержимого.
+
+Файл сохраняется под именем <каталог>/<ab>/<cd>/<sha256><расширение>,
+поэтому одинаковые загрузки ложатся в один файл, а миниатюры и
+производные, привязанные к имени исходника, общие для всех постов с этой
+картинкой. Сколько постов ссылается на файл, считает posts.blobs; там
+же блокировка, из-за которой файл не удаляется из-под новой загрузки.
+"""
+import hashlib
+import os
+import re
+import uuid
+
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.utils.deconstruct import deconstructible
+
+CONTENT_NAME_RE = re.compile(
+    r'(?:^|/)[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}(?:\.\w+)?$'
+)
+
+
+def is_content_addressed(name):
+    return bool(CONTENT_NAME_RE.search(name))
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    def content_name(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        value = digest.hexdigest()
+        directory = os.path.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        parts = [value[:2], value[2:4], value + extension]
+        return '/'.join([directory, *parts] if directory else parts)
+
+    def get_available_name(self, name, max_length=None):
+        # Имя определяется содержимым в _save и уже уникально.
+        return name
+
+    def _save(self, name, content):
+        # posts.models импортирует хранилище, поэтому импорт здесь.
+        from . import blobs
+
+        name = self.content_name(name, content)
+        with transaction.atomic():
+            # Файл не удалят, пока не зафиксирован пост, который на него
+            # сошлётся (Post.save выполняется в одной транзакции).
+            blobs.pin(name)
+            return self._write(name, content)
+
+    def _write(self, name, content):
+        if self.exists(name):
+            return name
+        # Запись во временный файл и атомарная замена: параллельная
+        # загрузка того же содержимого запишет те же байты.
+        partial = super()._save(f'{name}.{uuid.uuid4().hex}.part', content)
+        os.replace(self.path(partial), self.path(name))
+        return name
@@ -0,0 +1,24 @@
+from django import template
+from posts import derivatives, thumbnails
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_thumbnail(post):
+    """Готовая миниатюра картинки поста или None, если её ещё нет.
+
+    Ленты находят миниатюры заранее для всей страницы (attach_thumbnails),
+    отдельный поиск остаётся для страницы поста.
+    """
+    if hasattr(post, 'thumbnail'):
+        return post.thumbnail
+    return thumbnails.lookup(post.image)
+
+
+@register.simple_tag
+def post_image_sources(post):
+    """Наборы srcset адаптивных производных картинки поста."""
+    if hasattr(post, 'image_sources'):
+        return post.image_sources
+    return derivatives.sources_for(post.image)
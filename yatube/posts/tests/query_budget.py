@@ -0,0 +1,118 @@
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.auth import get_user
+from django.core.cache import caches
+from django.db import connection
+from django.http import HttpRequest
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+
+from ..counters import reconcile
+from ..models import Comment, Group, Post, User
+
+
+def create_large_dataset(authors=40, groups=20, posts=300, comments=600):
+    """Создаёт объёмные данные для проверки числа запросов.
+
+    Посты и комментарии распределены по всем авторам и группам, часть
+    постов без группы; счётчики пересчитываются после bulk_create.
+    """
+    User.objects.bulk_create(
+        User(username=f'author{i}', first_name=f'Имя{i}')
+        for i in range(authors)
+    )
+    users = list(User.objects.filter(username__startswith='author'))
+    Group.objects.bulk_create(
+        Group(title=f'Группа {i}', slug=f'group-{i}', description='Описание')
+        for i in range(groups)
+    )
+    group_list = list(Group.objects.filter(slug__startswith='group-'))
+    Post.objects.bulk_create(
+        Post(
+            author=users[i % len(users)],
+            group=group_list[i % len(group_list)] if i % 4 else None,
+            text=f'Пост {i}',
+        )
+        for i in range(posts)
+    )
+    post_list = list(Post.objects.order_by('pk'))
+    Comment.objects.bulk_create(
+        Comment(
+            post=post_list[i % 10],
+            author=users[i % len(users)],
+            text=f'Комментарий {i}',
+        )
+        for i in range(comments)
+    )
+    reconcile()
+    return users, group_list, post_list
+
+
+# Настройки входа при общем кэше (yatube.settings, SHARED_CACHE): тесты
+# идут в одном процессе, и locmem для них общий.
+shared_cache_auth = override_settings(
+    SESSION_ENGINE='django.contrib.sessions.backends.cached_db',
+    AUTHENTICATION_BACKENDS=[
+        'users.backends.CachedModelBackend',
+        'django.contrib.auth.backends.ModelBackend',
+    ],
+)
+
+
+def warm_auth(client):
+    """Кладёт в кэш сессию и пользователя клиента, как после запроса."""
+    session_key = client.cookies.get(settings.SESSION_COOKIE_NAME)
+    if session_key is None:
+        return
+    request = HttpRequest()
+    request.session = import_module(settings.SESSION_ENGINE).SessionStore(
+        session_key.value
+    )
+    get_user(request)
+
+
+class QueryBudgetMixin:
+    """Проверки числа SQL-запросов на страницу.
+
+    assertQueryBudget падает, если запрос к адресу выполняет больше
+    max_queries запросов или если их число меняется вместе с размером
+    страницы — признак N+1 в шаблоне или во view.
+    """
+
+    page_sizes = (5, 15)
+
+    def count_queries(self, client, url, method='get', data=None):
+        # Считаются запросы самой страницы, а не ответа из кэша.
+        for cache in caches.all():
+            cache.clear()
+        warm_auth(client)
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(client, method)(url, data)
+            # Потоковый ответ выполняет запросы при чтении тела.
+            if response.streaming:
+                b''.join(response.streaming_content)
+        self.assertLess(response.status_code, 400, url)
+        return len(queries)
+
+    def count_at_page_size(self, size, client, url, method='get', data=None):
+        with override_settings(ITEMS_PER_PAGE=size, COMMENTS_PER_PAGE=size):
+            return self.count_queries(client, url, method, data)
+
+    def assertSameAtPageSizes(self, url, counts):
+        self.assertEqual(
+            len(set(counts)), 1,
+            f'{url}: число запросов зависит от размера страницы {counts}'
+        )
+
+    def assertQueryBudget(self, client, url, max_queries,
+                          method='get', data=None):
+        counts = [
+            self.count_at_page_size(size, client, url, method, data)
+            for size in self.page_sizes
+        ]
+        self.assertSameAtPageSizes(url, counts)
+        self.assertLessEqual(
+            counts[0], max_queries,
+            f'{url}: {counts[0]} запросов при бюджете {max_queries}'
+        )
@@ -0,0 +1,128 @@
+from django.core.cache import caches
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Group, Post, User
+
+
+class FeedApiTests(TestCase):
+    """JSON API лент: те же посты, что на страницах, и условные запросы."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='auth', first_name='Иван', last_name='Петров'
+        )
+        cls.group = Group.objects.create(
+            title='Тестовая группа', slug='test-slug', description='Описание'
+        )
+        cls.posts = [
+            Post.objects.create(
+                author=cls.user,
+                group=cls.group if i % 2 else None,
+                text=f'Пост {i}',
+            )
+            for i in range(20)
+        ]
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+        self.client = Client()
+
+    def get(self, url, **headers):
+        return self.client.get(url, **headers)
+
+    def test_feeds_match_html_pages(self):
+        for api, page, kwargs in (
+            ('posts:api_index', 'posts:index', {}),
+            ('posts:api_group_posts', 'posts:group_list',
+             {'slug': self.group.slug}),
+            ('posts:api_profile', 'posts:profile',
+             {'username': self.user.username}),
+        ):
+            with self.subTest(api=api):
+                data = self.get(reverse(api, kwargs=kwargs)).json()
+                html = self.get(reverse(page, kwargs=kwargs))
+                self.assertEqual(
+                    [post['id'] for post in data['results']],
+                    [post.pk for post in html.context['page_obj']],
+                )
+                self.assertEqual(
+                    data['count'], html.context['page_obj'].paginator.count
+                )
+
+    def test_post_fields_and_cursor(self):
+        data = self.get(reverse('posts:api_index')).json()
+        post = data['results'][0]
+        self.assertEqual(post['author']['full_name'], 'Иван Петров')
+        self.assertEqual(post['group']['slug'], self.group.slug)
+        self.assertIsNone(post['thumbnail'])
+        second = self.get(data['next']).json()
+        ids = [p['id'] for p in data['results'] + second['results']]
+        self.assertEqual(len(set(ids)), 20)
+
+    def test_not_modified_without_serialization(self):
+        url = reverse('posts:api_group_posts', kwargs={'slug': 'test-slug'})
+        response = self.get(url)
+        etag = response['ETag']
+        with CaptureQueriesContext(connection) as queries:
+            response = self.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse(
+            [q for q in queries if 'posts_post"."text' in q['sql']]
+        )
+        response = self.get(
+            url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_edit_and_delete_change_etag(self):
+        url = reverse('posts:api_index')
+        etag = self.get(url)['ETag']
+        post = Post.objects.get(pk=self.posts[0].pk)
+        post.text = 'Новый текст'
+        post.save()
+        response = self.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        post.delete()
+        response = self.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(FEED_CACHE_TIMEOUT=300)
+    def test_comment_changes_etag_and_cached_page(self):
+        url = reverse('posts:api_index')
+        etag = self.get(url)['ETag']
+        self.assertEqual(self.get(url)['X-Feed-Cache'], 'hit')
+        post = self.posts[-1]
+        Comment.objects.create(post=post, author=self.user, text='Коммент')
+        response = self.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Feed-Cache'], 'miss')
+        counts = {
+            item['id']: item['comments_count']
+            for item in response.json()['results']
+        }
+        self.assertEqual(counts[post.pk], 1)
+
+    def test_group_rename_changes_etag(self):
+        url = reverse('posts:api_group_posts', kwargs={'slug': 'test-slug'})
+        etag = self.get(url)['ETag']
+        self.group.title = 'Новое название'
+        self.group.save()
+        response = self.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json()['results'][0]['group']['title'], 'Новое название'
+        )
+
+    def test_etag_does_not_depend_on_cache(self):
+        # Версии кэша у процессов с locmem разные, ETag — одинаковый.
+        url = reverse('posts:api_index')
+        etag = self.get(url)['ETag']
+        for cache in caches.all():
+            cache.clear()
+        self.assertEqual(self.get(url)['ETag'], etag)
@@ -0,0 +1,108 @@
+import asyncio
+
+from core.asgi import WsgiBridge
+from django.db import connections
+from django.test import SimpleTestCase, TransactionTestCase
+
+from ..models import Post, User
+
+
+def request(application, path, method='GET', body=b'', headers=()):
+    """Запрос к приложению ASGI; отдаёт отправленные им сообщения."""
+    scope = {
+        'type': 'http',
+        'method': method,
+        'path': path,
+        'query_string': b'',
+        'headers': [(b'host', b'testserver'), *headers],
+        'http_version': '1.1',
+        'scheme': 'http',
+        'server': ('testserver', 80),
+    }
+    messages = []
+    incoming = [
+        {'type': 'http.request', 'body': body[:3], 'more_body': True},
+        {'type': 'http.request', 'body': body[3:]},
+    ]
+
+    async def receive():
+        return incoming.pop(0)
+
+    async def send(message):
+        messages.append(message)
+
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(application(scope, receive, send))
+    finally:
+        loop.close()
+    return messages
+
+
+def echo(environ, start_response):
+    start_response('201 Created', [('Content-Type', 'text/plain')])
+    yield environ['wsgi.input'].read()
+    yield environ['PATH_INFO'].encode('latin-1')
+    yield environ.get('HTTP_COOKIE', '').encode()
+
+
+class WsgiBridgeTests(SimpleTestCase):
+    """ASGI-мост: окружение WSGI, тело запроса и потоковый ответ."""
+
+    def test_response_is_streamed_in_chunks(self):
+        bridge = WsgiBridge(echo, threads=2)
+        self.addCleanup(bridge.executor.shutdown)
+        messages = request(
+            bridge, '/группа/', method='POST', body=b'text=hello',
+            headers=[(b'cookie', b'a=1'), (b'cookie', b'b=2')],
+        )
+        start, *chunks = messages
+        self.assertEqual(start['status'], 201)
+        self.assertIn((b'content-type', b'text/plain'), start['headers'])
+        self.assertEqual(
+            [message['body'] for message in chunks],
+            [b'text=hello', '/группа/'.encode(), b'a=1; b=2', b''],
+        )
+        self.assertFalse(chunks[-1].get('more_body', False))
+
+    def test_oversized_body_is_rejected(self):
+        bridge = WsgiBridge(echo, threads=1, max_body=5)
+        self.addCleanup(bridge.executor.shutdown)
+        for headers in ([(b'content-length', b'10')], []):
+            with self.subTest(headers=headers):
+                start, body = request(
+                    bridge, '/', method='POST', body=b'0123456789',
+                    headers=headers,
+                )
+                self.assertEqual(start['status'], 413)
+                self.assertEqual(body['body'], b'Payload Too Large')
+
+    def test_body_within_limit_is_passed(self):
+        bridge = WsgiBridge(echo, threads=1, max_body=10)
+        self.addCleanup(bridge.executor.shutdown)
+        start, first, *_ = request(
+            bridge, '/', method='POST', body=b'0123456789'
+        )
+        self.assertEqual(start['status'], 201)
+        self.assertEqual(first['body'], b'0123456789')
+
+
+class AsgiApplicationTests(TransactionTestCase):
+    """yatube.asgi: запросы выполняются в потоках пула со своей базой."""
+
+    def test_site_is_served(self):
+        from yatube.asgi import application
+
+        # Свой пул из одного потока: его соединение с базой (CONN_MAX_AGE)
+        # закрывается в конце теста, иначе тестовую базу не удалить.
+        bridge = WsgiBridge(application.wsgi_application, threads=1)
+        self.addCleanup(bridge.executor.shutdown)
+        self.addCleanup(
+            lambda: bridge.executor.submit(connections.close_all).result()
+        )
+        author = User.objects.create_user(username='auth')
+        Post.objects.create(author=author, text='Пост через ASGI')
+        messages = request(bridge, '/')
+        self.assertEqual(messages[0]['status'], 200)
+        body = b''.join(message.get('body', b'') for message in messages)
+        self.assertIn('Пост через ASGI'.encode(), body)
@@ -0,0 +1,82 @@
+import json
+import os
+import shutil
+import tempfile
+
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db.models import F
+from django.test import TransactionTestCase, override_settings
+from users.backends import CachedModelBackend
+
+from ..models import Comment, Follow, Group, Post, TimelineEntry, User
+from ..urls import urlpatterns
+
+
+class BenchTests(TransactionTestCase):
+    """Команды seed_bench и run_bench на маленькой базе."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        call_command(
+            'seed_bench', users=30, groups=3, posts=300, comments=500,
+            follows=60, group_follows=20, stdout=StringIO(),
+        )
+
+    def run_bench(self, name, **options):
+        path = os.path.join(self.directory, name)
+        call_command(
+            'run_bench', iterations=2, warmup=0, output=path,
+            stdout=StringIO(), **options,
+        )
+        with open(path, encoding='utf-8') as source:
+            return json.load(source)
+
+    def test_seed_is_skewed_and_counted(self):
+        self.assertEqual(User.objects.count(), 30)
+        self.assertEqual(Post.objects.count(), 300)
+        self.assertEqual(Comment.objects.count(), 500)
+        self.assertFalse(Follow.objects.filter(user=F('author')).exists())
+        top = Group.objects.order_by('-posts_count').first()
+        self.assertEqual(top.posts_count, top.posts.count())
+        self.assertGreater(top.posts_count, 210 / 3)
+        self.assertTrue(TimelineEntry.objects.exists())
+
+    def test_every_url_is_measured(self):
+        report = self.run_bench('bench.json')
+        self.assertEqual(
+            set(report['views']),
+            {f'posts:{pattern.name}' for pattern in urlpatterns},
+        )
+        self.assertEqual(report['meta']['rows']['posts'], 300)
+        for name, result in report['views'].items():
+            with self.subTest(view=name):
+                self.assertLess(result['status'], 400)
+                self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+                self.assertGreater(result['alloc_peak_kb'], 0)
+        self.assertEqual(report['views']['posts:post_edit']['user'], 'user')
+        self.assertEqual(report['views']['posts:index']['user'], 'guest')
+        # Изменения замера откатываются.
+        self.assertFalse(User.objects.filter(is_staff=True).exists())
+
+    @override_settings(
+        AUTHENTICATION_BACKENDS=['users.backends.CachedModelBackend']
+    )
+    def test_rolled_back_staff_flag_is_not_cached(self):
+        self.run_bench('bench.json')
+        user = Post.objects.order_by('-comments_count', '-pk').first().author
+        self.assertFalse(CachedModelBackend().get_user(user.pk).is_staff)
+
+    def test_more_queries_than_baseline_fail(self):
+        baseline = self.run_bench('baseline.json')
+        baseline['views']['posts:follow_index']['queries'] -= 1
+        for result in baseline['views'].values():
+            result['p95_ms'] = 1e6
+        path = os.path.join(self.directory, 'edited.json')
+        with open(path, 'w', encoding='utf-8') as output:
+            json.dump(baseline, output)
+        with self.assertRaisesMessage(CommandError, 'posts:follow_index'):
+            self.run_bench('bench.json', compare=path, max_regression=0.5)
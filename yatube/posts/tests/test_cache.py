@@ -0,0 +1,188 @@
+import shutil
+import tempfile
+
+from unittest import mock
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.template.loader import render_to_string
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from .. import cache as feed_cache
+from ..models import Comment, Group, Post, User
+
+
+@override_settings(FEED_CACHE_TIMEOUT=300)
+class FeedPageCacheTests(TestCase):
+    """Кэш страниц лент для гостей и его сброс при записи."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание',
+        )
+        cls.other_group = Group.objects.create(
+            title='Другая группа',
+            slug='other_slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.user, text='Тестовый пост', group=cls.group
+        )
+
+    def setUp(self):
+        caches['default'].clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def get(self, name, **kwargs):
+        return self.client.get(reverse(f'posts:{name}', kwargs=kwargs))
+
+    def test_second_guest_request_is_served_from_cache(self):
+        self.assertEqual(self.get('index')['X-Feed-Cache'], 'miss')
+        with self.assertNumQueries(0):
+            response = self.get('index')
+        self.assertEqual(response['X-Feed-Cache'], 'hit')
+        self.assertContains(response, 'Тестовый пост')
+        self.assertEqual(feed_cache.stats()['hits'], 1)
+
+    def test_new_post_invalidates_only_its_feeds(self):
+        self.get('index')
+        self.get('group_list', slug=self.group.slug)
+        self.get('group_list', slug=self.other_group.slug)
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            {'text': 'Новый пост', 'group': self.group.pk},
+        )
+        for name, kwargs in (
+            ('index', {}),
+            ('group_list', {'slug': self.group.slug}),
+            ('profile', {'username': self.user.username}),
+        ):
+            with self.subTest(name=name):
+                response = self.get(name, **kwargs)
+                self.assertEqual(response['X-Feed-Cache'], 'miss')
+                self.assertContains(response, 'Новый пост')
+        response = self.get('group_list', slug=self.other_group.slug)
+        self.assertEqual(response['X-Feed-Cache'], 'hit')
+
+    def test_comment_invalidates_post_page(self):
+        self.get('post_detail', post_id=self.post.pk)
+        Comment.objects.create(
+            post=self.post, author=self.user, text='Новый комментарий'
+        )
+        response = self.get('post_detail', post_id=self.post.pk)
+        self.assertEqual(response['X-Feed-Cache'], 'miss')
+        self.assertContains(response, 'Новый комментарий')
+
+    def test_authorized_user_is_not_cached(self):
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertFalse(response.has_header('X-Feed-Cache'))
+
+    def cached_view(self, respond):
+        view = feed_cache.cache_page_for_guests(lambda: [])(respond)
+        request = RequestFactory().get('/feed/')
+        request.user = AnonymousUser()
+        return [view(request) for _ in range(2)]
+
+    def test_cached_response_keeps_headers(self):
+        def respond(request):
+            response = HttpResponse('Лента', content_type='text/plain')
+            response['Cache-Control'] = 'max-age=60'
+            return response
+
+        first, second = self.cached_view(respond)
+        self.assertEqual(second['X-Feed-Cache'], 'hit')
+        self.assertEqual(second['Content-Type'], first['Content-Type'])
+        self.assertEqual(second['Cache-Control'], 'max-age=60')
+
+    def test_response_with_cookies_is_not_cached(self):
+        def respond(request):
+            response = HttpResponse('Лента')
+            response.set_cookie('visitor', '1')
+            return response
+
+        first, second = self.cached_view(respond)
+        self.assertEqual(second['X-Feed-Cache'], 'miss')
+
+    @override_settings(FEED_CACHE_TIMEOUT=0)
+    def test_disabled_without_timeout(self):
+        # Так в settings выключен кэш страниц при кэше locmem.
+        response = self.get('index')
+        self.assertFalse(response.has_header('X-Feed-Cache'))
+
+
+class FileBasedFeedPageCacheTests(FeedPageCacheTests):
+    """Те же проверки на файловом бэкенде кэша."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.cache_dir = tempfile.mkdtemp()
+        cls.cache_settings = override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': cls.cache_dir,
+        }})
+        cls.cache_settings.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.cache_settings.disable()
+        shutil.rmtree(cls.cache_dir, ignore_errors=True)
+
+
+@override_settings(CARD_CACHE_TIMEOUT=300)
+class PostCardCacheTests(TestCase):
+    """Карточки постов в лентах берутся из кэша фрагментов."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.post = Post.objects.create(author=cls.user, text='Тестовый пост')
+
+    def setUp(self):
+        caches['default'].clear()
+        self.author_client = Client()
+        self.author_client.force_login(self.user)
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_cards_rendered_once_for_all_feeds_and_users(self):
+        self.author_client.get(reverse('posts:index'))
+        with mock.patch(
+            'posts.cards.render_to_string', wraps=render_to_string
+        ) as render:
+            response = self.reader_client.get(reverse('posts:profile', kwargs={
+                'username': self.user.username
+            }))
+        render.assert_not_called()
+        self.assertContains(response, 'Тестовый пост')
+        self.assertNotContains(response, 'редактировать запись')
+
+    def test_edit_renders_new_card(self):
+        self.author_client.get(reverse('posts:index'))
+        self.author_client.post(
+            reverse('posts:post_edit', kwargs={'post_id': self.post.pk}),
+            {'text': 'Изменённый пост'},
+        )
+        response = self.author_client.get(reverse('posts:index'))
+        self.assertContains(response, 'Изменённый пост')
+        self.assertContains(response, 'редактировать запись')
+
+    @override_settings(CARD_CACHE_TIMEOUT=0)
+    def test_cards_not_cached_without_shared_cache(self):
+        self.author_client.get(reverse('posts:index'))
+        with mock.patch(
+            'posts.cards.render_to_string', wraps=render_to_string
+        ) as render:
+            self.reader_client.get(reverse('posts:index'))
+        render.assert_called_once()
@@ -0,0 +1,108 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .. import counters
+from ..models import Comment, Group, Post, PostCounter
+
+User = get_user_model()
+
+
+class PostCounterTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание',
+        )
+        cls.other_group = Group.objects.create(
+            title='Другая группа',
+            slug='other_slug',
+            description='Тестовое описание',
+        )
+
+    def assertCounts(self, expected):
+        for scope, value in expected.items():
+            with self.subTest(scope=scope):
+                self.assertEqual(counters.get_count(scope), value)
+
+    def test_counters_follow_post_writes(self):
+        """Создание, перенос в другую группу и удаление поста
+        меняют счётчики лент."""
+        post = Post.objects.create(
+            author=self.user, text='Тестовый пост', group=self.group
+        )
+        group_scope = counters.group_scope(self.group.pk)
+        other_scope = counters.group_scope(self.other_group.pk)
+        author_scope = counters.author_scope(self.user.pk)
+        self.assertCounts({
+            counters.GLOBAL_SCOPE: 1, group_scope: 1, author_scope: 1,
+        })
+        post = Post.objects.get(pk=post.pk)
+        post.group = self.other_group
+        post.save()
+        self.assertCounts({
+            counters.GLOBAL_SCOPE: 1, group_scope: 0, other_scope: 1,
+        })
+        post.delete()
+        self.assertCounts({
+            counters.GLOBAL_SCOPE: 0, other_scope: 0, author_scope: 0,
+        })
+
+    def test_counter_fields_follow_writes(self):
+        """Поля posts_count и comments_count меняются вместе с записями."""
+        post = Post.objects.create(
+            author=self.user, text='Тестовый пост', group=self.group
+        )
+        Comment.objects.create(post=post, author=self.user, text='Коммент')
+        self.group.refresh_from_db()
+        self.user.profile.refresh_from_db()
+        post.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 1)
+        self.assertEqual(self.user.profile.posts_count, 1)
+        self.assertEqual(post.comments_count, 1)
+
+    def test_stale_instance_does_not_overwrite_counter(self):
+        """Сохранение поста не затирает счётчик комментариев."""
+        post = Post.objects.create(author=self.user, text='Тестовый пост')
+        Comment.objects.create(post=post, author=self.user, text='Коммент')
+        post.text = 'Новый текст'
+        post.save()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+
+    def test_reconcile_fixes_drift(self):
+        """Команда reconcile_counters исправляет расхождения."""
+        Post.objects.create(author=self.user, text='Тестовый пост')
+        PostCounter.objects.filter(scope=counters.GLOBAL_SCOPE).update(
+            value=42
+        )
+        Group.objects.update(posts_count=7)
+        call_command('reconcile_counters', stdout=StringIO())
+        self.assertCounts({
+            counters.GLOBAL_SCOPE: 1,
+            counters.group_scope(self.group.pk): 0,
+            counters.author_scope(self.user.pk): 1,
+        })
+
+    def test_feed_page_does_not_count_posts(self):
+        """Лента берёт число постов из счётчика, а не из COUNT(*)."""
+        Post.objects.bulk_create(
+            Post(author=self.user, text=f'Пост {i}') for i in range(40)
+        )
+        call_command('reconcile_counters', stdout=StringIO())
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('posts:index') + '?page=2')
+        self.assertFalse(
+            [q for q in queries if 'COUNT(' in q['sql'].upper()]
+        )
+        self.assertEqual(response.context['page_obj'].paginator.num_pages, 3)
+        self.assertEqual(response.context['page_obj'].page_window(), [1, 2, 3])
@@ -0,0 +1,133 @@
+import json
+import os
+import shutil
+import tempfile
+
+from io import StringIO
+from unittest import mock, skipUnless
+
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test import TestCase, TransactionTestCase
+
+from ..models import Comment, Group, Post, User
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Прагмы есть только у SQLite')
+class SQLitePragmasTests(TestCase):
+    """Прагмы SQLITE_PRAGMAS применяются к каждому соединению."""
+
+    def test_pragmas_are_applied(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA synchronous')
+            synchronous, = cursor.fetchone()
+            cursor.execute('PRAGMA busy_timeout')
+            busy_timeout, = cursor.fetchone()
+        # 1 — NORMAL.
+        self.assertEqual(synchronous, 1)
+        self.assertEqual(busy_timeout, 5000)
+
+
+@skipUnless(
+    connection.settings_dict.get('POOL'), 'Пул включается DB_POOL_SIZE'
+)
+class ConnectionPoolTests(TestCase):
+    """Закрытое соединение возвращается в пул и выдаётся снова."""
+
+    def test_connection_is_reused(self):
+        from core.db.postgresql.base import get_pool
+
+        pool = get_pool(
+            connection.alias, connection.settings_dict,
+            connection.get_connection_params(),
+        )
+        # В TestCase соединение внутри транзакции: берётся отдельное.
+        raw = pool.get()
+        pool.put(raw)
+        self.assertIs(pool.get(), raw)
+        pool.put(raw)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Пул — для PostgreSQL')
+class PoolTests(TestCase):
+    """Пул держит открытыми все возвращённые соединения до MAX_SIZE."""
+
+    def test_returned_connections_stay_open_up_to_max_size(self):
+        from core.db.postgresql.base import Pool
+
+        pool = Pool(1, 4, 1, None, **connection.get_connection_params())
+        self.addCleanup(pool.close)
+        # Четыре соединения заняты одновременно: после возврата все
+        # выдаются снова, без подключения заново.
+        taken = [pool.get() for _ in range(4)]
+        for raw in taken:
+            pool.put(raw)
+        again = [pool.get() for _ in range(4)]
+        self.assertCountEqual(map(id, again), map(id, taken))
+        self.assertFalse(any(raw.closed for raw in again))
+        for raw in again:
+            pool.put(raw)
+
+    def test_unfinished_transaction_is_rolled_back_on_return(self):
+        from core.db.postgresql.base import Pool
+        from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+
+        pool = Pool(0, 1, 1, None, **connection.get_connection_params())
+        self.addCleanup(pool.close)
+        raw = pool.get()
+        with raw.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        pool.put(raw)
+        self.assertIs(pool.get(), raw)
+        self.assertEqual(
+            raw.get_transaction_status(), TRANSACTION_STATUS_IDLE
+        )
+        pool.put(raw)
+
+
+class BenchCommentsTests(TransactionTestCase):
+    """Команда bench_comments: одновременная запись комментариев."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='auth')
+        group = Group.objects.create(
+            title='Тестовая группа', slug='test-slug', description='Описание'
+        )
+        self.post = Post.objects.create(
+            author=self.user, group=group, text='Тестовый пост'
+        )
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def test_comments_are_written_and_reported(self):
+        path = os.path.join(self.directory, 'comments.json')
+        # Тестовая база SQLite в памяти общая для потоков, но её
+        # блокировки таблиц не ждут busy_timeout: здесь один поток.
+        call_command(
+            'bench_comments', threads=1, comments=5, output=path,
+            stdout=StringIO(),
+        )
+        with open(path, encoding='utf-8') as source:
+            report = json.load(source)
+        self.assertEqual(report['config']['database'], connection.vendor)
+        self.assertEqual((report['comments'], report['errors']), (5, 0))
+        self.assertEqual(Comment.objects.count(), 5)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 5)
+
+    def test_connection_is_released_after_each_comment(self):
+        # Как на сервере, соединение закрывается или возвращается в пул
+        # в начале и в конце каждого запроса; тестовый клиент Django
+        # этого не делает.
+        wrapper = type(connections[connection.alias])
+        with mock.patch.object(
+            wrapper, 'close_if_unusable_or_obsolete', autospec=True
+        ) as release:
+            call_command(
+                'bench_comments', threads=1, comments=3, stdout=StringIO(),
+            )
+        default_calls = [
+            args for args, _ in release.call_args_list
+            if args[0].alias == connection.alias
+        ]
+        self.assertEqual(len(default_calls), 2 * 3)
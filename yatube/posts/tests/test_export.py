@@ -0,0 +1,105 @@
+import csv
+import gzip
+import io
+import json
+import os
+import tempfile
+
+from datetime import timedelta
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .. import export
+from ..models import Comment, Group, Post, User
+
+
+class ExportTests(TestCase):
+    """Потоковая выгрузка: куски по ключу, фильтры, форматы и gzip."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='auth')
+        cls.other = User.objects.create_user(username='other')
+        cls.staff = User.objects.create_user(username='staff', is_staff=True)
+        cls.group = Group.objects.create(
+            title='Тестовая группа', slug='test-slug', description='Описание'
+        )
+        cls.posts = [
+            Post.objects.create(
+                author=cls.user if i % 2 else cls.other,
+                group=cls.group if i < 3 else None,
+                text=f'Пост {i}',
+            )
+            for i in range(5)
+        ]
+        Comment.objects.create(
+            post=cls.posts[0], author=cls.user, text='Комментарий'
+        )
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.staff)
+
+    def download(self, **params):
+        response = self.client.get(reverse('posts:export_posts'), params)
+        self.assertEqual(response.status_code, 200)
+        return response, b''.join(response.streaming_content)
+
+    def test_chunks_are_read_by_key_one_query_each(self):
+        with CaptureQueriesContext(connection) as queries:
+            chunks = list(export.chunks('posts', chunk_size=2))
+        self.assertEqual([len(chunk) for chunk in chunks], [2, 2, 1])
+        self.assertEqual(len(queries), 3)
+        self.assertEqual(
+            [row[0] for chunk in chunks for row in chunk],
+            [post.pk for post in sorted(self.posts, key=lambda p: p.pk)],
+        )
+
+    def test_jsonl_is_filtered_by_group_and_author(self):
+        response, content = self.download(group='test-slug', author='auth')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in content.decode().splitlines()]
+        self.assertEqual([row['id'] for row in rows], [self.posts[1].pk])
+        self.assertEqual(rows[0]['group'], 'test-slug')
+
+    def test_csv_comments_have_header(self):
+        _, content = self.download(kind='comments', format='csv')
+        rows = list(csv.DictReader(io.StringIO(content.decode())))
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['text'], 'Комментарий')
+
+    def test_gzip_matches_plain_output(self):
+        response, packed = self.download(gzip='on')
+        self.assertTrue(response['Content-Disposition'].endswith('.gz"'))
+        _, plain = self.download()
+        self.assertEqual(gzip.decompress(packed), plain)
+
+    def test_unsupported_filter_and_non_staff_are_rejected(self):
+        response = self.client.get(
+            reverse('posts:export_posts'), {'kind': 'groups', 'author': 'auth'}
+        )
+        self.assertEqual(response.status_code, 400)
+        client = Client()
+        client.force_login(self.user)
+        response = client.get(reverse('posts:export_posts'))
+        self.assertEqual(response.status_code, 302)
+
+    def test_command_writes_date_range_to_file(self):
+        Post.objects.filter(pk=self.posts[0].pk).update(
+            pub_date=timezone.now() - timedelta(days=10)
+        )
+        since = (timezone.now() - timedelta(days=1)).isoformat()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'posts.jsonl.gz')
+            call_command(
+                'export_posts', '--since', since, '--gzip', '-o', path,
+                stderr=io.StringIO(),
+            )
+            with gzip.open(path, 'rt', encoding='utf-8') as file:
+                ids = {json.loads(line)['id'] for line in file}
+        self.assertEqual(ids, {post.pk for post in self.posts[1:]})
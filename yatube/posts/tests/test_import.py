@@ -0,0 +1,122 @@
+import json
+import os
+import shutil
+import tempfile
+
+from datetime import datetime, timezone
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TransactionTestCase
+from django.utils import timezone as django_timezone
+
+from .. import bulk
+from ..models import Follow, Group, Post, TimelineEntry, User
+from ..search import matching_ids
+
+
+class ImportPostsTests(TransactionTestCase):
+    """Команда import_posts: пачки bulk_create и перестроение в конце."""
+
+    def setUp(self):
+        self.author = User.objects.create_user(username='auth')
+        self.group = Group.objects.create(
+            title='Тестовая группа', slug='test-slug', description='Описание'
+        )
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def write(self, name, content):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(content)
+        return path
+
+    def run_import(self, path, *args):
+        out, err = StringIO(), StringIO()
+        call_command('import_posts', path, *args, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def test_jsonl_is_imported_with_dates_and_counters(self):
+        rows = [
+            {'author': 'auth', 'group': 'test-slug', 'text': f'Караван {i}',
+             'pub_date': f'2020-01-0{i + 1}T10:00:00+00:00'}
+            for i in range(5)
+        ]
+        path = self.write(
+            'posts.jsonl', '\n'.join(json.dumps(row) for row in rows)
+        )
+        out, _ = self.run_import(path, '--batch-size', '2')
+        self.assertIn('строк/с', out)
+        self.assertEqual(Post.objects.count(), 5)
+        self.assertEqual(
+            Post.objects.earliest('pub_date').pub_date,
+            datetime(2020, 1, 1, 10, tzinfo=timezone.utc),
+        )
+        self.group.refresh_from_db()
+        self.author.profile.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 5)
+        self.assertEqual(self.author.profile.posts_count, 5)
+        if connection.vendor == 'sqlite':
+            self.assertEqual(len(matching_ids('караван', 10)), 5)
+
+    def test_unknown_author_is_skipped_or_created(self):
+        path = self.write(
+            'posts.csv',
+            'author,group,text\n'
+            'auth,,Первый\n'
+            'stranger,new-group,Второй\n'
+            'auth,,\n'
+        )
+        _, err = self.run_import(path)
+        self.assertIn('Строка 3 пропущена', err)
+        self.assertIn('Строка 4 пропущена', err)
+        self.assertEqual(Post.objects.count(), 1)
+        self.run_import(path, '--create-missing')
+        self.assertTrue(Post.objects.filter(
+            author__username='stranger', group__slug='new-group'
+        ).exists())
+
+    def test_followers_timelines_are_filled(self):
+        reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=reader, author=self.author)
+        path = self.write(
+            'posts.jsonl', json.dumps({'author': 'auth', 'text': 'Пост'})
+        )
+        self.run_import(path, '--defer-indexes')
+        self.assertEqual(TimelineEntry.objects.filter(user=reader).count(), 1)
+        with connection.cursor() as cursor:
+            indexes = connection.introspection.get_constraints(
+                cursor, Post._meta.db_table
+            )
+        self.assertIn('post_feed_idx', indexes)
+
+    def test_load_keeps_other_dates_and_api_indexes(self):
+        seen = {}
+        create = bulk.create
+
+        def create_during_load(model, objects):
+            with connection.cursor() as cursor:
+                seen['indexes'] = connection.introspection.get_constraints(
+                    cursor, Post._meta.db_table
+                )
+            seen['post'] = Post.objects.create(author=self.author, text='Сайт')
+            return create(model, objects)
+
+        path = self.write('posts.jsonl', json.dumps({
+            'author': 'auth', 'text': 'Старый',
+            'pub_date': '2020-01-01T10:00:00+00:00',
+        }))
+        started = django_timezone.now()
+        with mock.patch.object(bulk, 'create', create_during_load):
+            self.run_import(path, '--defer-indexes')
+        self.assertNotIn('post_feed_idx', seen['indexes'])
+        self.assertIn('post_updated_idx', seen['indexes'])
+        self.assertIn('post_author_updated_idx', seen['indexes'])
+        self.assertGreaterEqual(seen['post'].pub_date, started)
+        self.assertEqual(
+            Post.objects.get(text='Старый').updated_at,
+            datetime(2020, 1, 1, 10, tzinfo=timezone.utc),
+        )
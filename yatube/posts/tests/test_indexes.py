@@ -0,0 +1,71 @@
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Group, Post
+
+User = get_user_model()
+
+
+@skipUnless(connection.vendor == 'sqlite', 'План запроса проверяется в SQLite')
+class FeedIndexesTests(TestCase):
+    """Запросы лент читают индекс, а не сортируют всю таблицу."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание',
+        )
+        Post.objects.bulk_create(
+            Post(author=cls.user, group=cls.group, text=f'Пост {i}')
+            for i in range(40)
+        )
+        cls.post = Post.objects.first()
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=cls.user, text=f'Коммент {i}')
+            for i in range(40)
+        )
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            return ' | '.join(str(row[-1]) for row in cursor.fetchall())
+
+    def assertOrderedByIndex(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        ordered = [
+            query['sql'] for query in queries
+            if 'ORDER BY' in query['sql']
+            and ('"posts_post"' in query['sql']
+                 or '"posts_comment"' in query['sql'])
+        ]
+        self.assertTrue(ordered, f'{url}: нет запросов ленты')
+        for sql in ordered:
+            plan = self.explain(sql)
+            self.assertNotIn('TEMP B-TREE', plan, f'{url}: {plan}')
+            self.assertIn('INDEX', plan, f'{url}: {plan}')
+
+    def test_views_use_indexes(self):
+        first_page = self.client.get(reverse('posts:index'))
+        cursor = first_page.context['page_obj'].next_cursor
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:index') + f'?cursor={cursor}',
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user.username}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertOrderedByIndex(url)
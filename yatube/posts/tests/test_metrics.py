@@ -0,0 +1,61 @@
+from core import metrics
+from django.core.cache import caches
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Post, User
+
+
+class MetricsTests(TestCase):
+    """Метрики ответов по view и страница /metrics."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='auth')
+        Post.objects.create(author=cls.user, text='Тестовый пост')
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+        metrics.reset()
+        self.client = Client()
+
+    @override_settings(FEED_CACHE_TIMEOUT=300)
+    def test_view_stats_are_exposed(self):
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('posts:index'))
+        response = self.client.get(reverse('metrics'))
+        text = response.content.decode()
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(
+            'yatube_requests_total{view="posts:index",status="200"} 2', text
+        )
+        self.assertIn(
+            'yatube_request_duration_seconds_count{view="posts:index"} 2',
+            text,
+        )
+        self.assertIn(
+            'yatube_request_duration_seconds_bucket'
+            '{view="posts:index",le="+Inf"} 2',
+            text,
+        )
+        # Второй ответ взят из кэша страниц.
+        self.assertIn('yatube_feed_cache_hits_total 1', text)
+        stats = metrics._views['posts:index']
+        self.assertGreater(stats.queries, 0)
+        self.assertGreater(stats.templates, 0)
+        self.assertGreater(stats.size, 0)
+
+    @override_settings(METRICS_SLOW_REQUEST_SECONDS=0)
+    def test_slow_request_logs_sql(self):
+        with self.assertLogs('yatube.slow_requests', 'WARNING') as logs:
+            self.client.get(reverse('posts:index'))
+        self.assertIn('posts_post', logs.output[0])
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_token_is_required_when_set(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        response = self.client.get(
+            reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret'
+        )
+        self.assertEqual(response.status_code, 200)
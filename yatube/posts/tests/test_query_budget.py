@@ -0,0 +1,148 @@
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import User
+from ..urls import urlpatterns
+from .query_budget import (
+    QueryBudgetMixin, create_large_dataset, shared_cache_auth,
+)
+
+
+@shared_cache_auth
+class ViewsQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Бюджеты SQL-запросов для всех страниц приложения posts."""
+
+    # Гость: только запросы самой страницы.
+    guest_budgets = {
+        'index': 2,
+        'group_list': 2,
+        'profile': 2,
+        'post_detail': 2,
+        'post_comments': 2,
+        # JSON API: свежесть ленты, затем страница.
+        'api_index': 3,
+        'api_group_posts': 3,
+        'api_profile': 3,
+    }
+    # Авторизованный пользователь: сессия и пользователь берутся из кэша.
+    user_budgets = {
+        'post_create': 1,
+        'post_edit': 2,
+        'add_comment': 5,
+        'follow_index': 3,
+    }
+    # Персонал: выгрузка вместе с чтением потока, один кусок строк.
+    staff_budgets = {
+        'export_posts': 1,
+    }
+    # Подписки: второй такой же запрос ничего не меняет, поэтому для
+    # каждого размера страницы адреса проходятся по порядку, подписка
+    # перед отпиской.
+    action_budgets = {
+        'profile_follow': 9,
+        'profile_unfollow': 6,
+        'group_follow': 9,
+        'group_unfollow': 6,
+    }
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.users, cls.groups, cls.posts = create_large_dataset()
+        cls.author = cls.users[0]
+        cls.post = cls.posts[0]
+        cls.staff = User.objects.create_user(username='staff', is_staff=True)
+
+    def setUp(self):
+        self.guest_client = Client()
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+        self.staff_client = Client()
+        self.staff_client.force_login(self.staff)
+
+    def urls(self):
+        post = {'post_id': self.post.pk}
+        return {
+            'index': reverse('posts:index'),
+            'group_list': reverse(
+                'posts:group_list', kwargs={'slug': self.groups[1].slug}
+            ),
+            'profile': reverse(
+                'posts:profile', kwargs={'username': self.author.username}
+            ),
+            'post_detail': reverse('posts:post_detail', kwargs=post),
+            'post_comments': reverse('posts:post_comments', kwargs=post),
+            'post_create': reverse('posts:post_create'),
+            'post_edit': reverse('posts:post_edit', kwargs=post),
+            'add_comment': reverse('posts:add_comment', kwargs=post),
+            'follow_index': reverse('posts:follow_index'),
+            'export_posts': reverse('posts:export_posts'),
+            'api_index': reverse('posts:api_index'),
+            'api_group_posts': reverse(
+                'posts:api_group_posts', kwargs={'slug': self.groups[1].slug}
+            ),
+            'api_profile': reverse(
+                'posts:api_profile', kwargs={'username': self.author.username}
+            ),
+            'profile_follow': reverse(
+                'posts:profile_follow', args=[self.users[1].username]
+            ),
+            'profile_unfollow': reverse(
+                'posts:profile_unfollow', args=[self.users[1].username]
+            ),
+            'group_follow': reverse(
+                'posts:group_follow', args=[self.groups[1].slug]
+            ),
+            'group_unfollow': reverse(
+                'posts:group_unfollow', args=[self.groups[1].slug]
+            ),
+        }
+
+    def test_every_view_has_budget(self):
+        budgets = {
+            **self.guest_budgets, **self.user_budgets, **self.staff_budgets,
+            **self.action_budgets,
+        }
+        for pattern in urlpatterns:
+            with self.subTest(name=pattern.name):
+                self.assertIn(pattern.name, budgets)
+
+    def test_guest_pages_within_budget(self):
+        urls = self.urls()
+        for name, budget in self.guest_budgets.items():
+            with self.subTest(name=name):
+                self.assertQueryBudget(self.guest_client, urls[name], budget)
+
+    def test_user_pages_within_budget(self):
+        urls = self.urls()
+        for name, budget in self.user_budgets.items():
+            method, data = 'get', None
+            if name == 'add_comment':
+                method, data = 'post', {'text': 'Комментарий'}
+            with self.subTest(name=name):
+                self.assertQueryBudget(
+                    self.author_client, urls[name], budget, method, data
+                )
+
+    def test_staff_pages_within_budget(self):
+        urls = self.urls()
+        for name, budget in self.staff_budgets.items():
+            with self.subTest(name=name):
+                self.assertQueryBudget(self.staff_client, urls[name], budget)
+
+    def test_follow_actions_within_budget(self):
+        urls = self.urls()
+        counts = {name: [] for name in self.action_budgets}
+        for size in self.page_sizes:
+            for name in self.action_budgets:
+                counts[name].append(self.count_at_page_size(
+                    size, self.author_client, urls[name]
+                ))
+        for name, budget in self.action_budgets.items():
+            with self.subTest(name=name):
+                self.assertSameAtPageSizes(urls[name], counts[name])
+                self.assertLessEqual(
+                    counts[name][0], budget,
+                    f'{urls[name]}: {counts[name][0]} запросов '
+                    f'при бюджете {budget}'
+                )
@@ -0,0 +1,160 @@
+import time
+
+from unittest import mock, skipUnless
+
+from core.db import routers
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.http import HttpResponse
+from django.test import (
+    Client, RequestFactory, TestCase, TransactionTestCase, override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .. import cache as feed_cache
+from ..models import Group, Post, User
+
+
+@override_settings(READ_REPLICAS=['replica'])
+class ReplicaRoutingTests(TestCase):
+    """Выбор базы для чтения: реплика, липкость после записи, отставание."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='auth')
+        cls.author = User.objects.create_user(username='author')
+
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+
+    def choose(self, lag=0, **cookies):
+        request = self.factory.get('/')
+        request.COOKIES.update(cookies)
+        with mock.patch.object(routers, 'replica_lag', return_value=lag):
+            return routers.choose_replica(request)
+
+    def test_replica_is_chosen(self):
+        self.assertEqual(self.choose(), 'replica')
+
+    def test_lagging_replica_falls_back_to_primary(self):
+        self.assertIsNone(self.choose(lag=60))
+
+    def test_sticky_cookie_reads_from_primary(self):
+        future = str(time.time() + 10)
+        past = str(time.time() - 10)
+        self.assertIsNone(self.choose(**{routers.STICKY_COOKIE: future}))
+        self.assertEqual(
+            self.choose(**{routers.STICKY_COOKIE: past}), 'replica'
+        )
+        self.assertEqual(
+            self.choose(**{routers.STICKY_COOKIE: 'мусор'}), 'replica'
+        )
+
+    def test_router_uses_alias_only_inside_annotated_view(self):
+        router = routers.ReplicaRouter()
+        seen = {}
+
+        @routers.read_from_replica
+        def view(request):
+            seen['post'] = router.db_for_read(Post)
+            seen['session'] = router.db_for_read(Session)
+            seen['write'] = router.db_for_write(Post)
+
+        with mock.patch.object(routers, 'replica_lag', return_value=0):
+            view(self.factory.get('/'))
+        self.assertEqual(seen, {
+            'post': 'replica',
+            'session': DEFAULT_DB_ALIAS,
+            'write': DEFAULT_DB_ALIAS,
+        })
+        self.assertIsNone(router.db_for_read(Post))
+
+    def test_write_sets_sticky_cookie(self):
+        client = Client()
+        client.force_login(self.user)
+        response = client.get(
+            reverse('posts:profile_follow', kwargs={'username': 'author'})
+        )
+        self.assertIn(routers.STICKY_COOKIE, response.cookies)
+        self.assertTrue(routers.is_sticky(
+            RequestFactory(HTTP_COOKIE=response.cookies.output(
+                header='', sep=';'
+            )).get('/')
+        ))
+
+    def test_reads_do_not_set_sticky_cookie(self):
+        # Отставшая реплика: чтение из основной базы этого процесса.
+        with mock.patch.object(routers, 'replica_lag', return_value=60):
+            response = Client().get(reverse('posts:index'))
+        self.assertNotIn(routers.STICKY_COOKIE, response.cookies)
+
+    def cached_replica_view(self):
+        view = routers.read_from_replica(
+            feed_cache.cache_page_for_guests(lambda: ['feed'])(
+                lambda request: HttpResponse('Лента')
+            )
+        )
+        request = self.factory.get('/')
+        request.user = AnonymousUser()
+        with mock.patch.object(routers, 'replica_lag', return_value=0):
+            return view(request)['X-Feed-Cache']
+
+    @override_settings(FEED_CACHE_TIMEOUT=300)
+    def test_replica_page_is_not_cached_right_after_write(self):
+        feed_cache.invalidate('feed')
+        self.assertEqual(self.cached_replica_view(), 'miss')
+        self.assertEqual(self.cached_replica_view(), 'miss')
+        with override_settings(REPLICA_MAX_LAG_SECONDS=0):
+            self.assertEqual(self.cached_replica_view(), 'miss')
+            self.assertEqual(self.cached_replica_view(), 'hit')
+
+    @override_settings(READ_REPLICAS=[])
+    def test_no_cookie_without_replicas(self):
+        client = Client()
+        client.force_login(self.user)
+        response = client.get(
+            reverse('posts:profile_follow', kwargs={'username': 'author'})
+        )
+        self.assertNotIn(routers.STICKY_COOKIE, response.cookies)
+
+
+@skipUnless('replica' in connections, 'Реплика задаётся DB_REPLICA_NAME')
+class ReplicaDatabaseTests(TransactionTestCase):
+    """Ленты читаются из реплики, пока пользователь ничего не записал."""
+
+    databases = '__all__'
+
+    def setUp(self):
+        cache.clear()
+        routers._lags.clear()
+        self.user = User.objects.create_user(username='auth')
+        self.group = Group.objects.create(
+            title='Тестовая группа', slug='test-slug', description='Описание'
+        )
+        Post.objects.create(author=self.user, text='Пост', group=self.group)
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def queries(self, url):
+        with CaptureQueriesContext(connections['replica']) as replica:
+            with CaptureQueriesContext(
+                connections[DEFAULT_DB_ALIAS]
+            ) as primary:
+                self.client.get(url)
+        return len(primary), len(replica)
+
+    def test_reads_go_to_replica_until_write(self):
+        url = reverse('posts:group_list', kwargs={'slug': 'test-slug'})
+        _, replica = self.queries(url)
+        self.assertGreater(replica, 0)
+        self.client.post(
+            reverse('posts:post_create'),
+            {'text': 'Новый пост', 'group': self.group.pk},
+        )
+        primary, replica = self.queries(url)
+        self.assertEqual(replica, 0)
+        self.assertGreater(primary, 0)
@@ -0,0 +1,142 @@
+from unittest import skipUnless
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.urls import reverse
+
+from ..models import Group, Post, User
+from ..search import PG_CONFIG, PG_SEARCH_SQL, rebuild_index, search_posts
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Индекс FTS5 есть только в SQLite')
+class SearchTests(TestCase):
+    """Поиск по индексу FTS5 и его обновление при записи."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='Путешествия',
+            slug='travel',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text='Собака <b>лает</b>, караван идёт',
+            group=cls.group,
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def found(self, query):
+        return [post.pk for post in search_posts(query)]
+
+    def test_text_is_found_and_highlighted(self):
+        page = search_posts('караван')
+        self.assertEqual([post.pk for post in page], [self.post.pk])
+        self.assertIn('<mark>караван</mark>', page[0].highlight)
+        self.assertIn('&lt;b&gt;', page[0].highlight)
+
+    def test_words_match_whole_unless_prefix_asked(self):
+        self.assertEqual(self.found('собака кара'), [])
+        self.assertEqual(self.found('собака кара*'), [self.post.pk])
+
+    def test_group_title_is_found(self):
+        self.assertEqual(self.found('путешествия'), [self.post.pk])
+        self.group.title = 'Походы'
+        self.group.save()
+        self.assertEqual(self.found('путешествия'), [])
+        self.assertEqual(self.found('походы'), [self.post.pk])
+
+    def test_index_follows_edit_and_delete(self):
+        post = Post.objects.create(author=self.user, text='Пёс лает')
+        post.text = 'Кошка мяукает'
+        post.save()
+        self.assertEqual(self.found('пёс'), [])
+        self.assertEqual(self.found('кошка'), [post.pk])
+        post.delete()
+        self.assertEqual(self.found('кошка'), [])
+
+    def test_more_relevant_post_comes_first(self):
+        relevant = Post.objects.create(
+            author=self.user, text='караван караван караван'
+        )
+        self.assertEqual(self.found('караван'), [relevant.pk, self.post.pk])
+
+    def test_old_relevant_post_outranks_many_newer_matches(self):
+        relevant = Post.objects.create(
+            author=self.user, text='караван караван караван'
+        )
+        Post.objects.bulk_create(
+            Post(author=self.user, text=f'караван и ещё слова {i}')
+            for i in range(1100)
+        )
+        rebuild_index()
+        self.assertEqual(self.found('караван')[0], relevant.pk)
+
+    def test_cursor_pages_do_not_overlap(self):
+        for i in range(20):
+            Post.objects.create(author=self.user, text=f'караван номер {i}')
+        first = search_posts('караван', per_page=15)
+        self.assertTrue(first.has_next())
+        second = search_posts('караван', first.next_cursor, per_page=15)
+        self.assertFalse(second.has_next())
+        ids = [post.pk for post in first] + [post.pk for post in second]
+        self.assertEqual(len(ids), 21)
+        self.assertEqual(len(set(ids)), 21)
+
+    def test_header_form_query_renders_results(self):
+        response = self.client.get(reverse('posts:index'), {'q': 'караван'})
+        self.assertTemplateUsed(response, 'posts/search.html')
+        self.assertEqual(response.context['keyword'], 'караван')
+        self.assertContains(response, '<mark>караван</mark>')
+
+
+@skipUnless(connection.vendor == 'postgresql', 'GIN-индексы есть в PostgreSQL')
+class PostgresSearchTests(TestCase):
+    """Поиск по GIN-индексам текста постов и названий групп."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='Путешествия',
+            slug='travel',
+            description='Тестовое описание',
+        )
+        cls.in_group = Post.objects.create(
+            author=cls.user, text='Собака лает', group=cls.group
+        )
+        cls.in_text = Post.objects.create(
+            author=cls.user, text='Путешествия по Волге'
+        )
+
+    def found(self, query):
+        return [post.pk for post in search_posts(query)]
+
+    def test_text_and_group_title_are_found(self):
+        self.assertCountEqual(
+            self.found('путешествия'), [self.in_group.pk, self.in_text.pk]
+        )
+        self.assertEqual(self.found('собака'), [self.in_group.pk])
+
+    def test_search_reads_gin_indexes(self):
+        with connection.cursor() as cursor:
+            # Таблицы маленькие: без запрета планировщик выбрал бы
+            # последовательное чтение и с пригодным индексом.
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute(
+                'EXPLAIN ' + PG_SEARCH_SQL.format(after='1 = 1'),
+                [
+                    PG_CONFIG, PG_CONFIG, 'собака',
+                    PG_CONFIG, PG_CONFIG, 'собака',
+                    PG_CONFIG, PG_CONFIG, 'собака',
+                    20,
+                ],
+            )
+            plan = '\n'.join(row[0] for row in cursor.fetchall())
+        self.assertIn('post_text_search_idx', plan)
+        self.assertIn('group_title_search_idx', plan)
@@ -0,0 +1,154 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from io import StringIO
+from unittest import skipUnless
+
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import Client, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from .. import blobs, thumbnails
+from ..models import ImageBlob, ImageDerivative, Post, User
+from ..storage import is_content_addressed
+from .test_thumbnails import SMALL_GIF
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
+OTHER_GIF = SMALL_GIF.replace(b'\xFF\xFF\xFF', b'\x00\xFF\x00')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, BACKGROUND_WORKERS=0)
+class ContentAddressedStorageTests(TransactionTestCase):
+    """Одинаковые картинки хранятся одним файлом со счётчиком ссылок."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='auth')
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def tearDown(self):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def upload(self, content=SMALL_GIF, name='meme.gif'):
+        self.authorized_client.post(reverse('posts:post_create'), {
+            'text': 'Мем',
+            'image': SimpleUploadedFile(name, content),
+        })
+        return Post.objects.latest('pk')
+
+    def exists(self, name):
+        return os.path.exists(os.path.join(TEMP_MEDIA_ROOT, name))
+
+    def test_same_content_is_stored_once(self):
+        first = self.upload(name='meme.gif')
+        second = self.upload(name='copy.gif')
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertTrue(is_content_addressed(first.image.name))
+        self.assertEqual(ImageBlob.objects.get().refs, 2)
+        self.assertIsNotNone(thumbnails.lookup(first.image))
+        self.assertEqual(
+            ImageDerivative.objects.filter(source=first.image.name).count(),
+            ImageDerivative.objects.count(),
+        )
+
+    def test_shared_file_lives_until_last_post_is_deleted(self):
+        first = self.upload()
+        second = self.upload()
+        name = first.image.name
+        derivative = ImageDerivative.objects.first().file.name
+        first.delete()
+        self.assertTrue(self.exists(name))
+        self.assertEqual(ImageBlob.objects.get(name=name).refs, 1)
+        second.delete()
+        self.assertFalse(self.exists(name))
+        self.assertFalse(self.exists(derivative))
+        self.assertFalse(ImageBlob.objects.exists())
+        self.assertIsNone(thumbnails.lookup(first.image))
+
+    def test_replaced_image_is_released(self):
+        post = self.upload()
+        old = post.image.name
+        self.authorized_client.post(
+            reverse('posts:post_edit', kwargs={'post_id': post.pk}),
+            {
+                'text': 'Мем',
+                'image': SimpleUploadedFile('other.gif', OTHER_GIF),
+            },
+        )
+        post.refresh_from_db()
+        self.assertNotEqual(post.image.name, old)
+        self.assertFalse(self.exists(old))
+        self.assertEqual(
+            list(ImageBlob.objects.values_list('name', 'refs')),
+            [(post.image.name, 1)],
+        )
+
+    def test_same_upload_in_deleting_transaction_keeps_file(self):
+        first = self.upload()
+        name = first.image.name
+        with transaction.atomic():
+            first.delete()
+            second = Post.objects.create(
+                author=self.user, text='Мем',
+                image=SimpleUploadedFile('copy.gif', SMALL_GIF),
+            )
+        self.assertEqual(second.image.name, name)
+        self.assertTrue(self.exists(name))
+        self.assertEqual(ImageBlob.objects.get(name=name).refs, 1)
+
+    @skipUnless(
+        connection.vendor == 'postgresql', 'Блокировки строк есть в PostgreSQL'
+    )
+    def test_delete_waits_for_uncommitted_upload_of_same_file(self):
+        storage = Post._meta.get_field('image').storage
+        # Последний пост с файлом удалён, удаление файла ещё не прошло.
+        name = storage.save('posts/meme.gif', ContentFile(SMALL_GIF))
+        pinned = threading.Event()
+
+        def upload():
+            try:
+                with transaction.atomic():
+                    storage.save('posts/copy.gif', ContentFile(SMALL_GIF))
+                    pinned.set()
+                    time.sleep(0.3)
+                    Post.objects.create(
+                        author=self.user, text='Мем', image=name
+                    )
+            finally:
+                pinned.set()
+                connection.close()
+
+        thread = threading.Thread(target=upload)
+        thread.start()
+        pinned.wait()
+        self.assertFalse(blobs.delete_if_unused(name))
+        thread.join()
+        self.assertTrue(self.exists(name))
+        self.assertEqual(ImageBlob.objects.get(name=name).refs, 1)
+
+    def test_command_moves_old_layout_into_storage(self):
+        os.makedirs(os.path.join(TEMP_MEDIA_ROOT, 'posts'))
+        posts = []
+        for name in ('posts/one.gif', 'posts/two.gif'):
+            with open(os.path.join(TEMP_MEDIA_ROOT, name), 'wb') as file:
+                file.write(SMALL_GIF)
+            post = Post.objects.create(author=self.user, text='Старый пост')
+            Post.objects.filter(pk=post.pk).update(image=name)
+            posts.append(post)
+        call_command('migrate_media_to_cas', workers=0, stdout=StringIO())
+        names = {post.image.name for post in Post.objects.all()}
+        self.assertEqual(len(names), 1)
+        name = names.pop()
+        self.assertTrue(is_content_addressed(name))
+        self.assertTrue(self.exists(name))
+        self.assertFalse(self.exists('posts/one.gif'))
+        self.assertEqual(
+            list(ImageBlob.objects.values_list('name', 'refs')), [(name, 2)]
+        )
+        self.assertIsNotNone(thumbnails.lookup(Post.objects.first().image))
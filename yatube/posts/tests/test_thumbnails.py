@@ -0,0 +1,267 @@
+import os
+import shutil
+import tempfile
+import time
+
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.models import KVStore
+
+from .. import derivatives, jobs, thumbnails
+from ..models import ImageDerivative, Post, ThumbnailJob, User
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailPipelineTests(TestCase):
+    """Миниатюры создаёт очередь, а не запрос страницы."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def create_post(self, name='small.gif'):
+        self.authorized_client.post(reverse('posts:post_create'), {
+            'text': 'Пост с картинкой',
+            'image': SimpleUploadedFile(name, SMALL_GIF, 'image/gif'),
+        })
+        return Post.objects.latest('pk')
+
+    def test_upload_queues_job(self):
+        post = self.create_post()
+        job = ThumbnailJob.objects.get()
+        self.assertEqual(job.post, post)
+        self.assertEqual(job.image, post.image.name)
+        self.assertEqual(job.status, ThumbnailJob.PENDING)
+
+    def test_edit_without_new_image_queues_nothing(self):
+        post = self.create_post()
+        self.authorized_client.post(
+            reverse('posts:post_edit', kwargs={'post_id': post.pk}),
+            {'text': 'Изменённый текст'},
+        )
+        self.assertEqual(ThumbnailJob.objects.count(), 1)
+
+    def test_feed_shows_placeholder_until_job_is_done(self):
+        post = self.create_post()
+        with mock.patch.object(
+            thumbnails, 'get_thumbnail', wraps=thumbnails.get_thumbnail
+        ) as generate, mock.patch(
+            'sorl.thumbnail.base.ThumbnailBackend.get_thumbnail'
+        ) as inline:
+            response = self.client.get(reverse('posts:index'))
+            generate.assert_not_called()
+            inline.assert_not_called()
+        self.assertNotContains(response, '<img class="card-img')
+        self.assertContains(response, 'aspect-ratio')
+
+        job = ThumbnailJob.objects.get()
+        self.assertTrue(thumbnails.run_job(job.pk))
+        job.refresh_from_db()
+        self.assertEqual(job.status, ThumbnailJob.DONE)
+        thumbnail = thumbnails.lookup(post.image)
+        self.assertIsNotNone(thumbnail)
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, thumbnail.url)
+        self.assertContains(response, 'loading="lazy"')
+
+    def test_miss_expires_when_other_process_builds_thumbnail(self):
+        post = self.create_post()
+        thumbnails.run_job(ThumbnailJob.objects.get().pk)
+        key = add_prefix(thumbnails.thumbnail_file(post.image).key)
+        value = KVStore.objects.get(key=key).value
+        # Миниатюры ещё нет: этот процесс запоминает промах.
+        KVStore.objects.filter(key=key).delete()
+        cache.clear()
+        self.assertIsNone(thumbnails.lookup(post.image))
+        # Задание в другом процессе записало строку и свой кэш, не этот.
+        KVStore.objects.create(key=key, value=value)
+        later = time.time() + settings.THUMBNAIL_MISS_CACHE_TIMEOUT + 1
+        with mock.patch(
+            'django.core.cache.backends.locmem.time.time', return_value=later
+        ):
+            self.assertIsNotNone(thumbnails.lookup(post.image))
+
+    def test_job_builds_responsive_derivatives(self):
+        post = self.create_post()
+        thumbnails.run_job(ThumbnailJob.objects.get().pk)
+        built = ImageDerivative.objects.filter(source=post.image.name)
+        self.assertEqual(
+            set(built.values_list('format', 'width', 'height')),
+            {
+                (image_format, width, round(width * 339 / 960))
+                for image_format in ('WEBP', 'JPEG')
+                for width in settings.IMAGE_DERIVATIVE_WIDTHS
+            },
+        )
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.pk})
+        )
+        webp = built.get(format='WEBP', width=320)
+        self.assertContains(response, '<source type="image/webp"')
+        self.assertContains(response, f'{webp.file.url} 320w')
+        self.assertContains(response, 'sizes="(max-width: 960px)')
+
+    def test_failed_rebuild_keeps_old_derivatives(self):
+        post = self.create_post()
+        thumbnails.run_job(ThumbnailJob.objects.get().pk)
+        old = set(ImageDerivative.objects.values_list('file', flat=True))
+        folder = os.path.join(
+            TEMP_MEDIA_ROOT, os.path.dirname(next(iter(old)))
+        )
+        files = set(os.listdir(folder))
+        with mock.patch.object(
+            ImageDerivative.objects, 'bulk_create',
+            side_effect=DatabaseError('сбой записи'),
+        ), self.assertRaises(DatabaseError):
+            derivatives.build(post.image)
+        self.assertEqual(
+            set(ImageDerivative.objects.values_list('file', flat=True)), old
+        )
+        self.assertEqual(set(os.listdir(folder)), files)
+
+    def test_broken_image_is_retried_then_failed(self):
+        post = Post.objects.create(
+            author=self.user,
+            text='Битая картинка',
+            image=SimpleUploadedFile('broken.gif', b'not a gif'),
+        )
+        job = post.thumbnail_jobs.get()
+        with self.settings(THUMBNAIL_MAX_ATTEMPTS=2), mock.patch.object(
+            jobs, 'defer'
+        ) as defer:
+            self.assertFalse(thumbnails.run_job(job.pk))
+            job.refresh_from_db()
+            self.assertEqual(job.status, ThumbnailJob.PENDING)
+            defer.assert_called_once_with(
+                thumbnails.run_job, job.pk,
+                delay=settings.THUMBNAIL_RETRY_DELAY,
+            )
+            self.assertFalse(thumbnails.run_job(job.pk))
+            defer.assert_called_once()
+        job.refresh_from_db()
+        self.assertEqual(job.status, ThumbnailJob.FAILED)
+        self.assertEqual(job.attempts, 2)
+
+    def test_reused_image_job_refreshes_post_cards(self):
+        post = self.create_post()
+        thumbnails.run_job(ThumbnailJob.objects.get().pk)
+        # Та же картинка в другом задании: файлы уже есть.
+        job = ThumbnailJob.objects.create(post=post, image=post.image.name)
+        post.refresh_from_db()
+        updated_at = post.updated_at
+        self.assertTrue(thumbnails.run_job(job.pk))
+        post.refresh_from_db()
+        self.assertGreater(post.updated_at, updated_at)
+
+    def test_backfill_recovers_interrupted_jobs(self):
+        post = self.create_post()
+        started = timezone.now() - timedelta(
+            seconds=settings.THUMBNAIL_JOB_TIMEOUT + 1
+        )
+        ThumbnailJob.objects.update(
+            status=ThumbnailJob.RUNNING, attempts=1, started=started
+        )
+        fresh = ThumbnailJob.objects.create(
+            post=post, image=post.image.name,
+            status=ThumbnailJob.RUNNING, started=timezone.now(),
+        )
+        out = StringIO()
+        call_command('backfill_thumbnails', workers=0, stdout=out)
+        self.assertIn('прерванных: 1', out.getvalue())
+        self.assertIsNotNone(thumbnails.lookup(post.image))
+        fresh.refresh_from_db()
+        self.assertEqual(fresh.status, ThumbnailJob.RUNNING)
+
+    def test_backfill_creates_missing_thumbnails(self):
+        post = self.create_post()
+        ThumbnailJob.objects.all().delete()
+        out = StringIO()
+        call_command('backfill_thumbnails', workers=0, stdout=out)
+        self.assertIn('Миниатюр создано: 1', out.getvalue())
+        self.assertIsNotNone(thumbnails.lookup(post.image))
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailLookupBatchingTests(TestCase):
+    """Миниатюры и производные страницы ленты ищутся одним запросом."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def create_posts(self, count):
+        for i in range(count):
+            Post.objects.create(
+                author=self.user,
+                text=f'Пост {i}',
+                image=SimpleUploadedFile(f'small{i}.gif', SMALL_GIF),
+            )
+        for job in ThumbnailJob.objects.filter(status=ThumbnailJob.PENDING):
+            thumbnails.run_job(job.pk)
+
+    def kvstore_lookups(self, url):
+        cache.clear()
+        with mock.patch(
+            'sorl.thumbnail.kvstores.cached_db_kvstore.KVStore._get_raw'
+        ) as single, CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        single.assert_not_called()
+        return response, sum(
+            'thumbnail_kvstore' in query['sql']
+            or 'posts_imagederivative' in query['sql']
+            for query in queries
+        )
+
+    def test_kvstore_lookups_do_not_grow_with_page(self):
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:profile', kwargs={'username': self.user.username}),
+        ]
+        self.create_posts(2)
+        small = [self.kvstore_lookups(url)[1] for url in urls]
+        self.create_posts(12)
+        for url, lookups in zip(urls, small):
+            with self.subTest(url=url):
+                response, large = self.kvstore_lookups(url)
+                self.assertEqual(large, lookups)
+                self.assertEqual(large, 2)
+                self.assertContains(response, '<img class="card-img', 14)
@@ -0,0 +1,185 @@
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import (
+    Client, TestCase, TransactionTestCase, override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Follow, Group, GroupFollow, Post, TimelineEntry, User
+from ..timeline import timeline_page
+
+
+class TimelineTests(TestCase):
+    """Лента подписок: раскладка постов при записи и слияние при чтении."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='author')
+        cls.other = User.objects.create_user(username='other')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def entries(self, user=None):
+        return set(TimelineEntry.objects.filter(
+            user=user or self.reader
+        ).values_list('post_id', flat=True))
+
+    def feed(self, **kwargs):
+        return [post.pk for post in timeline_page(self.reader, **kwargs)]
+
+    def test_new_post_is_pushed_to_followers(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        GroupFollow.objects.create(user=self.other, group=self.group)
+        post = Post.objects.create(
+            author=self.author, text='Пост', group=self.group
+        )
+        self.assertEqual(self.entries(), {post.pk})
+        self.assertEqual(self.entries(self.other), {post.pk})
+        self.assertEqual(self.entries(self.author), set())
+
+    def test_follow_copies_recent_posts_and_unfollow_removes_them(self):
+        posts = [
+            Post.objects.create(author=self.author, text=f'Пост {i}')
+            for i in range(3)
+        ]
+        in_group = Post.objects.create(
+            author=self.author, text='В группе', group=self.group
+        )
+        self.client.get(
+            reverse('posts:profile_follow', args=[self.author.username])
+        )
+        self.client.get(reverse('posts:group_follow', args=[self.group.slug]))
+        self.assertEqual(self.entries(), {in_group.pk, *(p.pk for p in posts)})
+        self.author.profile.refresh_from_db()
+        self.assertEqual(self.author.profile.followers_count, 1)
+        self.client.get(
+            reverse('posts:profile_unfollow', args=[self.author.username])
+        )
+        # Пост группы остаётся видимым через подписку на группу.
+        self.assertEqual(self.entries(), {in_group.pk})
+        self.author.profile.refresh_from_db()
+        self.assertEqual(self.author.profile.followers_count, 0)
+
+    def test_user_cannot_follow_self(self):
+        self.client.get(
+            reverse('posts:profile_follow', args=[self.reader.username])
+        )
+        self.assertFalse(Follow.objects.exists())
+
+    def test_edited_group_moves_post_between_timelines(self):
+        other_group = Group.objects.create(title='Другая', slug='other')
+        GroupFollow.objects.create(user=self.reader, group=self.group)
+        GroupFollow.objects.create(user=self.other, group=other_group)
+        post = Post.objects.create(
+            author=self.author, text='Пост', group=self.group
+        )
+        post.group = other_group
+        post.save()
+        self.assertEqual(self.entries(), set())
+        self.assertEqual(self.entries(self.other), {post.pk})
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=2)
+    def test_popular_author_is_merged_on_read(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=self.other, author=self.author)
+        Follow.objects.create(user=self.reader, author=self.other)
+        pushed = Post.objects.create(author=self.other, text='Разложен')
+        pulled = Post.objects.create(author=self.author, text='Популярный')
+        self.assertEqual(self.entries(), {pushed.pk})
+        self.assertEqual(self.feed(), [pulled.pk, pushed.pk])
+        response = self.client.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            [post.pk for post in response.context['page_obj']],
+            [pulled.pk, pushed.pk],
+        )
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=2)
+    def test_cursor_pages_do_not_overlap_across_sources(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=self.other, author=self.author)
+        GroupFollow.objects.create(user=self.reader, group=self.group)
+        for i in range(8):
+            Post.objects.create(
+                author=self.author if i % 2 else self.other,
+                group=self.group,
+                text=f'Пост {i}',
+            )
+        first = timeline_page(self.reader, per_page=5)
+        self.assertTrue(first.has_next())
+        second = timeline_page(self.reader, first.next_cursor, per_page=5)
+        self.assertFalse(second.has_next())
+        ids = [post.pk for post in first] + [post.pk for post in second]
+        self.assertEqual(
+            ids, list(Post.objects.order_by('-pub_date', '-pk')
+                      .values_list('pk', flat=True))
+        )
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=2)
+    def test_page_reads_all_sources_in_one_query(self):
+        for user in (self.reader, self.other):
+            Follow.objects.create(user=user, author=self.author)
+            GroupFollow.objects.create(user=user, group=self.group)
+        by_author = Post.objects.create(author=self.author, text='Автор')
+        in_group = Post.objects.create(
+            author=self.other, group=self.group, text='Группа'
+        )
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.feed(), [in_group.pk, by_author.pk])
+        # Популярные подписки, ключи всех лент, сами посты.
+        self.assertEqual(len(queries), 3)
+        merged, = [
+            query['sql'] for query in queries if 'UNION' in query['sql']
+            and 'posts_timelineentry' in query['sql']
+        ]
+        self.assertNotIn(' OR ', merged)
+        # Разложенные записи, автор и группа — каждый со своим LIMIT.
+        self.assertEqual(merged.count('LIMIT'), 4)
+        another = Group.objects.create(title='Другая', slug='another')
+        for user in (self.reader, self.other):
+            GroupFollow.objects.create(user=user, group=another)
+        with self.assertNumQueries(3):
+            self.feed()
+
+    def test_guest_is_redirected_to_login(self):
+        response = Client().get(reverse('posts:follow_index'))
+        self.assertEqual(response.status_code, 302)
+        self.assertIn(reverse('users:login'), response.url)
+
+
+@override_settings(TIMELINE_FANOUT_LIMIT=2, BACKGROUND_WORKERS=0)
+class PopularityLossTests(TransactionTestCase):
+    """Посты переставшего быть популярным автора раскладываются в фоне."""
+
+    def setUp(self):
+        self.reader = User.objects.create_user(username='reader')
+        self.other = User.objects.create_user(username='other')
+        self.author = User.objects.create_user(username='author')
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=self.other, author=self.author)
+        self.post = Post.objects.create(author=self.author, text='Пост')
+
+    def entries(self):
+        return set(TimelineEntry.objects.filter(
+            user=self.reader
+        ).values_list('post_id', flat=True))
+
+    def test_author_losing_popularity_is_pushed_after_commit(self):
+        self.assertEqual(self.entries(), set())
+        with transaction.atomic():
+            Follow.objects.filter(user=self.other).delete()
+            # Отписка не ждёт раскладки: она идёт после фиксации.
+            self.assertEqual(self.entries(), set())
+        self.assertEqual(self.entries(), {self.post.pk})
+        self.assertEqual(
+            [post.pk for post in timeline_page(self.reader)], [self.post.pk]
+        )
@@ -0,0 +1,98 @@
+import shutil
+import struct
+import tempfile
+import zlib
+
+from io import BytesIO
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from ..models import Post, User
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def image_bytes(size, image_format='JPEG'):
+    buffer = BytesIO()
+    Image.new('RGB', size, (200, 120, 40)).save(buffer, image_format)
+    return buffer.getvalue()
+
+
+def png_bomb(width, height):
+    """PNG, заголовок которого обещает картинку width x height."""
+    content = bytearray(image_bytes((1, 1), 'PNG'))
+    header = b'IHDR' + struct.pack('>II', width, height) + content[24:29]
+    content[12:29] = header
+    content[29:33] = struct.pack('>I', zlib.crc32(header))
+    return bytes(content)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class BoundedImageUploadTests(TestCase):
+    """Ограничения загрузки картинок в PostForm."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def upload(self, name, content):
+        return self.authorized_client.post(reverse('posts:post_create'), {
+            'text': 'Пост с картинкой',
+            'image': SimpleUploadedFile(name, content),
+        })
+
+    def assertRejected(self, response, code):
+        self.assertEqual(response.status_code, 200)
+        errors = response.context['form'].errors.as_data()['image']
+        self.assertEqual([error.code for error in errors], [code])
+        self.assertFalse(Post.objects.exists())
+
+    @override_settings(POST_IMAGE_MAX_BYTES=1024)
+    def test_oversize_file_is_cut_off(self):
+        self.assertRejected(
+            self.upload('big.jpg', image_bytes((400, 400)) + b'\0' * 2048),
+            'too_large',
+        )
+
+    def test_decompression_bomb_is_rejected_from_header(self):
+        self.assertRejected(
+            self.upload('bomb.png', png_bomb(50_000, 50_000)),
+            'too_many_pixels',
+        )
+
+    @override_settings(POST_IMAGE_MAX_DECODED_PIXELS=1_000_000)
+    def test_bomb_warning_zone_is_rejected_by_own_limit(self):
+        # Между MAX_IMAGE_PIXELS и двойным пределом Pillow только
+        # предупреждает: картинку отклоняет проверка размеров формы.
+        with mock.patch.object(Image, 'MAX_IMAGE_PIXELS', 1_500_000):
+            with self.assertWarns(Image.DecompressionBombWarning):
+                response = self.upload('bomb.png', png_bomb(2000, 1000))
+        self.assertRejected(response, 'too_many_pixels')
+
+    def test_format_outside_allowlist_is_rejected(self):
+        self.assertRejected(
+            self.upload('image.bmp', image_bytes((10, 10), 'BMP')),
+            'format',
+        )
+
+    @override_settings(POST_IMAGE_MAX_SIDE=100)
+    def test_oversize_original_is_downscaled(self):
+        self.upload('wide.jpg', image_bytes((400, 200)))
+        post = Post.objects.get()
+        with Image.open(post.image) as saved:
+            self.assertEqual(saved.size, (100, 50))
+            self.assertEqual(saved.format, 'JPEG')
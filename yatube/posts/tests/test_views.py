@@ -1,9 +1,13 @@
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
 from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
+from ..counters import reconcile
 from ..models import Comment, Group, Post
 
 User = get_user_model()
@@ -184,6 +188,8 @@ class PaginatorViewsTest(TestCase):
         cls.post = Post.objects.bulk_create(posts_list)
 
     def setUp(self):
+        # Посты созданы bulk_create без сигналов: страницы из кэша устарели.
+        cache.clear()
         self.authorized_client = Client()
         self.authorized_client.force_login(self.user)
 
@@ -200,6 +206,57 @@ class PaginatorViewsTest(TestCase):
             response.context['page_obj']),
             settings.ITEMS_FOR_TEST - settings.ITEMS_PER_PAGE)
 
+    def test_cursor_pages_match_numbered_pages(self):
+        """Курсоры ведут на те же записи, что и номера страниц."""
+        first = self.client.get(reverse('posts:index')).context['page_obj']
+        second = self.client.get(
+            reverse('posts:index') + f'?cursor={first.next_cursor}'
+        ).context['page_obj']
+        numbered = self.client.get(
+            reverse('posts:index') + '?page=2'
+        ).context['page_obj']
+        self.assertEqual(second.number, 2)
+        self.assertFalse(second.has_next())
+        self.assertEqual(list(second), list(numbered))
+        back = self.client.get(
+            reverse('posts:index') + f'?cursor={second.previous_cursor}'
+        ).context['page_obj']
+        self.assertEqual(list(back), list(first))
+        self.assertFalse(back.has_previous())
+
+    def test_cursor_page_does_not_count_rows(self):
+        """Страница по курсору не выполняет COUNT(*)."""
+        first = self.client.get(reverse('posts:index')).context['page_obj']
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(
+                reverse('posts:index') + f'?cursor={first.next_cursor}'
+            )
+        self.assertFalse(
+            [q for q in queries if 'COUNT(' in q['sql'].upper()]
+        )
+
+    def test_broken_cursor_shows_first_page(self):
+        response = self.client.get(reverse('posts:index') + '?cursor=xyz')
+        self.assertEqual(response.context['page_obj'].number, 1)
+        self.assertEqual(
+            len(response.context['page_obj']),
+            settings.ITEMS_PER_PAGE
+        )
+
+    def test_inflated_counter_falls_back_to_first_page(self):
+        """Завышенный счётчик не ведёт на пустую «последнюю» страницу."""
+        group = Group.objects.create(title='Группа', slug='g')
+        Post.objects.filter(
+            pk__in=Post.objects.order_by('pk').values('pk')[:3]
+        ).update(group=group)
+        Group.objects.filter(pk=group.pk).update(posts_count=100)
+        response = self.client.get(
+            reverse('posts:group_list', args=[group.slug]) + '?page=9'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['page_obj'].number, 1)
+        self.assertEqual(len(response.context['page_obj']), 3)
+
 
 class CommentViewsTests(TestCase):
     @classmethod
@@ -230,3 +287,65 @@ class CommentViewsTests(TestCase):
             kwargs={'post_id': self.post.id}))
         first_object = response.context['comments'][0]
         self.assertEqual(self.comment.text, first_object.text)
+
+    def test_post_detail_shows_only_post_comments(self):
+        """На странице поста только его комментарии, по страницам."""
+        other_post = Post.objects.create(author=self.user, text='Другой')
+        Comment.objects.create(post=other_post, author=self.user, text='Чужой')
+        Comment.objects.bulk_create(
+            Comment(post=self.post, author=self.user, text=f'Коммент {i}')
+            for i in range(settings.COMMENTS_PER_PAGE + 5)
+        )
+        response = self.client.get(reverse(
+            'posts:post_detail', kwargs={'post_id': self.post.id}
+        ))
+        comments = response.context['comments']
+        self.assertEqual(len(comments), settings.COMMENTS_PER_PAGE)
+        self.assertEqual(comments[0].text, 'Коммент 0')
+        self.assertTrue(all(c.post_id == self.post.id for c in comments))
+        response = self.client.get(
+            reverse('posts:post_comments', kwargs={'post_id': self.post.id}),
+            {'cursor': comments.next_cursor},
+        )
+        self.assertTemplateUsed(response, 'includes/comments.html')
+        self.assertEqual(
+            [c.text for c in response.context['comments']],
+            [f'Коммент {i}' for i in range(
+                settings.COMMENTS_PER_PAGE, settings.COMMENTS_PER_PAGE + 5
+            )]
+        )
+
+
+class ProfileFeedTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.other = User.objects.create_user(username='other')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_group',
+            description='Тестовое описание группы',
+        )
+        Post.objects.bulk_create(
+            Post(author=user, group=cls.group, text=f'{user} {i}')
+            for i in range(10)
+            for user in (cls.author, cls.other)
+        )
+        reconcile()
+
+    def test_profile_shows_only_author_posts(self):
+        """Профиль показывает посты автора за фиксированное число запросов:
+        автор с профилем и страница постов с группами."""
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse(
+                'posts:profile', kwargs={'username': self.author.username}
+            ))
+        self.assertEqual(
+            [post.pk for post in response.context['page_obj']],
+            list(self.author.posts.order_by(
+                '-pub_date', '-pk'
+            ).values_list('pk', flat=True))
+        )
+        self.assertEqual(response.context['posts_count'], 10)
+        self.assertContains(response, 'Все посты пользователя author')
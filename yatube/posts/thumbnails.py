@@ -0,0 +1,193 @@
+"""Миниатюры изображений постов, создаваемые заранее.
+
+Шаблоны только ищут готовую миниатюру в хранилище ключей sorl и не
+декодируют исходник в запросе: пока миниатюры нет, выводится заглушка.
+Создаёт миниатюры фоновая очередь — задание ThumbnailJob пишется вместе
+с постом и после фиксации транзакции уходит в пул потоков (posts.jobs). Задание
+строит и адаптивные производные картинки (posts.derivatives).
+"""
+import logging
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F, Q
+from django.utils import timezone
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.conf import (
+    defaults as sorl_defaults, settings as sorl_settings,
+)
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import (
+    EMPTY_VALUE, KVStore as CachedDbKVStore,
+)
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from . import derivatives, jobs
+from .models import ThumbnailJob
+
+logger = logging.getLogger(__name__)
+
+GEOMETRY = '960x339'
+OPTIONS = {'crop': 'center', 'upscale': True}
+
+
+def thumbnail_file(image):
+    """Файл миниатюры image с тем же именем, что дал бы get_thumbnail."""
+    backend = default.backend
+    source = ImageFile(image)
+    options = dict(OPTIONS)
+    if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(sorl_settings, attr)
+        if value != getattr(sorl_defaults, attr):
+            options.setdefault(key, value)
+    name = backend._get_thumbnail_filename(source, GEOMETRY, options)
+    return ImageFile(name, default.storage)
+
+
+def lookup(image):
+    """Готовая миниатюра или None; исходник при этом не читается."""
+    if not image:
+        return None
+    return lookup_many([image])[image.name]
+
+
+def _get_many_cached_db(kvstore, keys):
+    # То же, что KVStore._get_raw, но для всех ключей сразу: один
+    # get_many к кэшу и один запрос к таблице для промахов. Промах sorl
+    # помнил бы THUMBNAIL_CACHE_TIMEOUT (10 лет), и процесс, не
+    # выполнявший задание, показывал бы заглушку бессрочно.
+    values = kvstore.cache.get_many(keys)
+    missing = keys - values.keys()
+    if missing:
+        found = dict(KVStoreModel.objects.filter(
+            key__in=missing
+        ).values_list('key', 'value'))
+        kvstore.cache.set_many(found, sorl_settings.THUMBNAIL_CACHE_TIMEOUT)
+        if settings.THUMBNAIL_MISS_CACHE_TIMEOUT:
+            kvstore.cache.set_many(
+                dict.fromkeys(missing - found.keys(), EMPTY_VALUE),
+                settings.THUMBNAIL_MISS_CACHE_TIMEOUT,
+            )
+        values.update(found)
+    return {
+        key: value for key, value in values.items()
+        if value is not EMPTY_VALUE
+    }
+
+
+def lookup_many(images):
+    """Готовые миниатюры картинок одним обращением к хранилищу ключей.
+
+    Возвращает словарь {имя картинки: миниатюра или None}.
+    """
+    keys = {
+        image.name: add_prefix(thumbnail_file(image).key)
+        for image in images if image
+    }
+    if not keys:
+        return {}
+    kvstore = default.kvstore
+    if isinstance(kvstore, CachedDbKVStore):
+        values = _get_many_cached_db(kvstore, set(keys.values()))
+    else:
+        values = {key: kvstore._get_raw(key) for key in set(keys.values())}
+    return {
+        name: deserialize_image_file(values[key]) if values.get(key) else None
+        for name, key in keys.items()
+    }
+
+
+def attach_thumbnails(posts):
+    """Прикрепляет к постам готовые миниатюры (post.thumbnail)."""
+    found = lookup_many([post.image for post in posts])
+    for post in posts:
+        post.thumbnail = found.get(post.image.name)
+    return posts
+
+
+def schedule(post):
+    """Ставит в очередь миниатюру нового изображения поста."""
+    job = ThumbnailJob.objects.create(post=post, image=post.image.name)
+    jobs.defer(run_job, job.pk)
+    return job
+
+
+def run_in_thread(job_id):
+    """run_job для потока пула: у потока своё соединение с базой."""
+    return bool(jobs.run_in_thread(run_job, job_id))
+
+
+def _finish(job_id, status, error=''):
+    ThumbnailJob.objects.filter(pk=job_id).update(
+        status=status, error=error, finished=timezone.now()
+    )
+
+
+def _done(job_id, post):
+    _finish(job_id, ThumbnailJob.DONE)
+    # Карточка и страницы с заглушкой устарели: новое updated_at меняет
+    # ключ карточки, а сигнал сохранения сбрасывает кэш страниц.
+    post.save(update_fields=['updated_at'])
+
+
+def _retry_later(job, error):
+    if job.attempts >= settings.THUMBNAIL_MAX_ATTEMPTS:
+        _finish(job.pk, ThumbnailJob.FAILED, error)
+        return
+    ThumbnailJob.objects.filter(pk=job.pk).update(
+        status=ThumbnailJob.PENDING, error=error
+    )
+    jobs.defer(
+        run_job, job.pk,
+        delay=settings.THUMBNAIL_RETRY_DELAY * 2 ** (job.attempts - 1),
+    )
+
+
+def recover_stale():
+    """Возвращает в очередь задания, прерванные падением процесса."""
+    stale = timezone.now() - timedelta(seconds=settings.THUMBNAIL_JOB_TIMEOUT)
+    return ThumbnailJob.objects.filter(
+        Q(started__lt=stale) | Q(started__isnull=True),
+        status=ThumbnailJob.RUNNING,
+    ).update(status=ThumbnailJob.PENDING)
+
+
+def run_job(job_id):
+    """Создаёт миниатюру по заданию; True, если она готова."""
+    claimed = ThumbnailJob.objects.filter(
+        pk=job_id, status=ThumbnailJob.PENDING
+    ).update(
+        status=ThumbnailJob.RUNNING, attempts=F('attempts') + 1,
+        started=timezone.now(),
+    )
+    if not claimed:
+        return False
+    job = ThumbnailJob.objects.select_related('post').get(pk=job_id)
+    post = job.post
+    if post.image.name != job.image:
+        # Изображение уже заменено, для нового есть своё задание.
+        _done(job_id, post)
+        return False
+    if lookup(post.image) and derivatives.exist(post.image.name):
+        # Та же картинка уже загружалась: файлы общие (posts.storage).
+        _done(job_id, post)
+        return True
+    try:
+        get_thumbnail(post.image, GEOMETRY, **OPTIONS)
+        # sorl не бросает исключений на нечитаемый исходник, а просто
+        # не сохраняет миниатюру в хранилище ключей.
+        if lookup(post.image) is None:
+            raise OSError('миниатюра не создана')
+        derivatives.build(post.image)
+    except Exception as error:
+        _retry_later(job, str(error))
+        logger.warning('Миниатюра %s не создана: %s', job.image, error)
+        return False
+    _done(job_id, post)
+    return True
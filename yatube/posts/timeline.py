@@ -0,0 +1,308 @@
+"""Персональная лента подписок на авторов и группы.
+
+Новый пост раскладывается в TimelineEntry каждому подписчику автора и
+группы (fan-out on write), и страница ленты читается одним диапазоном
+индекса timeline_feed_idx. У авторов и групп, на которых подписано не
+меньше TIMELINE_FANOUT_LIMIT пользователей, посты не раскладываются:
+при чтении они берутся из ленты автора или группы и сливаются с
+разложенными (fan-out on read).
+"""
+from django.conf import settings
+from django.db import connections
+from django.db.models import CharField, F, Q, Value
+from users.models import Profile
+
+from . import jobs
+from .models import Follow, Group, GroupFollow, Post, TimelineEntry
+from .utils import FEED_ORDERING, chunked, decode_cursor, encode_cursor
+
+# Столько подписчиков за один bulk_create при раскладке в фоне.
+PUSH_CHUNK_SIZE = 100
+
+
+def is_popular(followers_count):
+    return followers_count >= settings.TIMELINE_FANOUT_LIMIT
+
+
+def _followers_count(author_id=None, group_id=None):
+    if group_id is not None:
+        rows = Group.objects.filter(pk=group_id)
+    else:
+        rows = Profile.objects.filter(user_id=author_id)
+    return rows.values_list('followers_count', flat=True).first() or 0
+
+
+def _push(entries):
+    """Записывает (пользователь, пост, дата) в ленты, пропуская повторы.
+
+    Размер пачки выбирает бэкенд: у SQLite он ограничен числом
+    параметров и частей составного SELECT.
+    """
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+            for user_id, post_id, pub_date in entries
+        ),
+        ignore_conflicts=True,
+    )
+
+
+def fan_out(post):
+    """Раскладывает пост подписчикам автора и группы поста."""
+    user_ids = set()
+    if not is_popular(_followers_count(author_id=post.author_id)):
+        user_ids.update(Follow.objects.filter(
+            author_id=post.author_id
+        ).values_list('user_id', flat=True))
+    if post.group_id is not None and not is_popular(
+        _followers_count(group_id=post.group_id)
+    ):
+        user_ids.update(GroupFollow.objects.filter(
+            group_id=post.group_id
+        ).values_list('user_id', flat=True))
+    user_ids.discard(post.author_id)
+    _push((user_id, post.pk, post.pub_date) for user_id in user_ids)
+
+
+def regroup(post, old_group_id):
+    """Переносит пост из лент подписчиков прежней группы в ленты новой."""
+    if old_group_id is not None:
+        TimelineEntry.objects.filter(
+            post=post,
+            user_id__in=GroupFollow.objects.filter(
+                group_id=old_group_id
+            ).values('user_id'),
+        ).exclude(
+            user_id__in=Follow.objects.filter(
+                author_id=post.author_id
+            ).values('user_id'),
+        ).delete()
+    fan_out(post)
+
+
+def _recent_posts(posts):
+    return list(
+        posts.order_by(*FEED_ORDERING).values_list(
+            'pk', 'pub_date', 'author_id'
+        )[:settings.TIMELINE_BACKFILL]
+    )
+
+
+def _push_recent(recent, user_ids):
+    _push(
+        (user_id, pk, pub_date)
+        for user_id in user_ids
+        for pk, pub_date, author_id in recent
+        if author_id != user_id
+    )
+
+
+def backfill(user_id, author_id=None, group_id=None):
+    """Добавляет в ленту новой подписки последние посты автора или группы."""
+    if group_id is not None:
+        posts = Post.objects.filter(group_id=group_id)
+    else:
+        posts = Post.objects.filter(author_id=author_id)
+    _push_recent(_recent_posts(posts), [user_id])
+
+
+def fill(author_ids=(), group_ids=()):
+    """Раскладывает последние посты авторов и групп всем подписчикам.
+
+    Для записи в обход сигналов (bulk_create): посты каждого автора или
+    группы читаются один раз. Счётчики подписчиков должны быть верны.
+    """
+    limit = settings.TIMELINE_FANOUT_LIMIT
+    for chunk in chunked(author_ids):
+        for author_id in Profile.objects.filter(
+            user_id__in=chunk, followers_count__gt=0,
+            followers_count__lt=limit,
+        ).values_list('user_id', flat=True):
+            _push_recent(
+                _recent_posts(Post.objects.filter(author_id=author_id)),
+                Follow.objects.filter(author_id=author_id).values_list(
+                    'user_id', flat=True
+                ),
+            )
+    for chunk in chunked(group_ids):
+        for group_id in Group.objects.filter(
+            pk__in=chunk, followers_count__gt=0, followers_count__lt=limit,
+        ).values_list('pk', flat=True):
+            _push_recent(
+                _recent_posts(Post.objects.filter(group_id=group_id)),
+                GroupFollow.objects.filter(group_id=group_id).values_list(
+                    'user_id', flat=True
+                ),
+            )
+
+
+def retract(user_id, author_id=None, group_id=None):
+    """Убирает из ленты посты отменённой подписки.
+
+    Посты, которые остаются видны через другую подписку пользователя,
+    не удаляются.
+    """
+    entries = TimelineEntry.objects.filter(user_id=user_id)
+    if group_id is not None:
+        entries.filter(post__group_id=group_id).exclude(
+            post__author_id__in=Follow.objects.filter(
+                user_id=user_id
+            ).values('author_id'),
+        ).delete()
+    else:
+        entries.filter(post__author_id=author_id).exclude(
+            post__group_id__in=GroupFollow.objects.filter(
+                user_id=user_id
+            ).values('group_id'),
+        ).delete()
+
+
+def push_recent(author_id=None, group_id=None):
+    """Раскладывает последние посты автора или группы всем подписчикам.
+
+    Подписчики берутся пачками по PUSH_CHUNK_SIZE: у переставшего быть
+    популярным автора их около TIMELINE_FANOUT_LIMIT.
+    """
+    if group_id is not None:
+        follows = GroupFollow.objects.filter(group_id=group_id)
+        posts = Post.objects.filter(group_id=group_id)
+    else:
+        follows = Follow.objects.filter(author_id=author_id)
+        posts = Post.objects.filter(author_id=author_id)
+    recent = _recent_posts(posts)
+    if not recent:
+        return
+    user_ids = follows.values_list('user_id', flat=True).iterator()
+    for chunk in chunked(user_ids, PUSH_CHUNK_SIZE):
+        _push_recent(recent, chunk)
+
+
+def change_followers(delta, author_id=None, group_id=None):
+    """Сдвигает счётчик подписчиков и возвращает новое значение.
+
+    Когда автор или группа перестают быть популярными, их последние
+    посты раскладываются подписчикам: раньше они брались при чтении.
+    Это до TIMELINE_BACKFILL × TIMELINE_FANOUT_LIMIT строк, поэтому
+    раскладка идёт в фоне (posts.jobs), а не в запросе отписки.
+    """
+    if group_id is not None:
+        rows = Group.objects.filter(pk=group_id)
+    else:
+        rows = Profile.objects.filter(user_id=author_id)
+    rows.update(followers_count=F('followers_count') + delta)
+    count = rows.values_list('followers_count', flat=True).first() or 0
+    if delta < 0 and is_popular(count - delta) and not is_popular(count):
+        jobs.defer(push_recent, author_id, group_id)
+    return count
+
+
+class TimelinePage(list):
+    """Страница ленты подписок с курсором на следующую."""
+
+    def __init__(self, posts, number, has_next):
+        super().__init__(posts)
+        self.number = number
+        self._has_next = has_next
+
+    def has_next(self):
+        return self._has_next
+
+    @property
+    def next_cursor(self):
+        if not self._has_next:
+            return None
+        last = self[-1]
+        return encode_cursor([last.pub_date, last.pk], self.number + 1)
+
+
+def _after(date_field, pk_field, after):
+    if after is None:
+        return Q()
+    pub_date, pk = after
+    return Q(**{f'{date_field}__lt': pub_date}) | Q(
+        **{date_field: pub_date, f'{pk_field}__lt': pk}
+    )
+
+
+def _parse_cursor(cursor):
+    if not cursor:
+        return None, 1
+    try:
+        values, number, _ = decode_cursor(cursor)
+        pub_date, pk = values
+        pub_date = Post._meta.get_field('pub_date').to_python(pub_date)
+        return (pub_date, int(pk)), number
+    except Exception:
+        return None, 1
+
+
+def _popular_sources(user):
+    """Популярные авторы и группы, на которые подписан user."""
+    popular = settings.TIMELINE_FANOUT_LIMIT
+    authors = Follow.objects.filter(
+        user=user, author__profile__followers_count__gte=popular
+    ).annotate(
+        kind=Value('author', output_field=CharField())
+    ).values_list('author_id', 'kind')
+    groups = GroupFollow.objects.filter(
+        user=user, group__followers_count__gte=popular
+    ).annotate(
+        kind=Value('group', output_field=CharField())
+    ).values_list('group_id', 'kind')
+    return list(authors.union(groups, all=True))
+
+
+def _merged_ids(sources, limit):
+    """Первые limit ключей (pub_date, id) всех источников одним запросом.
+
+    Каждый источник — подзапрос со своими ORDER BY и LIMIT по своему
+    индексу; UNION отбрасывает посты, пришедшие из нескольких лент.
+    """
+    using = sources[0].db
+    parts = []
+    params = []
+    for number, source in enumerate(sources):
+        sql, source_params = source[:limit].query.get_compiler(
+            using=using
+        ).as_sql()
+        parts.append(f'SELECT * FROM ({sql}) source{number}')
+        params.extend(source_params)
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            ' UNION '.join(parts) + ' ORDER BY 1 DESC, 2 DESC LIMIT %s',
+            [*params, limit],
+        )
+        return [pk for _, pk in cursor.fetchall()]
+
+
+def timeline_page(user, cursor=None, per_page=None):
+    """Страница ленты подписок пользователя.
+
+    Разложенные записи и посты каждой популярной подписки читаются
+    отдельными диапазонами индексов по ключу (pub_date, pk) после курсора
+    и сливаются в одном запросе: страница стоит трёх запросов при любом
+    числе подписок.
+    """
+    per_page = per_page or settings.ITEMS_PER_PAGE
+    after, number = _parse_cursor(cursor)
+    limit = per_page + 1
+    sources = [
+        TimelineEntry.objects.filter(
+            _after('pub_date', 'post_id', after), user=user
+        ).order_by('-pub_date', '-post_id').values_list('pub_date', 'post_id')
+    ]
+    # Общий запрос по всем подпискам с OR читал бы и сортировал все их
+    # посты; у каждой ленты свой индекс (author|group, pub_date, id).
+    for source_id, kind in _popular_sources(user):
+        sources.append(Post.objects.filter(
+            _after('pub_date', 'pk', after), **{f'{kind}_id': source_id}
+        ).exclude(author=user).order_by(*FEED_ORDERING).values_list(
+            'pub_date', 'pk'
+        ))
+    ids = _merged_ids(sources, limit)
+    has_next = len(ids) > per_page
+    ids = ids[:per_page]
+    posts = Post.objects.select_related('author', 'group').in_bulk(ids)
+    return TimelinePage(
+        [posts[pk] for pk in ids if pk in posts], number, has_next
+    )
@@ -0,0 +1,150 @@
+"""Загрузка картинок постов с ограничением памяти.
+
+LimitedUploadHandler стоит первым в FILE_UPLOAD_HANDLERS и обрывает
+файлы больше POST_IMAGE_MAX_BYTES: первые POST_IMAGE_MAX_BYTES уходят
+следующим обработчикам (в память или во временный файл, который
+удаляется вместе с запросом), остаток тела читается, но не сохраняется.
+Так на диске и в памяти от одного файла не бывает больше предела.
+BoundedImageField проверяет формат и размеры по заголовку картинки, не
+декодируя её, и уменьшает слишком большие оригиналы до
+POST_IMAGE_MAX_SIDE.
+"""
+import tempfile
+import threading
+
+from io import BytesIO
+
+from django import forms
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+from PIL import Image, ImageOps
+
+# Одновременно уменьшается не больше IMAGE_RESIZE_CONCURRENCY картинок,
+# чтобы несколько больших загрузок не заняли память процесса.
+_resize_slots = threading.BoundedSemaphore(settings.IMAGE_RESIZE_CONCURRENCY)
+
+SAVE_OPTIONS = {
+    'JPEG': {'quality': 90, 'optimize': True},
+    'PNG': {'optimize': True},
+    'WEBP': {'quality': 90},
+}
+
+
+class RejectedUpload(UploadedFile):
+    """Отметка о файле, оборванном LimitedUploadHandler."""
+
+    def __init__(self, name, content_type, size):
+        super().__init__(BytesIO(), name, content_type, size)
+
+
+class LimitedUploadHandler(FileUploadHandler):
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+        self.rejected = False
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > settings.POST_IMAGE_MAX_BYTES:
+            self.rejected = True
+        # None не передаёт кусок следующим обработчикам.
+        return None if self.rejected else raw_data
+
+    def file_complete(self, file_size):
+        if self.rejected:
+            return RejectedUpload(
+                self.file_name, self.content_type, self.received
+            )
+        return None
+
+
+def _open_header(data):
+    if hasattr(data, 'temporary_file_path'):
+        return Image.open(data.temporary_file_path())
+    data.seek(0)
+    return Image.open(BytesIO(data.read()))
+
+
+def downscale(upload, image):
+    """Уменьшает картинку до POST_IMAGE_MAX_SIDE по большей стороне.
+
+    JPEG декодируется сразу в уменьшенном масштабе (draft), поэтому
+    память зависит от итогового размера, а не от размера оригинала.
+    """
+    max_side = settings.POST_IMAGE_MAX_SIDE
+    width, height = image.size
+    if max(width, height) <= max_side:
+        return upload
+    ratio = max_side / max(width, height)
+    target = (max(1, round(width * ratio)), max(1, round(height * ratio)))
+    image_format = image.format
+    with _resize_slots:
+        if image_format == 'JPEG':
+            image.draft('RGB', target)
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail(target, Image.LANCZOS)
+        output = tempfile.SpooledTemporaryFile(
+            max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE
+        )
+        image.save(output, image_format, **SAVE_OPTIONS.get(image_format, {}))
+    size = output.tell()
+    output.seek(0)
+    resized = UploadedFile(output, upload.name, upload.content_type, size)
+    resized.image = image
+    return resized
+
+
+class BoundedImageField(forms.ImageField):
+    default_error_messages = {
+        'too_large': 'Файл больше %(limit)s МБ.',
+        'format': 'Допустимые форматы картинки: %(formats)s.',
+        'too_many_pixels': 'Картинка больше %(limit)s мегапикселей.',
+    }
+
+    def to_python(self, data):
+        upload = forms.FileField.to_python(self, data)
+        if upload is None:
+            return None
+        if isinstance(upload, RejectedUpload):
+            raise forms.ValidationError(
+                self.error_messages['too_large'],
+                code='too_large',
+                params={'limit': settings.POST_IMAGE_MAX_BYTES // 2 ** 20},
+            )
+        # Фильтры warnings общие для всех потоков, поэтому предупреждение
+        # Pillow о бомбе в ошибку не превращается: размеры сверяются ниже.
+        # Картинки больше 2 × Image.MAX_IMAGE_PIXELS Pillow не открывает.
+        try:
+            image = _open_header(upload)
+        except Image.DecompressionBombError:
+            raise self._too_many_pixels(settings.POST_IMAGE_MAX_PIXELS)
+        except Exception as error:
+            raise forms.ValidationError(
+                self.error_messages['invalid_image'], code='invalid_image'
+            ) from error
+        if image.format not in settings.POST_IMAGE_FORMATS:
+            raise forms.ValidationError(
+                self.error_messages['format'],
+                code='format',
+                params={'formats': ', '.join(settings.POST_IMAGE_FORMATS)},
+            )
+        # Без draft другие форматы декодируются в полном размере, поэтому
+        # для них предел меньше.
+        limit = (
+            settings.POST_IMAGE_MAX_PIXELS if image.format == 'JPEG'
+            else settings.POST_IMAGE_MAX_DECODED_PIXELS
+        )
+        if image.size[0] * image.size[1] > limit:
+            raise self._too_many_pixels(limit)
+        upload.image = image
+        upload.content_type = Image.MIME.get(image.format)
+        upload.seek(0)
+        return downscale(upload, image)
+
+    def _too_many_pixels(self, limit):
+        return forms.ValidationError(
+            self.error_messages['too_many_pixels'],
+            code='too_many_pixels',
+            params={'limit': limit // 10 ** 6},
+        )
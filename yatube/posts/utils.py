@@ -1,8 +1,264 @@
+import base64
+import json
+
+from functools import partial
+
 from django.conf import settings
-from django.core.paginator import Paginator
+from django.core.paginator import EmptyPage, Page, PageNotAnInteger, Paginator
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+FEED_ORDERING = ('-pub_date', '-pk')
+COMMENT_ORDERING = ('created', 'pk')
+# Не больше стольких значений в одном IN: предел параметров SQLite.
+IN_CHUNK_SIZE = 500
+
+
+def chunked(values, size=IN_CHUNK_SIZE):
+    """Списки по size значений, например для фильтров по IN."""
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def _key_value(value):
+    # Время храним с микросекундами: при округлении строки с одинаковой
+    # миллисекундой выпадали бы со страницы.
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+def encode_cursor(values, number, backward=False):
+    """Упаковывает ключ строки и номер страницы в непрозрачный токен."""
+    raw = json.dumps(
+        [[_key_value(value) for value in values], number, int(backward)],
+        separators=(',', ':'),
+    )
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Разбирает токен курсора, при ошибке бросает ValueError."""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        values, number, backward = json.loads(
+            base64.urlsafe_b64decode(padded.encode()).decode()
+        )
+    except (TypeError, ValueError, UnicodeDecodeError):
+        raise ValueError('Некорректный курсор')
+    if not isinstance(values, list) or not isinstance(number, int):
+        raise ValueError('Некорректный курсор')
+    return values, max(number, 1), bool(backward)
+
+
+class KeysetPage(Page):
+    """Страница, границы которой известны без подсчёта всех записей."""
+
+    def __init__(self, object_list, number, paginator,
+                 has_next, has_previous):
+        super().__init__(object_list, number, paginator)
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def next_page_number(self):
+        if not self._has_next:
+            raise EmptyPage('На этой странице нет результатов')
+        return self.number + 1
+
+    def previous_page_number(self):
+        if not self._has_previous:
+            raise EmptyPage('Номер страницы меньше 1')
+        return self.number - 1
+
+    def end_index(self):
+        return self.start_index() + len(self.object_list) - 1
+
+    def page_window(self):
+        """Номера страниц вокруг текущей, None на месте пропуска.
+
+        Вместо всех page_range выводятся первая, последняя и
+        settings.PAGINATOR_WINDOW соседних с текущей страниц.
+        """
+        last = max(self.paginator.num_pages, self.number)
+        side = settings.PAGINATOR_WINDOW
+        numbers = sorted(
+            {1, last}
+            | set(range(
+                max(self.number - side, 1), min(self.number + side, last) + 1
+            ))
+        )
+        window = []
+        for number in numbers:
+            if window and number - window[-1] > 1:
+                window.append(None)
+            window.append(number)
+        return window
+
+    @property
+    def next_cursor(self):
+        if not self._has_next or not self.object_list:
+            return None
+        return encode_cursor(
+            self.paginator.key_of(self.object_list[-1]), self.number + 1
+        )
+
+    @property
+    def previous_cursor(self):
+        if not self._has_previous or not self.object_list:
+            return None
+        return encode_cursor(
+            self.paginator.key_of(self.object_list[0]),
+            self.number - 1,
+            backward=True,
+        )
+
+
+class KeysetPaginator(Paginator):
+    """Пагинатор по ключу сортировки вместо OFFSET.
+
+    Следующая страница выбирается условием «строго после последней строки
+    текущей страницы», поэтому стоимость запроса не зависит от глубины.
+    Номера страниц (?page=N) поддерживаются для старых ссылок через OFFSET.
+    Общее число записей берётся из count_provider, если он передан.
+    """
+
+    def __init__(self, object_list, per_page, ordering=FEED_ORDERING,
+                 count_provider=None, **kwargs):
+        self.ordering = tuple(ordering)
+        self.count_provider = count_provider
+        super().__init__(
+            object_list.order_by(*self.ordering), per_page, **kwargs
+        )
+
+    @cached_property
+    def count(self):
+        if self.count_provider is not None:
+            return self.count_provider()
+        return super().count
+
+    @property
+    def key_fields(self):
+        return [name.lstrip('-') for name in self.ordering]
+
+    def key_of(self, obj):
+        return [getattr(obj, name) for name in self.key_fields]
+
+    def _to_python(self, values):
+        opts = self.object_list.model._meta
+        fields = [
+            opts.pk if name == 'pk' else opts.get_field(name)
+            for name in self.key_fields
+        ]
+        if len(values) != len(fields):
+            raise ValueError('Некорректный курсор')
+        try:
+            return [
+                field.to_python(value)
+                for field, value in zip(fields, values)
+            ]
+        except Exception:
+            raise ValueError('Некорректный курсор')
+
+    def _after(self, values, backward):
+        """Условие «строка идёт после ключа» в порядке выдачи."""
+        condition = Q()
+        equal = {}
+        for name, value in zip(self.ordering, values):
+            field = name.lstrip('-')
+            descending = name.startswith('-')
+            lookup = 'lt' if descending != backward else 'gt'
+            condition |= Q(**equal, **{f'{field}__{lookup}': value})
+            equal[field] = value
+        return condition
+
+    def _reversed_ordering(self):
+        return [
+            name[1:] if name.startswith('-') else f'-{name}'
+            for name in self.ordering
+        ]
+
+    def get_cursor_page(self, token):
+        """Страница по курсору; битый курсор ведёт на первую страницу."""
+        try:
+            values, number, backward = decode_cursor(token)
+            values = self._to_python(values)
+        except ValueError:
+            return self.get_page(1)
+        queryset = self.object_list.filter(self._after(values, backward))
+        if backward:
+            queryset = queryset.order_by(*self._reversed_ordering())
+        rows = list(queryset[:self.per_page + 1])
+        more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if not rows:
+            return self.get_page(1)
+        if backward:
+            rows.reverse()
+            if not more:
+                number = 1
+            return KeysetPage(rows, number, self, True, more)
+        return KeysetPage(rows, number, self, more, True)
+
+    def validate_number(self, number):
+        try:
+            if isinstance(number, float) and not number.is_integer():
+                raise ValueError
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger('Номер страницы не является целым числом')
+        if number < 1:
+            raise EmptyPage('Номер страницы меньше 1')
+        return number
+
+    def page(self, number):
+        """Страница по номеру через OFFSET, без COUNT(*)."""
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        rows = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if not rows and number > 1:
+            raise EmptyPage('На этой странице нет результатов')
+        more = len(rows) > self.per_page
+        return KeysetPage(
+            rows[:self.per_page], number, self, more, number > 1
+        )
+
+    def get_page(self, number):
+        try:
+            return self.page(number)
+        except PageNotAnInteger:
+            return self.page(1)
+        except EmptyPage:
+            pass
+        # Число страниц берётся из счётчиков и может быть больше
+        # настоящего: тогда и «последняя» страница пуста.
+        try:
+            return self.page(max(self.num_pages, 1))
+        except EmptyPage:
+            return self.page(1)
+
 
+def get_page_of_paginator(request, posts, ordering=FEED_ORDERING,
+                          count=None, per_page=None):
+    """Страница ленты.
 
-def get_page_of_paginator(request, posts):
-    paginator = Paginator(posts, settings.ITEMS_PER_PAGE)
+    count — известное число записей или функция, которая его вернёт
+    (например, счётчик из posts.counters), чтобы не считать COUNT(*).
+    """
+    count_provider = count
+    if count is not None and not callable(count):
+        count_provider = partial(int, count)
+    paginator = KeysetPaginator(
+        posts, per_page or settings.ITEMS_PER_PAGE, ordering, count_provider
+    )
+    cursor = request.GET.get('cursor')
+    if cursor:
+        return paginator.get_cursor_page(cursor)
     page_number = request.GET.get('page')
     return paginator.get_page(page_number)
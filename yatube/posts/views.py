@@ -1,16 +1,31 @@
 
+from core.db.routers import read_from_replica
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
+from django.http import HttpResponseBadRequest, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
 
-from .forms import CommentForm, PostForm
-from .models import Comment, Group, Post, User
-from .utils import get_page_of_paginator
+from . import counters, export, feeds, search, timeline
+from .cache import (
+    FEED_SCOPE, author_page_scope, cache_page_for_guests, group_page_scope,
+    post_page_scope,
+)
+from .cards import attach_cards
+from .forms import CommentForm, ExportForm, PostForm
+from .models import Follow, Group, GroupFollow, Post, User
+from .utils import COMMENT_ORDERING, get_page_of_paginator
 
 
+@read_from_replica
+@cache_page_for_guests(lambda: [FEED_SCOPE])
 def index(request):
     """Главная страница"""
-    posts = Post.objects.select_related('author', 'group').all()
-    page_obj = get_page_of_paginator(request, posts)
+    keyword = request.GET.get('q', '').strip()
+    if keyword:
+        return search_results(request, keyword)
+    page_obj = feeds.site_feed().page(request)
+    attach_cards(page_obj)
     template = 'posts/index.html'
 
     context = {
@@ -20,49 +35,151 @@ def index(request):
     return render(request, template, context)
 
 
+def search_results(request, keyword):
+    """Результаты поиска из формы в шапке сайта"""
+    page_obj = search.search_posts(keyword, request.GET.get('cursor'))
+    template = 'posts/search.html'
+    context = {
+        'keyword': keyword,
+        'page_obj': page_obj,
+    }
+    return render(request, template, context)
+
+
+@read_from_replica
+@cache_page_for_guests(lambda slug: [group_page_scope(slug)])
 def group_posts(request, slug):
     """Страница постов по группам"""
-    group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.all()
-    page_obj = get_page_of_paginator(request, posts)
+    group = feeds.get_group(slug)
+    page_obj = feeds.group_feed(group).page(request)
+    attach_cards(page_obj)
+    following = request.user.is_authenticated and GroupFollow.objects.filter(
+        user=request.user, group=group
+    ).exists()
     template = 'posts/group_list.html'
     context = {
         'group': group,
-        'page_obj': page_obj
+        'page_obj': page_obj,
+        'following': following,
     }
     return render(request, template, context)
 
 
+@read_from_replica
+@cache_page_for_guests(lambda username: [author_page_scope(username)])
 def profile(request, username):
     """Страница профиля пользователя"""
-    author = get_object_or_404(User, username=username)
-    posts = Post.objects.select_related('author').all()
-    posts_count = author.posts.all().count
-    page_obj = get_page_of_paginator(request, posts)
+    author = feeds.get_author(username)
+    feed = feeds.author_feed(author)
+    page_obj = feed.page(request)
+    attach_cards(page_obj)
+    following = request.user.is_authenticated and Follow.objects.filter(
+        user=request.user, author=author
+    ).exists()
     template = 'posts/profile.html'
     context = {
         'author': author,
         'page_obj': page_obj,
-        'posts_count': posts_count
+        'posts_count': feed.count,
+        'following': following,
     }
 
     return render(request, template, context)
 
 
+@read_from_replica
+@login_required
+def follow_index(request):
+    """Лента постов авторов и групп, на которые подписан пользователь"""
+    page_obj = timeline.timeline_page(
+        request.user, request.GET.get('cursor')
+    )
+    attach_cards(page_obj)
+    template = 'posts/follow.html'
+    context = {
+        'page_obj': page_obj,
+    }
+    return render(request, template, context)
+
+
+@login_required
+def profile_follow(request, username):
+    """Подписаться на автора"""
+    author = get_object_or_404(User, username=username)
+    if author != request.user:
+        Follow.objects.get_or_create(user=request.user, author=author)
+    return redirect('posts:profile', username)
+
+
+@login_required
+def profile_unfollow(request, username):
+    """Отписаться от автора"""
+    author = get_object_or_404(User, username=username)
+    Follow.objects.filter(user=request.user, author=author).delete()
+    return redirect('posts:profile', username)
+
+
+@login_required
+def group_follow(request, slug):
+    """Подписаться на группу"""
+    group = get_object_or_404(Group, slug=slug)
+    GroupFollow.objects.get_or_create(user=request.user, group=group)
+    return redirect('posts:group_list', slug)
+
+
+@login_required
+def group_unfollow(request, slug):
+    """Отписаться от группы"""
+    group = get_object_or_404(Group, slug=slug)
+    GroupFollow.objects.filter(user=request.user, group=group).delete()
+    return redirect('posts:group_list', slug)
+
+
+@read_from_replica
+@cache_page_for_guests(lambda post_id: [post_page_scope(post_id)])
 def post_detail(request, post_id):
     """Страница конкретного поста"""
-    post = get_object_or_404(Post, pk=post_id)
-    comments = Comment.objects.select_related('author').all()
+    post = get_object_or_404(
+        Post.objects.select_related('author__profile', 'group'), pk=post_id
+    )
+    comments = get_page_of_paginator(
+        request,
+        post.comments.select_related('author'),
+        COMMENT_ORDERING,
+        per_page=settings.COMMENTS_PER_PAGE,
+    )
     form = CommentForm(request.POST or None)
     template = 'posts/post_detail.html'
     context = {
         'post': post,
+        'posts_count': counters.author_posts_count(post.author),
         'comments': comments,
+        'comments_url': request.path,
         'form': form
     }
     return render(request, template, context)
 
 
+@read_from_replica
+@cache_page_for_guests(lambda post_id: [post_page_scope(post_id)])
+def post_comments(request, post_id):
+    """Фрагмент со следующей страницей комментариев поста"""
+    post = get_object_or_404(Post.objects.only('pk'), pk=post_id)
+    comments = get_page_of_paginator(
+        request,
+        post.comments.select_related('author'),
+        COMMENT_ORDERING,
+        per_page=settings.COMMENTS_PER_PAGE,
+    )
+    template = 'includes/comments.html'
+    context = {
+        'post': post,
+        'comments': comments,
+        'comments_url': request.path,
+    }
+    return render(request, template, context)
+
+
 @login_required
 def post_create(request):
     """Создать новый пост"""
@@ -89,7 +206,7 @@ def post_edit(request, post_id):
         instance=post
     )
     template = 'posts/create_post.html'
-    if post.author != request.user:
+    if post.author_id != request.user.pk:
         return redirect('posts:post_detail', post_id)
     if not form.is_valid():
         context = {
@@ -104,7 +221,10 @@ def post_edit(request, post_id):
 
 @login_required
 def add_comment(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
+    # Группа и автор нужны сбросу кэша лент после комментария.
+    post = get_object_or_404(
+        Post.objects.select_related('author', 'group'), pk=post_id
+    )
     form = CommentForm(request.POST or None)
     if form.is_valid():
         comment = form.save(commit=False)
@@ -112,3 +232,26 @@ def add_comment(request, post_id):
         comment.post = post
         comment.save()
     return redirect('posts:post_detail', post_id=post_id)
+
+
+@staff_member_required
+def export_posts(request):
+    """Выгрузка постов, комментариев или групп потоком в JSONL или CSV"""
+    form = ExportForm(request.GET)
+    if not form.is_valid():
+        return HttpResponseBadRequest(form.errors.as_text())
+    options = form.cleaned_data
+    kind, file_format, gzip = (
+        options['kind'], options['format'], options['gzip']
+    )
+    response = StreamingHttpResponse(
+        export.stream(
+            kind, file_format, gzip,
+            **{name: options[name] for name in export.FILTERS},
+        ),
+        content_type=export.content_type(file_format, gzip),
+    )
+    response['Content-Disposition'] = (
+        f'attachment; filename="{export.file_name(kind, file_format, gzip)}"'
+    )
+    return response
@@ -0,0 +1,33 @@
+"""Пользователь запроса из кэша.
+
+AuthenticationMiddleware на каждом запросе вошедшего пользователя
+читает его из базы. CachedModelBackend держит пользователя в кэше
+USER_CACHE_TIMEOUT секунд; запись сбрасывается сигналами при
+сохранении и удалении пользователя (users.signals), в том числе при
+смене пароля и входе — set_password и обновление last_login сохраняют
+модель. Обновления через QuerySet.update сигналов не шлют: после них
+нужно вызвать forget_user.
+"""
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+
+
+def user_cache_key(user_id):
+    return f'users:user:{user_id}'
+
+
+def forget_user(user_id):
+    cache.delete(user_cache_key(user_id))
+
+
+class CachedModelBackend(ModelBackend):
+    def get_user(self, user_id):
+        key = user_cache_key(user_id)
+        user = cache.get(key)
+        if user is None:
+            # В кэш попадают только пользователи, которым разрешён вход.
+            user = super().get_user(user_id)
+            if user is not None:
+                cache.set(key, user, settings.USER_CACHE_TIMEOUT)
+        return user
@@ -0,0 +1,32 @@
+from core.models import CountersModel
+from django.contrib.auth import get_user_model
+from django.db import models
+
+User = get_user_model()
+
+
+class Profile(CountersModel):
+    """Профиль автора: счётчики, которые показываются на страницах."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        related_name='profile',
+        verbose_name='user',
+    )
+    posts_count = models.IntegerField(
+        default=0,
+        verbose_name='posts_count',
+    )
+    followers_count = models.IntegerField(
+        default=0,
+        verbose_name='followers_count',
+    )
+
+    counter_fields = ('posts_count', 'followers_count')
+
+    class Meta:
+        verbose_name = 'Профиль'
+        verbose_name_plural = 'Профили'
+
+    def __str__(self):
+        return self.user.username
@@ -0,0 +1,102 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from users.backends import user_cache_key
+
+User = get_user_model()
+
+
+class AuthSettingsTests(TestCase):
+    def test_cache_auth_requires_shared_cache(self):
+        # Без общего кэша выход и смена пароля в одном процессе не
+        # доходили бы до остальных.
+        cached = (
+            settings.SESSION_ENGINE
+            == 'django.contrib.sessions.backends.cached_db'
+        )
+        self.assertEqual(cached, settings.SHARED_CACHE)
+        self.assertEqual(
+            'users.backends.CachedModelBackend'
+            in settings.AUTHENTICATION_BACKENDS,
+            settings.SHARED_CACHE,
+        )
+        self.assertIn(
+            'django.contrib.auth.backends.ModelBackend',
+            settings.AUTHENTICATION_BACKENDS,
+        )
+
+
+@override_settings(
+    SESSION_ENGINE='django.contrib.sessions.backends.cached_db',
+    AUTHENTICATION_BACKENDS=[
+        'users.backends.CachedModelBackend',
+        'django.contrib.auth.backends.ModelBackend',
+    ],
+)
+class CachedUserTests(TestCase):
+    """С общим кэшем сессия и пользователь читаются из кэша, а не из базы.
+
+    Настройки общего кэша заданы для класса: в одном процессе тестов
+    locmem ведёт себя как общий кэш.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='NoName', password='old-password-1'
+        )
+        self.url = reverse('posts:post_create')
+
+    def count_queries(self):
+        client = Client()
+        client.force_login(self.user)
+        # Первый запрос наполняет кэш сессий и пользователей.
+        client.get(self.url)
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return [query['sql'] for query in queries]
+
+    def test_authenticated_request_skips_session_and_user_queries(self):
+        with override_settings(
+            SESSION_ENGINE='django.contrib.sessions.backends.db',
+            AUTHENTICATION_BACKENDS=[
+                'django.contrib.auth.backends.ModelBackend'
+            ],
+        ):
+            uncached = self.count_queries()
+        cached = self.count_queries()
+        self.assertEqual(len(uncached) - len(cached), 2)
+        for sql in cached:
+            self.assertNotIn('django_session', sql)
+            self.assertNotIn('auth_user', sql)
+
+    def test_save_forgets_cached_user(self):
+        self.count_queries()
+        self.assertIsNotNone(cache.get(user_cache_key(self.user.pk)))
+        self.user.first_name = 'Имя'
+        self.user.save()
+        self.assertIsNone(cache.get(user_cache_key(self.user.pk)))
+
+    def test_password_change_ends_other_sessions(self):
+        client = Client()
+        client.force_login(self.user)
+        self.assertEqual(client.get(self.url).status_code, 200)
+        self.user.set_password('new-password-2')
+        self.user.save()
+        response = client.get(self.url)
+        self.assertRedirects(
+            response, f'{reverse("users:login")}?next={self.url}'
+        )
+
+    def test_session_of_plain_backend_stays_logged_in(self):
+        client = Client()
+        with override_settings(AUTHENTICATION_BACKENDS=[
+            'django.contrib.auth.backends.ModelBackend'
+        ]):
+            client.force_login(self.user)
+        self.assertEqual(client.get(self.url).status_code, 200)
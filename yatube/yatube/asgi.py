@@ -0,0 +1,22 @@
+"""
+ASGI config for yatube project.
+
+Django 2.2 не умеет ASGI: приложение — мост core.asgi.WsgiBridge к
+обычному WSGI-приложению с пулом из ASGI_THREADS потоков. Тела больше
+ASGI_MAX_BODY_BYTES отклоняются с 413.
+
+Запуск: uvicorn yatube.asgi:application
+"""
+
+import os
+
+from core.asgi import WsgiBridge
+from django.conf import settings
+from django.core.wsgi import get_wsgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+
+application = WsgiBridge(
+    get_wsgi_application(), settings.ASGI_THREADS,
+    max_body=settings.ASGI_MAX_BODY_BYTES,
+)
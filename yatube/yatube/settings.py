@@ -14,6 +14,32 @@ import os
 
 ITEMS_PER_PAGE = 15
 ITEMS_FOR_TEST = 18
+PAGINATOR_WINDOW = 2
+COMMENTS_PER_PAGE = 20
+BACKGROUND_WORKERS = 2
+THUMBNAIL_MAX_ATTEMPTS = 3
+# Повтор задания миниатюры через столько секунд, дальше вдвое дольше.
+THUMBNAIL_RETRY_DELAY = 30
+# Задание, которое выполняется дольше, считается прерванным (падение или
+# перезапуск процесса): backfill_thumbnails ставит его в очередь снова.
+THUMBNAIL_JOB_TIMEOUT = 60 * 10
+# Столько секунд кэш помнит, что миниатюры ещё нет: её строит фоновое
+# задание, а кэш другого процесса оно не обновит.
+THUMBNAIL_MISS_CACHE_TIMEOUT = 5
+IMAGE_DERIVATIVE_WIDTHS = (320, 480, 640, 720, 960)
+POST_IMAGE_MAX_BYTES = 20 * 2 ** 20
+POST_IMAGE_FORMATS = ('JPEG', 'PNG', 'GIF', 'WEBP')
+POST_IMAGE_MAX_PIXELS = 60_000_000
+POST_IMAGE_MAX_DECODED_PIXELS = 16_000_000
+POST_IMAGE_MAX_SIDE = 2560
+IMAGE_RESIZE_CONCURRENCY = 2
+TIMELINE_FANOUT_LIMIT = 1000
+TIMELINE_BACKFILL = 100
+EXPORT_CHUNK_SIZE = 2000
+# Ответы дольше этого пишутся в журнал yatube.slow_requests; None — нет.
+METRICS_SLOW_REQUEST_SECONDS = 1.0
+# Если задан, /metrics требует заголовок Authorization: Bearer <токен>.
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
 
 LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:index'
@@ -30,6 +56,12 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+FILE_UPLOAD_HANDLERS = [
+    'posts.uploads.LimitedUploadHandler',
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/2.2/howto/deployment/checklist/
 # SECURITY WARNING: keep the secret key used in production secret!
@@ -63,6 +95,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.ReplicaStickinessMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -95,17 +129,136 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'yatube.wsgi.application'
+# Потоки, в которых ASGI-мост (yatube.asgi) выполняет запросы.
+ASGI_THREADS = int(os.environ.get('ASGI_THREADS', 8))
+# Больше этого тела запросов мост отклоняет с 413, не дочитывая: самая
+# большая форма — картинка поста и остальные поля.
+ASGI_MAX_BODY_BYTES = POST_IMAGE_MAX_BYTES + 2 * 2 ** 20
 
 
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
-DATABASES = {
+# DB_ENGINE=postgresql включает PostgreSQL с параметрами из DB_*; иначе
+# SQLite. DB_POOL_SIZE > 0 включает пул соединений в процессе
+# (core.db.postgresql), с ним соединение возвращается в пул после
+# каждого запроса. Соединение, не проверявшееся DB_HEALTH_CHECK_SECONDS,
+# проверяется перед использованием.
+DB_ENGINE = os.environ.get('DB_ENGINE', 'sqlite')
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 0))
+
+if DB_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'core.db.postgresql',
+            'NAME': os.environ.get('DB_NAME', 'yatube'),
+            'USER': os.environ.get('DB_USER', 'postgres'),
+            'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+            'HOST': os.environ.get('DB_HOST', 'localhost'),
+            'PORT': os.environ.get('DB_PORT', '5432'),
+            'CONN_MAX_AGE': int(os.environ.get(
+                'DB_CONN_MAX_AGE', 0 if DB_POOL_SIZE else 60
+            )),
+            'HEALTH_CHECK_SECONDS': int(
+                os.environ.get('DB_HEALTH_CHECK_SECONDS', 30)
+            ),
+            'POOL': DB_POOL_SIZE and {
+                'MIN_SIZE': int(os.environ.get('DB_POOL_MIN_SIZE', 2)),
+                'MAX_SIZE': DB_POOL_SIZE,
+                'TIMEOUT': int(os.environ.get('DB_POOL_TIMEOUT', 30)),
+            },
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get(
+                'DB_NAME', os.path.join(BASE_DIR, 'db.sqlite3')
+            ),
+        }
+    }
+
+# Реплика для чтения лент (core.db.routers): DB_REPLICA_NAME или
+# DB_REPLICA_HOST добавляют базу replica с остальными параметрами
+# основной. В тестах реплика — та же тестовая база, но через другое
+# соединение: данные TestCase ей не видны, поэтому с репликой
+# запускаются только тесты posts.tests.test_replicas.
+if os.environ.get('DB_REPLICA_NAME') or os.environ.get('DB_REPLICA_HOST'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': os.environ.get(
+            'DB_REPLICA_NAME', DATABASES['default']['NAME']
+        ),
+        'TEST': {'MIRROR': 'default'},
+    }
+    if os.environ.get('DB_REPLICA_HOST'):
+        DATABASES['replica']['HOST'] = os.environ['DB_REPLICA_HOST']
+        DATABASES['replica']['PORT'] = os.environ.get(
+            'DB_REPLICA_PORT', DATABASES['default']['PORT']
+        )
+
+DATABASE_ROUTERS = ['core.db.routers.ReplicaRouter']
+READ_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+# Дольше отстающая реплика не используется.
+REPLICA_MAX_LAG_SECONDS = 5
+REPLICA_LAG_CHECK_SECONDS = 1
+# Столько секунд после записи пользователь читает из основной базы.
+REPLICA_STICKY_SECONDS = 15
+
+# Прагмы каждого соединения SQLite (core.db.sqlite).
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'busy_timeout': 5000,
+    'mmap_size': 256 * 2 ** 20,
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/2.2/topics/cache/
+
+# CACHE_BACKEND и CACHE_LOCATION задают кэш, общий для процессов
+# (memcached, файловый); по умолчанию — locmem, свой у каждого процесса.
+CACHE_BACKEND = os.environ.get(
+    'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+)
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
     }
 }
+# Сброс записей в кэше locmem до других процессов не доходит: то, что
+# нельзя отдавать устаревшим, кэшируется только в общем кэше.
+SHARED_CACHE = CACHE_BACKEND not in (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+# Кэш страниц лент для гостей (posts.cache); 0 отключает кэширование.
+FEED_CACHE_ALIAS = 'default'
+FEED_CACHE_TIMEOUT = 60 * 5 if SHARED_CACHE else 0
+# Карточки постов (posts.cards) меняют ключ при правке, поэтому живут долго.
+# Версия сайта в ключе сбрасывается только в общем кэше; 0 отключает кэш.
+CARD_CACHE_TIMEOUT = 60 * 60 * 24 if SHARED_CACHE else 0
+
+# С общим кэшем сессии читаются из кэша и пишутся в кэш и базу, а
+# пользователь запроса — из кэша (users.backends). Кэш locmem у каждого
+# процесса свой: выход и смена пароля не доходили бы до остальных
+# процессов, поэтому без общего кэша сессии и пользователи читаются из
+# базы. ModelBackend остаётся в списке: сессии, созданные до кэша, хранят
+# его путь, и без него django.contrib.auth разлогинил бы их владельцев.
+if SHARED_CACHE:
+    SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+    AUTHENTICATION_BACKENDS = [
+        'users.backends.CachedModelBackend',
+        'django.contrib.auth.backends.ModelBackend',
+    ]
+else:
+    SESSION_ENGINE = 'django.contrib.sessions.backends.db'
+    AUTHENTICATION_BACKENDS = ['django.contrib.auth.backends.ModelBackend']
+USER_CACHE_TIMEOUT = 60 * 5
 
 
 # Password validation